@@ -37,7 +37,7 @@ void setup() {
             return;
         }
 
-        String json = "{\"temperature\": " + String(temperature) + ", \"humidity\": " + String(humidity) + ", \"airQuality\": " + String(airQuality) + "}";
+        String json = "{\"temperature\": " + String(temperature) + ", \"humidity\": " + String(humidity) + ", \"air_quality\": " + String(airQuality) + "}";
         request->send(200, "application/json", json);
     });
 
@@ -38,7 +38,8 @@ void loop() {
             if (!error) {
                 float temperature = doc["temperature"];
                 float humidity = doc["humidity"];
-                int airQuality = doc["airQuality"];
+                // Older ESP32 firmware sent "airQuality"
+                int airQuality = doc.containsKey("air_quality") ? doc["air_quality"] : doc["airQuality"];
                 
                 Serial.print("Temperature: ");
                 Serial.print(temperature);
@@ -1,55 +1,53 @@
-import serial
-import json
-from tinydb import TinyDB
-from datetime import datetime
-
-# Initialize TinyDB
-db = TinyDB("sensor_data.json")
-
-# Open Serial Port (Change "COM6" to your port)
-ser = serial.Serial("COM6", 115200)  # Use "/dev/ttyUSB0" for Linux
-
-while True:
-    try:
-        if ser.in_waiting > 0:
-            line = ser.readline().decode("utf-8").strip()
-            print("Received:", line)  # Debugging output
-
-            # Parse JSON from Serial
-            data = json.loads(line)
-            temperature = data["temperature"]
-            humidity = data["humidity"]
-            air_quality = data["air_quality"]
-            light_intensity = data["light_intensity"]
-
-            # Get Current Date & Time
-            now = datetime.now()
-            date_str = now.strftime("%Y-%m-%d")  # e.g., 2025-03-16
-            time_str = now.strftime("%H:%M:%S")  # e.g., 10:30:15
-
-            # Fetch existing data or initialize a new date entry
-            db_data = db.all()
-            if len(db_data) > 0:
-                records = db_data[0]  # Fetch the first record
-            else:
-                records = {}
-
-            # Add new data
-            if date_str not in records:
-                records[date_str] = {}
-
-            records[date_str][time_str] = {
-                "temperature": temperature,
-                "humidity": humidity,
-                "air_quality": air_quality,
-                "light_intensity": light_intensity
-            }
-
-            # Update TinyDB
-            db.truncate()  # Clear previous data
-            db.insert(records)  # Insert updated data
-
-            print(f"Stored: {date_str} {time_str} → Temp={temperature}°C, Hum={humidity}%, AirQ={air_quality}, Light={light_intensity}")
-
-    except Exception as e:
-        print("Error:", e)
+import time
+import serial
+
+import metrics
+import pipeline
+import retention
+import securelink
+
+# "segments" appends each reading to rolling segment files; "tinydb" keeps the
+# old behaviour of rewriting the whole sensor_data.json document per reading
+STORAGE_BACKEND = "segments"
+
+# "fsync" makes every committed batch durable; "os" leaves flushing to the OS
+DURABILITY = pipeline.DURABILITY_OS
+
+STATS_INTERVAL = 5  # Seconds between ingest status lines
+METRICS_PORT = metrics.DEFAULT_PORT  # Prometheus metrics on http://127.0.0.1:9108/metrics (None = off)
+
+# Set to the key file made by "python securelink.py --new-key link.key" to
+# accept only authenticated, encrypted frames (USE_SECURE_FRAMES in demo.ino)
+LINK_KEY_PATH = None
+LINK_MODE = "hmac"  # "hmac" (standard library) or "aead" (ChaCha20-Poly1305, needs "cryptography")
+
+# Days of raw readings, minute rollups and hourly rollups to keep (None = forever);
+# older data is compacted in the background while ingesting
+RETENTION = retention.Policy(raw_days=7, minute_days=90, hour_days=None)
+
+# Segment store, column store and rollup index, written together per batch
+sink = pipeline.open_store_group(STORAGE_BACKEND, policy=RETENTION)
+
+# Open Serial Port (Change "COM6" to your port)
+ser = serial.Serial("COM6", 115200, timeout=pipeline.READ_TIMEOUT)  # Use "/dev/ttyUSB0" for Linux
+
+# The reader thread drains the port into a bounded queue; the writer thread
+# commits readings in batches so a slow disk flush never stalls the serial link
+decoder = securelink.open_decoder(LINK_KEY_PATH, LINK_MODE) if LINK_KEY_PATH else None
+ingest = pipeline.IngestPipeline(ser, sink, durability=DURABILITY, decoder=decoder)
+ingest.start()
+if sink.compactor is not None:  # RETENTION = None keeps everything
+    sink.compactor.start()
+metrics.serve(METRICS_PORT)
+
+# Status every few seconds; parse and write errors are logged (rate-limited) as they happen
+try:
+    while True:
+        time.sleep(STATS_INTERVAL)
+        metrics.log.info("ingest", **ingest.stats())
+except KeyboardInterrupt:
+    pass
+finally:
+    ingest.stop()
+    sink.close()
+    metrics.log.info("stopped", **ingest.stats())
@@ -0,0 +1,599 @@
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+
+import anomaly
+import columnar
+import digest
+import metrics
+import rollup
+import storage
+import timerange
+
+# One process owns the dataset, the rollup and time indexes and a cache of
+# answers; every chatbot window and script asks it over localhost HTTP:
+#   GET /v1/info                             Span, row count, fields and sources
+#   GET /v1/answer?q=QUESTION                What the chatbots show for a question
+#   GET /v1/stats?field=F&q=QUESTION         Count/mean/min/max/std in the question's window
+#   GET /v1/series?fields=F,G&q=Q&points=N   Downsampled series for a graph
+#   GET /v1/anomalies?q=QUESTION[&field=F]   Anomaly events in the window
+#   GET /v1/context?q=QUESTION               Data span and averages for an LLM prompt
+#   GET /v1/digest?q=QUESTION[&tokens=N]     Token-budgeted summary of the window for an LLM prompt
+#   GET /v1/refresh?rows=N                   Row count, and the earliest timestamp added after row N
+#   GET /v1/cache                            Cache hits and misses
+#   GET /metrics                             Prometheus metrics (metrics.py), /debug/profile for stacks
+#
+#   python analytics_server.py serve
+#   python analytics_server.py ask "average temperature over the last 6 hours"
+
+DEFAULT_PORT = 8766
+ANALYTICS_URL = os.environ.get("ANALYTICS_URL", f"http://127.0.0.1:{DEFAULT_PORT}")
+CONNECT_TIMEOUT = 0.5  # Seconds to find a running server before analysing in-process
+REQUEST_TIMEOUT = 30
+
+REFRESH_INTERVAL = 1.0  # Seconds between looks at the column store for new rows
+CACHE_MAX_ENTRIES = 1024
+# A digest of a window still receiving readings is reused for this many
+# seconds rather than rebuilt for every new row; LLM answers do not need them
+DIGEST_MAX_AGE = 60
+SERIES_POINTS = 1200
+MAX_SERIES_POINTS = 20000
+
+FIELD_LABELS = {
+    "temperature": "Temperature (°C)",
+    "humidity": "Humidity (%)",
+    "air_quality": "Air Quality (µg/m³)",
+    "light_intensity": "Light Intensity (lux)",
+}
+DEFAULT_AVERAGES = {"air_quality": 50, "light_intensity": 1000}  # Used when a window has no readings
+
+QUERY_SECONDS = "analytics_query_seconds"
+QUERY_HELP = "Time to answer one query, by intent and whether it came from the cache"
+
+
+def plain(value):
+    # NumPy scalars and NaN -> JSON-ready Python values
+    if value is None:
+        return None
+    value = float(value)
+    return None if value != value else value
+
+
+def answer_intent(query, window):
+    # What route() will do with a question, for the latency metrics
+    if "graph" in query or "plot" in query:
+        return "plot"
+    if "anomal" in query or "unusual" in query:
+        return "anomalies"
+    if window and window.period:
+        return "breakdown"
+    if "average" in query:
+        return "average"
+    return "llm"
+
+
+class Analytics:
+    # The analytics behind the chatbots. Answers are cached per question and
+    # time window; a cached answer stays valid while new rows only land after
+    # the end of its window. Used in-process or behind make_server(), and
+    # every method returns JSON-ready values either way.
+
+    def __init__(self, column_dir=columnar.COLUMN_DIR, store_dir=storage.STORE_DIR,
+                 json_path=storage.LEGACY_JSON_PATH, rollup_path=rollup.ROLLUP_PATH,
+                 anomaly_path=anomaly.EVENTS_PATH, refresh_interval=REFRESH_INTERVAL):
+        self.error = None
+        self.data = self.engine = None
+        try:
+            self.data = columnar.open_dataset(column_dir, store_dir, json_path)
+        except FileNotFoundError:
+            self.error = f"Error: Could not find file at {json_path}"
+        except json.JSONDecodeError:
+            self.error = "Error: Invalid JSON format in sensor data file"
+        if self.data is not None:
+            # Per-minute/hour/day aggregates, anomaly events and a sorted timestamp index
+            rollups = rollup.open_index(self.data, rollup_path, save=False)
+            events = anomaly.open_events(self.data, anomaly_path)
+            self.engine = timerange.QueryEngine(self.data, rollups, events)
+
+        self.refresh_interval = refresh_interval
+        self.last_refresh = time.monotonic()
+        self.lock = threading.RLock()
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        metrics.counter("analytics_cache_hits_total", "Answers served from the cache", fn=lambda: self.hits)
+        metrics.counter("analytics_cache_misses_total", "Answers computed", fn=lambda: self.misses)
+        metrics.gauge("analytics_rows", "Readings in the store", fn=lambda: self.data.next_row if self.data is not None else 0)
+
+    def catch_up(self):
+        # Pick up new rows, at most once per refresh_interval however many clients ask
+        if self.engine is not None and time.monotonic() - self.last_refresh >= self.refresh_interval:
+            self.last_refresh = time.monotonic()
+            try:
+                self.engine.refresh()
+            except OSError:
+                pass  # Store busy or briefly unavailable; try again on the next request
+
+    def window(self, question):
+        # Relative windows ("last 6 hours") are taken from the current whole
+        # second, so the same question asked within a second is one cache entry
+        return timerange.parse_range(question, datetime.fromtimestamp(int(time.time())))
+
+    def cached(self, key, window, compute, max_age=0):
+        rows = self.data.next_row
+        entry = self.cache.get(key)
+        if entry is not None:
+            cached_rows, generation, value, computed_at = entry
+            # Still valid if nothing arrived, everything new is after the window or
+            # it is younger than max_age seconds; a compaction (retention.py) starts over
+            if generation == self.data.generation and (
+                    cached_rows == rows or time.monotonic() - computed_at < max_age
+                    or (window is not None and window.end is not None and cached_rows < rows
+                        and window.end <= int(self.data.ts[self.data.position(cached_rows):].min()))):
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return value
+        self.misses += 1
+        value = compute()
+        self.cache[key] = (rows, self.data.generation, value, time.monotonic())
+        self.cache.move_to_end(key)
+        while len(self.cache) > CACHE_MAX_ENTRIES:
+            self.cache.popitem(last=False)
+        return value
+
+    def query(self, name, question, compute, *args, max_age=0):
+        # compute(window, *args), cached under (name, window, args)
+        started = time.perf_counter()
+        with self.lock:
+            self.catch_up()
+            window = self.window(question)
+            hits = self.hits
+            value = self.cached((name, window) + args, window, lambda: compute(window, *args), max_age)
+            intent = answer_intent(args[0], window) if name == "answer" else name
+            metrics.histogram(QUERY_SECONDS, QUERY_HELP, intent=intent, cache="hit" if self.hits > hits else "miss").observe(
+                time.perf_counter() - started)
+            return value
+
+    def info(self):
+        with self.lock:
+            self.catch_up()
+            if self.data is None:
+                return {"span": "no data loaded", "rows": 0, "fields": [], "sources": [], "error": self.error}
+            return {"span": self.engine.span_label(), "rows": self.data.next_row, "fields": list(self.data.fields),
+                    "sources": list(self.data.sources), "error": self.error}
+
+    def answer(self, question):
+        # {"type": "text", "text"}, {"type": "plot", "fields", "labels", "title"}
+        # or {"type": "llm", "span", "averages"} for the client to pass to its LLM
+        if self.data is None or self.data.next_row == 0:
+            return {"type": "text", "text": "Error: No valid sensor data loaded from the file."}
+        return self.query("answer", question, self.route, " ".join(question.lower().split()))
+
+    def route(self, window, query):
+        engine = self.engine
+        span = f" {window.label}" if window and window.label else ""
+
+        # Graph requests
+        if "graph" in query or "plot" in query:
+            if window and window.start is not None and engine.count(window) == 0:
+                return {"type": "text", "text": f"No sensor data{span}"}
+            if "temperature" in query and "humidity" in query:
+                return self.plot_answer(["temperature", "humidity"], f"{FIELD_LABELS['temperature']} and {FIELD_LABELS['humidity']} Over Time")
+            elif "temperature" in query or ("graph" in query and "temp" in query):
+                return self.plot_answer(["temperature"], "Temperature Over Time" + span)
+            elif "humidity" in query:
+                return self.plot_answer(["humidity"], "Humidity Over Time" + span)
+            elif "air" in query and "quality" in query:
+                return self.plot_answer(["air_quality"], "Air Quality Over Time" + span)
+            elif "light" in query or "ldr" in query:
+                return self.plot_answer(["light_intensity"], "Light Intensity Over Time" + span)
+            else:
+                return {"type": "text", "text": "Please specify what to graph (temperature, humidity, air quality, light intensity)"}
+
+        # Anomaly events ("any anomalies today?"), read from the event table
+        if "anomal" in query or "unusual" in query:
+            return {"type": "text", "text": engine.anomaly_report(window)}
+
+        # Per-day / per-hour breakdowns
+        if window and window.period:
+            if "temperature" in query or "temp" in query:
+                return {"type": "text", "text": engine.period_report("temperature", window, "Temperature", "°C")}
+            elif "humidity" in query:
+                return {"type": "text", "text": engine.period_report("humidity", window, "Humidity", "%")}
+            elif "air" in query and "quality" in query:
+                return {"type": "text", "text": engine.period_report("air_quality", window, "Air quality", " µg/m³")}
+            elif "light" in query or "ldr" in query:
+                return {"type": "text", "text": engine.period_report("light_intensity", window, "Light intensity", " lux")}
+
+        # Averages come from the rollup index; missing readings are never counted
+        context = self.llm_context(window)
+        averages = context["averages"]
+        if "average" in query:
+            if "temperature" in query:
+                text = f"The average temperature{span} is {averages['temperature']:.1f}°C" if averages["temperature"] is not None else f"No valid temperature data{span}"
+            elif "humidity" in query:
+                text = f"The average humidity{span} is {averages['humidity']:.1f}%" if averages["humidity"] is not None else f"No valid humidity data{span}"
+            elif "air" in query and "quality" in query:
+                text = f"The average air quality (PM2.5){span} is {averages['air_quality']:.1f} µg/m³"
+            elif "light" in query or "ldr" in query:
+                text = f"The average light intensity{span} is {averages['light_intensity']:.1f} lux"
+            else:
+                text = None
+            if text is not None:
+                return {"type": "text", "text": text}
+
+        # Everything else goes to the client's LLM, with a digest of the window
+        # (shared by every question about the same window)
+        tokens = digest.DIGEST_TOKENS
+        summary = self.cached(("digest", window, tokens), window, lambda: self.build_digest(window, tokens), DIGEST_MAX_AGE)
+        return {"type": "llm", **context, "digest": summary["text"]}
+
+    def plot_answer(self, fields, title):
+        return {"type": "plot", "fields": fields, "labels": [FIELD_LABELS[field] for field in fields], "title": title}
+
+    def stats(self, field, question=""):
+        if self.engine is None:
+            return None
+        if field not in self.data.fields:
+            raise ValueError(f"Unknown field: {field}")
+        return self.query("stats", question, self.window_stats, field)
+
+    def window_stats(self, window, field):
+        stats = self.engine.stats(field, window)
+        return {name: plain(value) for name, value in stats.items()} if stats else None
+
+    def series(self, fields, question="", points=SERIES_POINTS):
+        if self.engine is None:
+            return None
+        unknown = [field for field in fields if field not in self.data.fields]
+        if unknown:
+            raise ValueError(f"Unknown field: {unknown[0]}")
+        points = min(max(int(points), 3), MAX_SERIES_POINTS)
+        return self.query("series", question, self.downsampled, tuple(fields), points)
+
+    def downsampled(self, window, fields, points):
+        # LTTB per field; every field is returned at the union of the rows kept
+        # for any of them, so one graph can share the time axis (None = missing)
+        ts, values = self.engine.window_series(fields, window)
+        x = ts.astype(np.float64)
+        keep = np.zeros(len(ts), dtype=bool)
+        for field in fields:
+            finite = np.flatnonzero(np.isfinite(values[field]))
+            keep[finite[timerange.lttb(x[finite], values[field][finite].astype(np.float64), points)]] = True
+        picked = np.flatnonzero(keep)
+        bounded = window is not None and window.start is not None and window.end is not None
+        return {
+            "times": ts[picked].tolist(),
+            "values": {field: [None if value != value else value
+                               for value in np.round(values[field][picked].astype(np.float64), 4).tolist()]
+                       for field in fields},
+            "limits": [window.start, window.end] if bounded else None,
+            "rows": len(ts),
+        }
+
+    def anomalies(self, question="", field=None):
+        if self.engine is None:
+            return None
+        if field is not None and field not in self.data.fields:
+            raise ValueError(f"Unknown field: {field}")
+        return self.query("anomalies", question, self.window_anomalies, field)
+
+    def window_anomalies(self, window, field):
+        events = self.engine.events(window, field)
+        if events is None:
+            return {"report": self.engine.anomaly_report(window, field), "events": []}
+        sources = self.data.sources
+        return {
+            "report": self.engine.anomaly_report(window, field),
+            "events": [{
+                "ts": int(event["ts"]),
+                "field": self.data.fields[event["field"]],
+                "kind": anomaly.KINDS[event["kind"]],
+                "value": plain(event["value"]),
+                "score": plain(event["score"]),
+                "source": sources[event["source"]] if event["source"] < len(sources) else int(event["source"]),
+                "text": anomaly.describe(event, self.data.fields),
+            } for event in events[-timerange.MAX_EVENTS:]],
+        }
+
+    def context(self, question=""):
+        if self.engine is None:
+            return None
+        return self.query("context", question, self.llm_context)
+
+    def llm_context(self, window):
+        # Data span and per-field averages for an LLM prompt (defaults where a field has no readings)
+        averages = {field: plain(self.engine.mean(field, window)) for field in self.data.fields}
+        for field, default in DEFAULT_AVERAGES.items():
+            if averages.get(field) is None:
+                averages[field] = default
+        return {"span": window.label if window and window.label else self.engine.span_label(), "averages": averages}
+
+    def digest(self, question="", tokens=digest.DIGEST_TOKENS):
+        if self.engine is None:
+            return None
+        return self.query("digest", question, self.build_digest, int(tokens), max_age=DIGEST_MAX_AGE)
+
+    def build_digest(self, window, tokens):
+        return digest.build(self.engine, window, tokens)
+
+    def refresh(self, rows=None):
+        # Row count now; `since` is the earliest timestamp added after row `rows`
+        with self.lock:
+            self.catch_up()
+            total = self.data.next_row if self.data is not None else 0
+            since = None
+            if rows is not None and total > int(rows) and len(self.data):
+                since = int(self.data.ts[self.data.position(int(rows)):].min())
+            return {"rows": total, "since": since}
+
+    def cache_stats(self):
+        with self.lock:
+            return {"entries": len(self.cache), "hits": self.hits, "misses": self.misses}
+
+
+class AnalyticsClient:
+    # The Analytics methods, answered by a running analytics server over one
+    # kept-alive connection. Raises ConnectionError if the server goes away.
+
+    def __init__(self, url=ANALYTICS_URL, timeout=REQUEST_TIMEOUT):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname
+        self.port = parts.port or DEFAULT_PORT
+        self.timeout = timeout
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def call(self, method, **params):
+        path = f"/v1/{method}?" + urlencode({name: value for name, value in params.items() if value is not None})
+        with self.lock:
+            for attempt in range(2):
+                if self.connection is None:
+                    self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                try:
+                    self.connection.request("GET", path)
+                    response = self.connection.getresponse()
+                    body = response.read()
+                    break
+                except (OSError, http.client.HTTPException) as e:
+                    # A kept-alive connection may have been closed by the server; retry once on a new one
+                    self.connection.close()
+                    self.connection = None
+                    if attempt:
+                        raise ConnectionError(f"Analytics server at {self.url}: {e}") from e
+        if response.status != 200:
+            raise ValueError(body.decode("utf-8", "replace"))
+        return json.loads(body)
+
+    def info(self):
+        return self.call("info")
+
+    def answer(self, question):
+        return self.call("answer", q=question)
+
+    def stats(self, field, question=""):
+        return self.call("stats", field=field, q=question)
+
+    def series(self, fields, question="", points=SERIES_POINTS):
+        return self.call("series", fields=",".join(fields), q=question, points=points)
+
+    def anomalies(self, question="", field=None):
+        return self.call("anomalies", q=question, field=field)
+
+    def context(self, question=""):
+        return self.call("context", q=question)
+
+    def digest(self, question="", tokens=digest.DIGEST_TOKENS):
+        return self.call("digest", q=question, tokens=tokens)
+
+    def refresh(self, rows=None):
+        return self.call("refresh", rows=rows)
+
+    def cache_stats(self):
+        return self.call("cache")
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def connect(url=ANALYTICS_URL):
+    # The shared server if one is running, otherwise analytics in this process
+    client = AnalyticsClient(url, timeout=CONNECT_TIMEOUT)
+    try:
+        client.info()
+    except ConnectionError:
+        return Analytics()
+    client.close()  # Reconnect with the normal timeout
+    client.timeout = REQUEST_TIMEOUT
+    return client
+
+
+def connect_async(url=ANALYTICS_URL):
+    # connect() and info() on a background thread, so a window can appear
+    # while the store and indexes open; a Future of (analytics, info)
+    future = Future()
+
+    def load():
+        try:
+            analytics = connect(url)
+            future.set_result((analytics, analytics.info()))
+        except Exception as e:
+            future.set_exception(e)
+
+    threading.Thread(target=load, name="analytics-connect", daemon=True).start()
+    return future
+
+
+def describe_plot(analytics, question, fields, title):
+    # A graph answer as text, for consoles without a window: the statistics
+    # of each field over the question's time range
+    lines = [title]
+    for field in fields:
+        stats = analytics.stats(field, question)
+        if not stats or not stats["count"]:
+            lines.append(f"- {FIELD_LABELS[field]}: no readings")
+            continue
+        lines.append(f"- {FIELD_LABELS[field]}: mean {stats['mean']:.1f}, min {stats['min']:.1f}, "
+                     f"max {stats['max']:.1f} over {int(stats['count'])} readings")
+    return "\n".join(lines)
+
+
+def series_arrays(series):
+    # (local datetime64 times, [float arrays], axis limits or None) from a series() result
+    times = columnar.to_local(series["times"])
+    values = [np.asarray(column, dtype=np.float64) for column in series["values"].values()]
+    limits = None
+    if series["limits"]:
+        limits = tuple(columnar.to_local(series["limits"]))
+    return times, values, limits
+
+
+class AnalyticsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes; do not hold the body back
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            response = metrics.handle(url.path, params)
+        except ValueError as e:
+            response = (400, "text/plain", f"Bad request: {e}".encode("utf-8"))
+        if response is not None:
+            self.send_body(*response)
+            return
+        question = params.get("q", "")
+        analytics = self.server.analytics
+        methods = {
+            "/v1/info": lambda: analytics.info(),
+            "/v1/answer": lambda: analytics.answer(question),
+            "/v1/stats": lambda: analytics.stats(params["field"], question),
+            "/v1/series": lambda: analytics.series(params["fields"].split(","), question, int(params.get("points", SERIES_POINTS))),
+            "/v1/anomalies": lambda: analytics.anomalies(question, params.get("field")),
+            "/v1/context": lambda: analytics.context(question),
+            "/v1/digest": lambda: analytics.digest(question, int(params.get("tokens", digest.DIGEST_TOKENS))),
+            "/v1/refresh": lambda: analytics.refresh(params.get("rows")),
+            "/v1/cache": lambda: analytics.cache_stats(),
+        }
+        if url.path not in methods:
+            self.send_body(404, "text/plain", b"Not found")
+            return
+        try:
+            result = methods[url.path]()
+        except (KeyError, ValueError) as e:
+            self.send_body(400, "text/plain", f"Bad request: {e}".encode("utf-8"))
+            return
+        self.send_body(200, "application/json", json.dumps(result).encode("utf-8"))
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, analytics=None):
+    server = ThreadingHTTPServer((host, port), AnalyticsHandler)
+    server.daemon_threads = True
+    server.analytics = analytics if analytics is not None else Analytics()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared analytics server for the chatbots, and a command-line client")
+    parser.add_argument("--url", default=ANALYTICS_URL, help="server to ask (default: $ANALYTICS_URL)")
+    parser.add_argument("--local", action="store_true", help="analyse in this process instead of asking a server")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="load the data once and answer clients")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    commands.add_parser("info")
+    ask = commands.add_parser("ask", help="answer a question the way the chatbots do (LLM questions print the prompt context)")
+    ask.add_argument("question")
+    stats = commands.add_parser("stats")
+    stats.add_argument("field")
+    stats.add_argument("question", nargs="?", default="")
+    series = commands.add_parser("series")
+    series.add_argument("fields", help="comma-separated")
+    series.add_argument("question", nargs="?", default="")
+    series.add_argument("--points", type=int, default=SERIES_POINTS)
+    anomalies = commands.add_parser("anomalies")
+    anomalies.add_argument("question", nargs="?", default="")
+    anomalies.add_argument("--field")
+    context = commands.add_parser("context")
+    context.add_argument("question", nargs="?", default="")
+    summary = commands.add_parser("digest", help="the summary of a question's window an LLM is given")
+    summary.add_argument("question", nargs="?", default="")
+    summary.add_argument("--tokens", type=int, default=digest.DIGEST_TOKENS, help="token budget")
+    bench = commands.add_parser("bench", help="time repeated questions")
+    bench.add_argument("question", nargs="?", default="average temperature over the last 6 hours")
+    bench.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        started = time.perf_counter()
+        server = make_server(args.host, args.port)
+        analytics = server.analytics
+        print(analytics.error or f"Loaded {len(analytics.data)} readings ({analytics.engine.span_label()}) in {time.perf_counter() - started:.2f}s")
+        print(f"Analytics server listening on http://{args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return
+
+    analytics = Analytics() if args.local else AnalyticsClient(args.url)
+    if args.command == "info":
+        result = analytics.info()
+    elif args.command == "ask":
+        result = analytics.answer(args.question)
+        if result["type"] == "text":
+            print(result["text"])
+            return
+    elif args.command == "stats":
+        result = analytics.stats(args.field, args.question)
+    elif args.command == "series":
+        result = analytics.series(args.fields.split(","), args.question, args.points)
+    elif args.command == "anomalies":
+        result = analytics.anomalies(args.question, args.field)
+        print(result["report"] if result else "No data loaded")
+        return
+    elif args.command == "context":
+        result = analytics.context(args.question)
+    elif args.command == "digest":
+        result = analytics.digest(args.question, args.tokens)
+        if result:
+            print(result["text"])
+            table = f", table per {result['resolution']}" if result["resolution"] else ""
+            print(f"\n[{result['tokens']} of {result['budget']} tokens{table}]")
+            return
+    else:
+        analytics.answer(args.question)  # Warm the cache
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            analytics.answer(args.question)
+        seconds = time.perf_counter() - started
+        print(f"{args.repeat} answers to {args.question!r}: {seconds / args.repeat * 1000:.3f} ms each")
+        result = analytics.cache_stats()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
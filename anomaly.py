@@ -0,0 +1,332 @@
+import json
+import os
+import time
+
+import numpy as np
+
+import columnar
+import rollup
+import storage
+
+EVENTS_PATH = os.path.join(columnar.COLUMN_DIR, "anomalies.bin")
+STATE_PATH = os.path.join(columnar.COLUMN_DIR, "anomaly_state.json")
+BACKFILL_CHUNK = 200000
+
+# EWMA z-score check: each reading is compared with the exponentially weighted
+# mean/variance of the readings before it (same source and field)
+ALPHA = 0.05  # Weight of the newest reading (about a 20-reading memory)
+Z_THRESHOLD = 4.0
+WARMUP = 30  # Readings per source and field before z-scores are trusted
+
+# Noise floor for the standard deviation, so a sensor that has been perfectly
+# steady does not flag its first small change
+MIN_STD = {"temperature": 0.2, "humidity": 0.5, "air_quality": 5.0, "light_intensity": 20.0}
+
+# Rate-of-change check, in units per second
+MAX_RATE = {"temperature": 1.0, "humidity": 5.0, "air_quality": 100.0, "light_intensity": 5000.0}
+RATE_MIN_INTERVAL = 1.0  # Seconds; readings closer together than this are treated as 1 s apart
+
+KINDS = ("zscore", "rate")
+ZSCORE, RATE = range(2)
+
+# One fixed-size record per event, appended in column-store row order
+EVENT_DTYPE = np.dtype([
+    ("ts", "<i8"),
+    ("row", "<i8"),
+    ("value", "<f4"),
+    ("score", "<f4"),  # z-score, or units per second for a rate event
+    ("source", "<u2"),
+    ("field", "u1"),
+    ("kind", "u1"),
+])
+
+# Per source and field: readings seen, EWMA mean, EWMA variance, last value, last ts (ms)
+COUNT, MEAN, VAR, LAST_VALUE, LAST_TS = range(5)
+RECURRENCE_BLOCK = 128  # Keeps decay ** -n well inside float64 range
+
+
+def linear_recurrence(u, decay, y0):
+    # y[t] = decay * y[t-1] + u[t] for a whole array, using the closed form
+    # y[t] = decay**t * (y0 + sum(u[j] / decay**j)) one block at a time
+    out = np.empty(len(u))
+    for start in range(0, len(u), RECURRENCE_BLOCK):
+        block = u[start:start + RECURRENCE_BLOCK]
+        powers = decay ** np.arange(1, len(block) + 1)
+        out[start:start + len(block)] = powers * (y0 + np.cumsum(block / powers))
+        y0 = out[start + len(block) - 1]
+    return out
+
+
+class AnomalyLog:
+    # Append-only table of anomaly events in sensor_columns/anomalies.bin.
+    # Readers memory-map it; `ts` lets a timerange.TimeIndex look events up
+    # by time window. With path=None the events are kept in memory.
+
+    def __init__(self, path=EVENTS_PATH, readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.events = np.empty(0, EVENT_DTYPE)
+        self._handle = None
+        if path is not None and not readonly:
+            self._handle = open(path, "ab")
+        self.refresh()
+
+    def refresh(self):
+        if self.path is None:
+            return len(self.events)
+        try:
+            rows = os.path.getsize(self.path) // EVENT_DTYPE.itemsize
+        except FileNotFoundError:
+            rows = 0
+        if rows != len(self.events):
+            self.events = np.memmap(self.path, dtype=EVENT_DTYPE, mode="r", shape=(rows,)) if rows else np.empty(0, EVENT_DTYPE)
+        return rows
+
+    def __len__(self):
+        return len(self.events)
+
+    @property
+    def ts(self):
+        return self.events["ts"]
+
+    def append(self, events):
+        if not len(events):
+            return
+        if self._handle is None:
+            self.events = np.concatenate([self.events, events])
+            return
+        self._handle.write(events.tobytes())
+        self._handle.flush()
+        self.refresh()
+
+    def truncate(self, row):
+        # Drop events from column-store rows >= row (they are detected again on catch-up)
+        keep = int(np.searchsorted(self.events["row"], row, side="left"))
+        if keep == len(self.events):
+            return
+        if self._handle is None:
+            self.events = self.events[:keep].copy()
+            return
+        self.events = np.empty(0, EVENT_DTYPE)  # Release the map before shrinking the file
+        self._handle.truncate(keep * EVENT_DTYPE.itemsize)
+        self.refresh()
+
+    def sync(self):
+        if self._handle is not None:
+            self._handle.flush()
+            os.fsync(self._handle.fileno())
+
+    def close(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+class AnomalyDetector:
+    # Streaming EWMA z-score and rate-of-change checks, run on whole
+    # micro-batches with NumPy. State is a few numbers per source and field,
+    # and is checkpointed like the rollup index: rows not covered by the saved
+    # state are replayed from the column store on the next start.
+
+    def __init__(self, log, fields=storage.FIELDS, source_id=None, path=None):
+        self.log = log
+        self.fields = tuple(fields)
+        self.source_id = source_id
+        self.path = path
+        self.rows = 0
+        self.state = {}
+        self.found = 0
+        self._last_save = time.monotonic()
+
+    def load(self, path):
+        with open(path, "r") as file:
+            saved = json.load(file)
+        if tuple(saved["fields"]) != self.fields:
+            raise ValueError("Anomaly state was saved for different fields")
+        self.rows = saved["rows"]
+        self.state = {tuple(int(part) for part in key.split(":")): np.array(values, dtype=np.float64)
+                      for key, values in saved["state"].items()}
+
+    def save(self, path=None):
+        path = path or self.path
+        storage.write_json_atomic(path, {
+            "fields": list(self.fields),
+            "rows": self.rows,
+            "state": {f"{source}:{field}": values.tolist() for (source, field), values in self.state.items()},
+        })
+        self._last_save = time.monotonic()
+
+    def check(self, source, field_index, rows, ts, values):
+        # Events for one source/field run (valid readings only), updating its state
+        field = self.fields[field_index]
+        state = self.state.get((source, field_index))
+        if state is None:
+            state = np.array([0, values[0], 0.0, values[0], ts[0]], dtype=np.float64)
+            self.state[(source, field_index)] = state
+        decay = 1.0 - ALPHA
+        seen = state[COUNT] + np.arange(len(values))
+
+        # Mean and variance *before* each reading, then the state after the batch
+        means = linear_recurrence(ALPHA * values, decay, state[MEAN])
+        prior_means = np.concatenate([[state[MEAN]], means[:-1]])
+        deviation = values - prior_means
+        variances = linear_recurrence(ALPHA * decay * deviation ** 2, decay, state[VAR])
+        prior_variances = np.concatenate([[state[VAR]], variances[:-1]])
+
+        std = np.sqrt(np.maximum(prior_variances, MIN_STD.get(field, 0.0) ** 2))
+        z = np.divide(deviation, std, out=np.zeros_like(deviation), where=std > 0)
+        z_hits = (np.abs(z) > Z_THRESHOLD) & (seen >= WARMUP)
+
+        previous = np.concatenate([[state[LAST_VALUE]], values[:-1]])
+        previous_ts = np.concatenate([[state[LAST_TS]], ts[:-1]])
+        seconds = np.maximum((ts - previous_ts) / 1000.0, RATE_MIN_INTERVAL)
+        rates = np.abs(values - previous) / seconds
+        rate_hits = (rates > MAX_RATE.get(field, np.inf)) & (seen >= 1)
+
+        state[COUNT] += len(values)
+        state[MEAN] = means[-1]
+        state[VAR] = variances[-1]
+        state[LAST_VALUE] = values[-1]
+        state[LAST_TS] = ts[-1]
+
+        events = []
+        for kind, hits, scores in ((ZSCORE, z_hits, z), (RATE, rate_hits, rates)):
+            if hits.any():
+                found = np.empty(int(hits.sum()), EVENT_DTYPE)
+                found["ts"] = ts[hits]
+                found["row"] = rows[hits]
+                found["value"] = values[hits]
+                found["score"] = scores[hits]
+                found["source"] = source
+                found["field"] = field_index
+                found["kind"] = kind
+                events.append(found)
+        return events
+
+    def update_columns(self, columns):
+        ts = np.asarray(columns[columnar.TIMESTAMP_COLUMN], dtype=np.int64)
+        if len(ts) == 0:
+            return 0
+        rows = self.rows + np.arange(len(ts), dtype=np.int64)
+        sources = np.asarray(columns[columnar.SOURCE_COLUMN])
+        groups = [(0, slice(None))] if not sources.any() else [(int(s), sources == s) for s in np.unique(sources)]
+
+        events = []
+        for source, selected in groups:
+            for field_index, field in enumerate(self.fields):
+                valid = columns[field + ".valid"][selected].view(bool)
+                if not valid.any():
+                    continue
+                values = np.asarray(columns[field][selected][valid], dtype=np.float64)
+                events += self.check(source, field_index, rows[selected][valid], ts[selected][valid], values)
+
+        self.rows += len(ts)
+        if events:
+            events = np.concatenate(events)
+            events = events[np.argsort(events["row"], kind="stable")]
+            self.log.append(events)
+            self.found += len(events)
+            return len(events)
+        return 0
+
+    def catch_up(self, store, chunk=BACKFILL_CHUNK, stop=None):
+        # Run the checks over column-store rows not seen yet, up to row `stop`
+        # (backfill when starting from 0); rows already compacted away are skipped
+        self.rows = max(self.rows, store.first_row)
+        total_rows = store.next_row if stop is None else min(stop, store.next_row)
+        while self.rows < total_rows:
+            stop = min(self.rows + chunk, total_rows)
+            self.update_columns({name: store.arrays[name][store.position(self.rows):store.position(stop)]
+                                 for name in store.files})
+        return self.rows
+
+    def backfill(self, store):
+        # Events for rows that have been compacted away are kept
+        self.rows = 0
+        self.state = {}
+        self.log.truncate(store.first_row)
+        return self.catch_up(store)
+
+    # Ingest sink interface, so the detector can sit in a StorageGroup after the column store
+
+    def append_many(self, records):
+        if records:
+            self.update_columns(columnar.records_to_columns(records, self.fields, self.source_id))
+        if self.path and time.monotonic() - self._last_save >= rollup.CHECKPOINT_INTERVAL:
+            self.save()
+
+    def sync(self):
+        self.log.sync()
+
+    def close(self):
+        if self.path:
+            self.save()
+        self.log.close()
+
+
+def open_detector(store, events_path=EVENTS_PATH, state_path=STATE_PATH):
+    # Detector for the ingest side: resume from the saved state, drop events
+    # past it and replay the column-store rows added since
+    detector = AnomalyDetector(AnomalyLog(events_path), store.fields, store.source_id, state_path)
+    if os.path.exists(state_path):
+        try:
+            detector.load(state_path)
+        except (OSError, ValueError, KeyError):
+            detector.rows, detector.state = 0, {}
+        if detector.rows > store.next_row:
+            detector.rows, detector.state = 0, {}
+    detector.log.truncate(detector.rows)
+    detector.catch_up(store)
+    return detector
+
+
+def open_events(store, events_path=EVENTS_PATH):
+    # Event table for the chatbots: the one written during ingest, or (for a
+    # store without one) an in-memory table from a backfill over the store
+    if store.path is not None and os.path.exists(events_path):
+        return AnomalyLog(events_path, readonly=True)
+    log = AnomalyLog(None)
+    AnomalyDetector(log, store.fields, store.source_id).catch_up(store)
+    return log
+
+
+def describe(event, fields=storage.FIELDS):
+    field = fields[event["field"]]
+    if event["kind"] == RATE:
+        return f"{field} changed at {float(event['score']):.1f}/s to {float(event['value']):.1f}"
+    return f"{field} {float(event['value']):.1f} is {float(event['score']):+.1f} standard deviations from its recent average"
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser(description="Backfill or list anomaly events")
+    parser.add_argument("--columns", default=columnar.COLUMN_DIR)
+    parser.add_argument("--events", default=EVENTS_PATH)
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--backfill", action="store_true", help="rerun detection over the whole column store")
+    parser.add_argument("--last", type=int, default=20, help="number of recent events to print")
+    args = parser.parse_args()
+
+    if args.backfill:
+        # The event log is rewritten in place, so the store is opened for writing:
+        # that refuses while an ingest process is writing it, and keeps one from starting
+        if not os.path.exists(os.path.join(args.columns, columnar.META_NAME)):
+            parser.error(f"No column store in {args.columns}")
+        try:
+            store = columnar.ColumnStore(args.columns)
+        except OSError as e:
+            parser.error(str(e))
+        detector = open_detector(store, args.events, args.state)
+        started = time.perf_counter()
+        detector.backfill(store)
+        print(f"Checked {detector.rows} rows in {time.perf_counter() - started:.2f}s, {len(detector.log)} anomalies")
+        detector.close()
+        store.close()
+    store = columnar.ColumnStore(args.columns, readonly=True)
+
+    log = AnomalyLog(args.events, readonly=True)
+    for event in log.events[-args.last:] if args.last else []:
+        moment = datetime.fromtimestamp(int(event["ts"]) / 1000).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"{moment} [{store.sources[event['source']]}] {describe(event, store.fields)}")
@@ -0,0 +1,536 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tty
+from datetime import datetime
+
+import numpy as np
+
+import analytics_server
+import bulk
+import columnar
+import frames
+import pipeline
+import retention
+import storage
+
+# Benchmarks for ingest and queries on synthetic telemetry, runnable offline.
+# A simulated payload writes JSON lines or binary frames to a pseudo-terminal,
+# which the normal ingest pipeline reads like a serial port; query latency is
+# measured on the analytics service the chatbots use, without a GUI.
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = "bench_results"
+
+SIM_RATE = 1000  # Readings per second sent by the simulator
+SIM_SECONDS = 10
+SIM_NOISE = 1.0  # Multiplier on the sensor noise below
+SIM_GAPS = 0.0005  # Chance per reading that the payload goes quiet
+SIM_GAP_READINGS = 200  # Longest gap, in readings
+SIM_CORRUPT = 0.001  # Chance per reading that one byte is damaged on the link
+SIM_TICK = 0.01  # Seconds between writes to the pseudo-terminal
+DRAIN_TIMEOUT = 5.0  # Seconds to wait for the pipeline to catch up after the simulator stops
+BAUD = 115200
+
+QUERY_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)  # Pass --sizes ...,1e8 for the largest store
+QUERY_REPEATS = 50
+QUERY_FIELDS = ("temperature", "humidity")
+BUILD_CHUNK = 1000000  # Rows generated per step when building a query store
+SAMPLE_MS = 1000  # Spacing of readings in the query stores (1 Hz, ending now)
+WINDOW_SECONDS = (3600, 86400, 7 * 86400, 30 * 86400, None)  # Random query windows (None = all data)
+COLD_RUNS = 3
+CONSOLES = ("chatbot", "test")  # chatbot.py (Gemini) and test.py (Grok)
+CONSOLE_QUESTION = "average temperature"
+START_BUDGET_MS = 500  # Process start to a --headless console's first answer
+NO_SERVER_URL = "http://127.0.0.1:9"  # Nothing listens there, so consoles open the store themselves
+PERCENTILES = (50, 90, 99)
+DAY_SECONDS = 86400  # Period of the simulated daily cycle
+
+
+def simulate_readings(count, start_ms=0, interval_ms=1000, noise=SIM_NOISE, rng=None):
+    # Epoch ms and {field: float64 array} for `count` readings with a daily
+    # cycle: warm, dry and bright by day, noisy like the real sensors
+    rng = rng if rng is not None else np.random.default_rng()
+    ts = start_ms + np.arange(count, dtype=np.int64) * interval_ms
+    phase = 2 * np.pi * ((ts / 1000) % DAY_SECONDS) / DAY_SECONDS
+    daylight = np.sin(phase - np.pi / 2)
+    values = {
+        "temperature": 24 + 6 * daylight + rng.normal(0, 0.3 * noise, count),
+        "humidity": np.clip(60 - 15 * daylight + rng.normal(0, 1.5 * noise, count), 0, 100),
+        "air_quality": np.clip(80 + 40 * np.sin(phase / 2) + rng.normal(0, 8 * noise, count), 0, None),
+        "light_intensity": np.clip(1200 * daylight, 0, None) + np.abs(rng.normal(0, 20 * noise, count)),
+    }
+    return ts, values
+
+
+def gap_mask(count, gaps=SIM_GAPS, longest=SIM_GAP_READINGS, rng=None):
+    # True for readings the payload never sends; each reading starts a gap with chance `gaps`
+    rng = rng if rng is not None else np.random.default_rng()
+    missing = np.zeros(count + longest, dtype=bool)
+    for start, length in zip(np.flatnonzero(rng.random(count) < gaps), rng.integers(1, longest + 1, count)):
+        missing[start:start + length] = True
+    return missing[:count]
+
+
+def payload_messages(values, fmt="json", corrupt=SIM_CORRUPT, rng=None):
+    # Bytes as the sketches send them, one message per reading, with one
+    # byte damaged in a `corrupt` share of them. Returns (messages, damaged).
+    rng = rng if rng is not None else np.random.default_rng()
+    rounded = {field: np.round(column, 2).tolist() for field, column in values.items()}
+    records = [dict(zip(rounded, row)) for row in zip(*rounded.values())]
+    if fmt == "frames":
+        messages = [frames.encode_frame(record, seq) for seq, record in enumerate(records)]
+    else:
+        messages = [json.dumps(record).encode("utf-8") + b"\n" for record in records]
+    damaged = np.flatnonzero(rng.random(len(messages)) < corrupt)
+    for index in damaged.tolist():
+        message = bytearray(messages[index])
+        position = int(rng.integers(0, len(message) - 1))  # Never the newline ending a JSON line
+        message[position] ^= 0x40
+        messages[index] = bytes(message)
+    return messages, len(damaged)
+
+
+class PayloadSimulator(threading.Thread):
+    # Writes messages to a pseudo-terminal at `rate` per second. The other
+    # end (self.port) opens like a serial port; writes block when the reader
+    # falls behind, as a full UART buffer would stall the sender.
+
+    def __init__(self, messages, rate=SIM_RATE, skip=None):
+        super().__init__(name="payload-simulator", daemon=True)
+        self.messages = messages
+        self.rate = rate
+        self.skip = skip
+        self.sent = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # No echo or newline translation on the link
+        self.port = os.ttyname(self.slave)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self):
+        started = time.perf_counter()
+        index = 0
+        while index < len(self.messages) and not self._stop_event.is_set():
+            due = min(len(self.messages), int((time.perf_counter() - started) * self.rate) + 1)
+            if due > index:
+                picked = range(index, due)
+                if self.skip is not None:
+                    picked = [i for i in picked if not self.skip[i]]
+                    self.skipped += due - index - len(picked)
+                data = b"".join(self.messages[i] for i in picked)
+                if data:
+                    os.write(self.master, data)
+                self.sent += len(picked)
+                self.bytes += len(data)
+                index = due
+            self._stop_event.wait(SIM_TICK)
+        self.seconds = time.perf_counter() - started
+
+
+def percentiles(samples):
+    samples = np.asarray(samples, dtype=np.float64) * 1000
+    result = {f"p{p}_ms": round(float(np.percentile(samples, p)), 3) for p in PERCENTILES}
+    result["mean_ms"] = round(float(samples.mean()), 3)
+    result["max_ms"] = round(float(samples.max()), 3)
+    return result
+
+
+def store_bytes(column_dir, segments=None):
+    # Disk bytes per tier of a store laid out like sensor_columns/
+    columns = columnar.ColumnStore(column_dir, readonly=True)
+    sizes = retention.footprint(columns, os.path.join(column_dir, "rollups.npz"), segments)
+    events = os.path.join(column_dir, "anomalies.bin")
+    if os.path.exists(events):
+        sizes["anomalies"] = os.path.getsize(events)
+    return sizes
+
+
+def bench_ingest(workdir, rate=SIM_RATE, seconds=SIM_SECONDS, fmt="json", noise=SIM_NOISE, gaps=SIM_GAPS,
+                 corrupt=SIM_CORRUPT, durability=pipeline.DURABILITY_OS, log=print):
+    # Simulated payload -> pseudo-terminal -> IngestPipeline -> a fresh store
+    # group in `workdir`. Reports throughput, losses and how the store grows.
+    import serial
+
+    rng = np.random.default_rng(0)
+    count = int(rate * seconds)
+    _, values = simulate_readings(count, noise=noise, rng=rng)
+    messages, damaged = payload_messages(values, fmt, corrupt, rng)
+    skip = gap_mask(count, gaps, rng=rng)
+
+    previous = os.getcwd()
+    os.chdir(workdir)  # The store group uses paths relative to the working directory
+    try:
+        group = pipeline.open_store_group(log=lambda message: None)
+        segments, columns = group.backends[:2]
+        simulator = PayloadSimulator(messages, rate, skip)
+        ser = serial.Serial(simulator.port, BAUD, timeout=pipeline.READ_TIMEOUT)
+        ingest = pipeline.IngestPipeline(ser, group, durability=durability)
+        growth = []
+        ingest.start()
+        simulator.start()
+        started = time.perf_counter()
+        while simulator.is_alive():
+            simulator.join(1.0)
+            growth.append({"seconds": round(time.perf_counter() - started, 2), "committed": ingest.writer.committed,
+                           "bytes": columns.disk_bytes() + segments.disk_bytes()})
+        # Let the pipeline drain whatever is still on the link or queued
+        deadline = time.monotonic() + DRAIN_TIMEOUT
+        last = -1
+        elapsed = time.perf_counter() - started
+        while time.monotonic() < deadline:
+            stats = ingest.stats()
+            handled = stats["committed"] + stats["parse_errors"] + stats["crc_errors"] + stats["dropped"]
+            if handled == last and stats["queue_depth"] == 0:
+                break
+            if handled != last:
+                elapsed = time.perf_counter() - started  # Until the last reading was handled
+            last = handled
+            time.sleep(0.05)
+        ingest.stop()
+        ser.close()
+        simulator.close()
+        group.close()
+        stats = ingest.stats()
+        sizes = store_bytes(columnar.COLUMN_DIR, storage.SegmentStorage(storage.STORE_DIR, readonly=True))
+    finally:
+        os.chdir(previous)
+
+    intact = simulator.sent - damaged
+    result = {
+        "format": fmt,
+        "target_rate": rate,
+        "sent": simulator.sent,
+        "skipped_in_gaps": simulator.skipped,
+        "damaged": damaged,
+        "sent_per_s": round(simulator.sent / max(simulator.seconds, 1e-9), 1),
+        "link_bytes_per_reading": round(simulator.bytes / max(simulator.sent, 1), 2),
+        "committed": stats["committed"],
+        "committed_per_s": round(stats["committed"] / max(elapsed, 1e-9), 1),
+        "drop_rate": round(max(0, intact - stats["committed"]) / max(intact, 1), 6),
+        "queue_dropped": stats["dropped"],
+        "parse_errors": stats["parse_errors"],
+        "crc_errors": stats["crc_errors"],
+        "backpressure_waits": stats["backpressure_waits"],
+        "max_queue_depth": stats["max_queue_depth"],
+        "last_commit_ms": stats["last_commit_ms"],
+        "disk_bytes": sizes,
+        "disk_bytes_per_reading": round(sum(sizes.values()) / max(stats["committed"], 1), 2),
+        "growth": growth,
+    }
+    log(f"Ingest ({fmt}): {result['committed_per_s']:,.0f} readings/s committed of {result['sent_per_s']:,.0f} sent, "
+        f"drop rate {result['drop_rate']:.4%}, {result['disk_bytes_per_reading']} bytes/reading on disk")
+    return result
+
+
+def build_store(column_dir, rows, log=print):
+    # Column store of `rows` 1 Hz readings ending now, with its rollup index
+    # and anomaly events, as an ingest side would leave it
+    rng = np.random.default_rng(rows)
+    store = columnar.ColumnStore(column_dir)
+    start_ms = (int(time.time()) - rows) * 1000
+    started = time.perf_counter()
+    for first in range(0, rows, BUILD_CHUNK):
+        count = min(BUILD_CHUNK, rows - first)
+        ts, values = simulate_readings(count, start_ms + first * SAMPLE_MS, SAMPLE_MS, rng=rng)
+        store.append_columns(bulk.make_columns(store, ts, values))
+    written = time.perf_counter() - started
+    bulk.finish_import(store, 0, os.path.join(column_dir, "rollups.npz"), os.path.join(column_dir, "anomalies.bin"),
+                       os.path.join(column_dir, "anomaly_state.json"))
+    store.close()
+    indexed = time.perf_counter() - started - written
+    log(f"Built {rows:,} rows in {written:.1f}s, indexed in {indexed:.1f}s")
+    return {"write_s": round(written, 3), "index_s": round(indexed, 3)}
+
+
+def random_questions(analytics, repeats, rng):
+    # "between A and B" windows of assorted lengths inside the stored span
+    first, last = analytics.engine.first_ts(), analytics.engine.last_ts()
+    questions = []
+    for length in rng.choice(len(WINDOW_SECONDS), repeats).tolist():
+        seconds = WINDOW_SECONDS[length]
+        if seconds is None or seconds * 1000 >= last - first:
+            start, end = first, last + 1000
+        else:
+            start = int(rng.integers(first, last - seconds * 1000))
+            end = start + seconds * 1000
+        fmt = "%Y-%m-%d %H:%M:%S"
+        questions.append(f"between {datetime.fromtimestamp(start / 1000).strftime(fmt)} "
+                         f"and {datetime.fromtimestamp(end / 1000).strftime(fmt)}")
+    return questions
+
+
+def bench_queries(column_dir, repeats=QUERY_REPEATS, log=print):
+    # Latency of the chatbot queries on the analytics service, every call a
+    # cache miss except the "*_cached" ones
+    rng = np.random.default_rng(1)
+    started = time.perf_counter()
+    analytics = analytics_server.Analytics(column_dir, os.path.join(column_dir, "no_segments"),
+                                           os.path.join(column_dir, "no_legacy.json"),
+                                           os.path.join(column_dir, "rollups.npz"),
+                                           os.path.join(column_dir, "anomalies.bin"))
+    opened = time.perf_counter() - started
+    windows = random_questions(analytics, repeats, rng)
+    fields = [QUERY_FIELDS[i % len(QUERY_FIELDS)] for i in range(repeats)]
+    queries = {
+        # The process_query() path: a windowed average answered as text
+        "stats": lambda i: analytics.answer(f"average {fields[i]} {windows[i]}"),
+        # Count, min, max and mean for a window
+        "range": lambda i: analytics.stats(fields[i], windows[i]),
+        # A graph's downsampled series
+        "series": lambda i: analytics.series([fields[i]], windows[i]),
+    }
+    result = {"open_ms": round(opened * 1000, 3)}
+    for name, query in queries.items():
+        samples = []
+        for i in range(repeats):
+            analytics.cache.clear()
+            began = time.perf_counter()
+            query(i)
+            samples.append(time.perf_counter() - began)
+        result[name] = percentiles(samples)
+        samples = []
+        for i in range(repeats):
+            began = time.perf_counter()
+            query(0)
+            samples.append(time.perf_counter() - began)
+        result[name + "_cached"] = percentiles(samples)
+    log(f"Queries on {analytics.data.next_row:,} rows: " + ", ".join(
+        f"{name} p50 {result[name]['p50_ms']:.2f} ms p99 {result[name]['p99_ms']:.2f} ms" for name in queries))
+    return result
+
+
+COLD_START_CODE = """
+import json, sys, time
+started = time.perf_counter()
+import analytics_server
+imported = time.perf_counter()
+analytics = analytics_server.Analytics(*sys.argv[1:6])
+opened = time.perf_counter()
+analytics.answer("average temperature")
+answered = time.perf_counter()
+print(json.dumps({"import_ms": (imported - started) * 1000, "open_ms": (opened - imported) * 1000,
+                  "first_answer_ms": (answered - opened) * 1000}))
+"""
+
+
+def bench_cold_start(column_dir, runs=COLD_RUNS):
+    # A new process importing the analytics service, opening the store and
+    # answering one question (files may still be in the OS page cache)
+    paths = [column_dir, os.path.join(column_dir, "no_segments"), os.path.join(column_dir, "no_legacy.json"),
+             os.path.join(column_dir, "rollups.npz"), os.path.join(column_dir, "anomalies.bin")]
+    samples = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", COLD_START_CODE] + paths, cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        total = time.perf_counter() - began
+        samples.append({**json.loads(output), "process_ms": total * 1000})
+    return {key: round(float(np.median([sample[key] for sample in samples])), 3) for key in samples[0]}
+
+
+IMPORT_CODE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({"import_ms": (time.perf_counter() - started) * 1000}))
+"""
+
+
+def bench_console_start(column_dir, runs=COLD_RUNS):
+    # Each chat console in a new process: importing it (all the window waits
+    # for before it appears; data loads behind it) and answering one question
+    # with --headless on this store, from process start to the printed answer
+    workdir = tempfile.mkdtemp(prefix="console-", dir=os.path.dirname(os.path.abspath(column_dir)))
+    os.symlink(os.path.abspath(column_dir), os.path.join(workdir, columnar.COLUMN_DIR))
+    env = {**os.environ, "ANALYTICS_URL": NO_SERVER_URL}
+    result = {}
+    for console in CONSOLES:
+        imports, answers = [], []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, "-c", IMPORT_CODE, console], cwd=REPO_DIR, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            imports.append(json.loads(output)["import_ms"])
+            began = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(REPO_DIR, console + ".py"), "--headless", CONSOLE_QUESTION],
+                           cwd=workdir, env=env, capture_output=True, text=True, check=True)
+            answers.append((time.perf_counter() - began) * 1000)
+        result[console] = {"import_ms": round(float(np.median(imports)), 3),
+                           "headless_answer_ms": round(float(np.median(answers)), 3)}
+    return result
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip() != ""
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def run(args, log=print):
+    commit, dirty = git_revision()
+    results = {
+        "version": 1,
+        "commit": commit,
+        "dirty": dirty,
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                 "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("command", "output", "workdir")},
+    }
+    workdir = args.workdir or tempfile.mkdtemp(prefix="bench-")
+    os.makedirs(workdir, exist_ok=True)
+    log(f"Working in {workdir}")
+
+    if "ingest" in args.scenarios:
+        results["ingest"] = {}
+        for fmt in args.formats:
+            path = tempfile.mkdtemp(prefix=f"ingest-{fmt}-", dir=workdir)
+            results["ingest"][fmt] = bench_ingest(path, args.rate, args.seconds, fmt, args.noise, args.gaps,
+                                                  args.corrupt, args.durability, log)
+
+    if "queries" in args.scenarios or "cold" in args.scenarios:
+        results["stores"] = {}
+        for rows in args.sizes:
+            column_dir = os.path.join(workdir, f"rows-{rows}")
+            if not os.path.exists(os.path.join(column_dir, columnar.META_NAME)):
+                build = build_store(column_dir, rows, log)
+            else:
+                build = None  # Reused from an earlier run with the same --workdir
+            entry = {"rows": rows, "build": build, "disk_bytes": store_bytes(column_dir)}
+            entry["disk_bytes_per_reading"] = round(sum(entry["disk_bytes"].values()) / rows, 2)
+            if "queries" in args.scenarios:
+                entry["queries"] = bench_queries(column_dir, args.repeats, log)
+            if "cold" in args.scenarios:
+                entry["cold_start"] = bench_cold_start(column_dir, args.cold_runs)
+                log(f"Cold start on {rows:,} rows: {entry['cold_start']['process_ms']:.0f} ms")
+                entry["console_start"] = bench_console_start(column_dir, args.cold_runs)
+                for console, start in entry["console_start"].items():
+                    slow = start["headless_answer_ms"] > START_BUDGET_MS
+                    log(f"{console}.py on {rows:,} rows: import {start['import_ms']:.0f} ms, headless answer "
+                        f"{start['headless_answer_ms']:.0f} ms" + (f" (over the {START_BUDGET_MS} ms budget)" if slow else ""))
+            results["stores"][str(rows)] = entry
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit or 'nogit'}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    storage.write_json_atomic(output, results)
+    log(f"Results written to {output}")
+    return results
+
+
+def flatten(value, prefix=""):
+    # {"a": {"b": 1}} -> {"a.b": 1}, numbers only; growth samples are left out
+    if isinstance(value, dict):
+        items = {}
+        for key, item in value.items():
+            if key not in ("growth", "config", "host"):
+                items.update(flatten(item, f"{prefix}{key}."))
+        return items
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix[:-1]: value}
+    return {}
+
+
+def lower_is_better(name):
+    # None for counts and settings that are neither better nor worse
+    last = name.rsplit(".", 1)[-1]
+    if last.endswith("per_s"):
+        return False
+    if last.endswith(("_ms", "_s", "drop_rate", "bytes_per_reading")) or "disk_bytes" in name:
+        return True
+    return None
+
+
+def compare(old, new, threshold, log=print):
+    # Metrics present in both runs; those worse by more than `threshold` are flagged
+    before, after = flatten(old), flatten(new)
+    regressions = 0
+    log(f"{'metric':58} {old.get('commit') or '?':>15} {new.get('commit') or '?':>15}   change")
+    for name in sorted(set(before) & set(after)):
+        direction = lower_is_better(name)
+        if direction is None:
+            continue
+        a, b = before[name], after[name]
+        change = (b - a) / abs(a) if a else (0.0 if b == a else float("inf"))
+        worse = change > threshold if direction else change < -threshold
+        regressions += worse
+        log(f"{name:58} {a:>15,.3f} {b:>15,.3f} {change:>+8.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+if __name__ == "__main__":
+    import argparse
+
+    def sizes(text):
+        return [int(float(size)) for size in text.split(",") if size]
+
+    parser = argparse.ArgumentParser(description="Benchmark ingest and queries on simulated telemetry")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = commands.add_parser("run", help="run the benchmark scenarios and save the results as JSON")
+    bench.add_argument("--scenarios", type=lambda text: text.split(","), default=["ingest", "queries", "cold"],
+                       help="comma-separated: ingest, queries, cold")
+    bench.add_argument("--formats", type=lambda text: text.split(","), default=["json", "frames"],
+                       help="payload formats for the ingest scenario")
+    bench.add_argument("--sizes", type=sizes, default=list(QUERY_SIZES), help="store sizes for queries, e.g. 1e3,1e6,1e8")
+    bench.add_argument("--repeats", type=int, default=QUERY_REPEATS, help="queries per kind and store size")
+    bench.add_argument("--cold-runs", type=int, default=COLD_RUNS)
+    bench.add_argument("--output", help=f"results file (default: {RESULTS_DIR}/<time>-<commit>.json)")
+    bench.add_argument("--workdir", help="where stores are built; kept and reused if given (default: a new temporary directory)")
+    bench.add_argument("--durability", default=pipeline.DURABILITY_OS, choices=[pipeline.DURABILITY_OS, pipeline.DURABILITY_FSYNC])
+    simulate = commands.add_parser("simulate", help="run the payload simulator on a pseudo-terminal")
+    simulate.add_argument("--format", default="json", choices=["json", "frames"])
+    for command in (bench, simulate):
+        command.add_argument("--rate", type=float, default=SIM_RATE, help="readings per second")
+        command.add_argument("--seconds", type=float, default=SIM_SECONDS, help="how long to send")
+        command.add_argument("--noise", type=float, default=SIM_NOISE, help="sensor noise multiplier")
+        command.add_argument("--gaps", type=float, default=SIM_GAPS, help="chance per reading of a gap in the payload")
+        command.add_argument("--corrupt", type=float, default=SIM_CORRUPT, help="chance per reading of a damaged byte")
+
+    check = commands.add_parser("compare", help="compare two results files")
+    check.add_argument("old")
+    check.add_argument("new")
+    check.add_argument("--threshold", type=float, default=0.1, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+    elif args.command == "simulate":
+        # Point Upload2db.py or "ingest_daemon.py --serial PORT" at the printed port
+        rng = np.random.default_rng()
+        count = int(args.rate * args.seconds)
+        _, values = simulate_readings(count, noise=args.noise, rng=rng)
+        messages, damaged = payload_messages(values, args.format, args.corrupt, rng)
+        simulator = PayloadSimulator(messages, args.rate, gap_mask(count, args.gaps, rng=rng))
+        print(f"Sending {count} readings as {args.format} on {simulator.port} ({damaged} damaged)")
+        simulator.start()
+        try:
+            simulator.join()
+        except KeyboardInterrupt:
+            simulator.stop()
+        print(f"Sent {simulator.sent} readings, {simulator.bytes} bytes in {simulator.seconds:.1f}s")
+        simulator.close()
+    else:
+        with open(args.old, "r") as file:
+            old = json.load(file)
+        with open(args.new, "r") as file:
+            new = json.load(file)
+        sys.exit(1 if compare(old, new, args.threshold) else 0)
@@ -0,0 +1,577 @@
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import anomaly
+import columnar
+import pipeline
+import rollup
+import storage
+import timerange
+
+# Bulk loading and export straight between files and the column store. CSV
+# is read in blocks of whole lines that are decoded with NumPy, with no dict
+# per reading; the rollup index and anomaly checks run once at the end.
+CHUNK_BYTES = 16 << 20  # CSV bytes decoded per step
+CHUNK_ROWS = 500000  # Rows per step for Parquet, legacy JSON and export
+PROGRESS_PATH = os.path.join(columnar.COLUMN_DIR, "import_progress.json")
+PROGRESS_INTERVAL = 2.0  # Seconds between progress lines
+EXPORT_DECIMALS = 3
+
+# Timestamp columns: epoch seconds, epoch milliseconds, or ISO 8601 local time
+TIME_SCALES = {"ts": 1000, "ts_ms": 1}
+ISO_TIME_COLUMNS = ("time", "timestamp", "datetime")
+SOURCE_COLUMN = "source"
+MISSING = {"", "nan", "null", "none", "na"}
+
+COMMA, NEWLINE, DOT, MINUS, QUOTE, SPACE, CR = b",\n.-\" \r"
+POW10 = 10.0 ** np.arange(19)
+MAX_DIGITS = 15  # Longest digit string that adds up exactly in float64
+
+# Byte classes for parse_block()
+OTHER, DIGIT, SEPARATOR, DOT_KIND, MINUS_KIND, BLANK, QUOTED = range(7)
+BYTE_KINDS = np.full(256, OTHER, dtype=np.uint8)
+BYTE_KINDS[48:58] = DIGIT
+BYTE_KINDS[[COMMA, NEWLINE]] = SEPARATOR
+BYTE_KINDS[DOT] = DOT_KIND
+BYTE_KINDS[MINUS] = MINUS_KIND
+BYTE_KINDS[[SPACE, CR]] = BLANK
+BYTE_KINDS[QUOTE] = QUOTED
+
+
+def header_roles(names):
+    # What each CSV/Parquet column holds: ("ts", scale), ("time",), ("field", name),
+    # ("source",) or None for columns that are not imported
+    roles = []
+    found_time = False
+    for name in names:
+        key = name.strip()
+        key = pipeline.FIELD_ALIASES.get(key, key)
+        if key in TIME_SCALES and not found_time:
+            roles.append(("ts", TIME_SCALES[key]))
+            found_time = True
+        elif key.lower() in ISO_TIME_COLUMNS and not found_time:
+            roles.append(("time",))
+            found_time = True
+        elif key in storage.FIELDS:
+            roles.append(("field", key))
+        elif key == SOURCE_COLUMN:
+            roles.append(("source",))
+        else:
+            roles.append(None)
+    if not found_time:
+        raise ValueError(f"No timestamp column (one of {', '.join(list(TIME_SCALES) + list(ISO_TIME_COLUMNS))})")
+    return roles
+
+
+def parse_block(buf, roles):
+    # Decode a block of whole CSV lines (uint8 array, every line ending in
+    # \n) into a (rows, columns) float64 array in one pass. Numbers are added
+    # up from their digits with bincount; fields without digits ("", "nan",
+    # "null") are NaN. Returns (values, field ends), or None when the block
+    # needs the csv module (quotes, exponents, ISO times, ragged lines).
+    columns = len(roles)
+    kind = BYTE_KINDS[buf]
+    if (kind == QUOTED).any():
+        return None
+    separator = kind == SEPARATOR
+    ends = np.flatnonzero(separator)
+    if len(ends) % columns:
+        return None
+    kinds = buf[ends].reshape(-1, columns)
+    if not (kinds[:, -1] == NEWLINE).all() or not (kinds[:, :-1] == COMMA).all():
+        return None
+
+    # Field number of every byte (a separator counts towards the field it ends)
+    field_of = np.cumsum(separator, dtype=np.int32)
+    field_of -= separator
+    digit = kind == DIGIT
+    positions = np.flatnonzero(digit)
+    field = field_of[positions]
+    counts = np.bincount(field, minlength=len(ends))
+    numeric = np.tile([role is not None and role[0] in ("ts", "field") for role in roles], len(kinds))
+    if counts[numeric].max(initial=0) > MAX_DIGITS:
+        return None
+
+    # Anything besides digits, one dot, a leading minus sign and blanks around
+    # the number (an exponent, a date, "1 2") is left to the csv module
+    dots = np.flatnonzero(kind == DOT_KIND)
+    dot_field = field_of[dots]
+    other = np.bincount(field_of[kind == OTHER], minlength=len(ends)) > 0
+    if (other & numeric & (counts > 0)).any() or ((np.bincount(dot_field, minlength=len(ends)) > 1) & numeric).any():
+        return None
+    body = digit | (kind == DOT_KIND) | (kind == MINUS_KIND)
+    positions_body = np.flatnonzero(body)
+    body_field = field_of[positions_body]
+    gap = (np.diff(positions_body) != 1) & (body_field[1:] == body_field[:-1])
+    minus = np.flatnonzero(kind == MINUS_KIND)
+    # A minus after a digit, dot or minus of its field (minus - 1 wraps to the final \n at 0)
+    inner_minus = body[minus - 1] & (field_of[minus - 1] == field_of[minus])
+    if (gap & numeric[body_field[1:]]).any() or (inner_minus & numeric[field_of[minus]]).any():
+        return None
+
+    # Each digit is worth 10 ** (digits after it in its field); a dot then
+    # divides by 10 ** (digits after the dot)
+    total = np.cumsum(counts)
+    power = total[field] - np.arange(len(positions)) - 1
+    values = np.bincount(field, weights=(buf[positions] - 48) * POW10[power], minlength=len(ends))
+    values[dot_field] /= POW10[total[dot_field] - np.cumsum(digit, dtype=np.int32)[dots]]
+    values[field_of[minus]] *= -1
+    values[counts == 0] = np.nan
+    return values.reshape(-1, columns), ends
+
+
+def text_fields(buf, ends, columns, column):
+    # One text column as (distinct values, index per row), read through a
+    # fixed-width byte matrix so there is no per-row Python work
+    starts = np.concatenate([[0], ends[:-1] + 1])[column::columns]
+    stops = ends[column::columns]
+    width = int((stops - starts).max(initial=0))
+    if width == 0:
+        return [""], np.zeros(len(starts), dtype=np.intp)
+    index = starts[:, None] + np.arange(width)
+    chars = np.where(index < stops[:, None], buf[np.minimum(index, len(buf) - 1)], 0).astype(np.uint8)
+    keys, inverse = np.unique(chars.view(f"V{width}").ravel(), return_inverse=True)
+    return [bytes(key).rstrip(b"\0").decode("utf-8").strip() for key in keys], inverse.ravel()
+
+
+def parse_text(data, roles):
+    # General path for CSV blocks parse_block() cannot take
+    rows = list(csv.reader(io.StringIO(data.decode("utf-8"))))
+    rows = [(row + [""] * len(roles))[:len(roles)] for row in rows if row]  # Short lines get empty cells
+    values = np.full((len(rows), len(roles)), np.nan)
+    texts = {}
+    for column, role in enumerate(roles):
+        if role is None:
+            continue
+        cells = [row[column].strip() for row in rows]
+        if role[0] == "time":
+            texts[column] = cells
+            continue
+        if role[0] == "source":
+            names, inverse = np.unique(np.array(cells, dtype=str), return_inverse=True)
+            texts[column] = names.tolist(), inverse.ravel()
+            continue
+        for i, cell in enumerate(cells):
+            if cell.lower() not in MISSING:
+                try:
+                    values[i, column] = float(cell)
+                except ValueError:
+                    pass
+    return values, texts
+
+
+def iso_to_ms(cells):
+    # ISO 8601 times; ones without a zone are local time, like the legacy date/time keys
+    out = np.full(len(cells), np.nan)
+    for i, cell in enumerate(cells):
+        try:
+            out[i] = datetime.fromisoformat(cell).timestamp() * 1000
+        except ValueError:
+            pass
+    return out
+
+
+def table_columns(store, roles, values, texts):
+    # Column-store arrays for a decoded block; rows without a timestamp are dropped
+    columns = {}
+    for column, role in enumerate(roles):
+        if role is None:
+            continue
+        if role[0] == "ts":
+            ts = values[:, column] * role[1]
+        elif role[0] == "time":
+            ts = iso_to_ms(texts[column])
+        elif role[0] == "field":
+            columns[role[1]] = values[:, column]
+    keep = np.isfinite(ts)
+    columns = {field: column[keep] for field, column in columns.items()}
+    sources = None
+    for column, role in enumerate(roles):
+        if role is not None and role[0] == "source":
+            names, inverse = texts[column]
+            sources = names, inverse[keep]
+    return make_columns(store, np.rint(ts[keep]).astype(columnar.TIMESTAMP_DTYPE), columns, sources)
+
+
+def make_columns(store, ts, values, sources=None):
+    # `values` maps field -> float array (NaN = missing); `sources` is
+    # (names, index into names per row), or None for the default source
+    columns = {columnar.TIMESTAMP_COLUMN: ts}
+    if sources is None:
+        columns[columnar.SOURCE_COLUMN] = np.zeros(len(ts), dtype=columnar.SOURCE_DTYPE)
+    else:
+        names, inverse = sources
+        ids = np.array([store.source_id(name or None) for name in names], dtype=columnar.SOURCE_DTYPE)
+        columns[columnar.SOURCE_COLUMN] = ids[inverse]
+    for field in store.fields:
+        column = values.get(field)
+        if column is None:
+            column = np.full(len(ts), np.nan)
+        valid = np.isfinite(column)
+        columns[field] = column.astype(columnar.VALUE_DTYPE)
+        columns[field + ".valid"] = valid.view(columnar.VALID_DTYPE)
+    return columns
+
+
+def read_csv(path, store, offset=0):
+    # Yields (column-store arrays, byte offset reached) per block of lines
+    with open(path, "rb") as file:
+        header = file.readline()
+        roles = header_roles(next(csv.reader([header.decode("utf-8-sig")])))
+        iso_time = ("time",) in roles
+        if offset:
+            file.seek(offset)
+        pending = b""
+        while True:
+            chunk = file.read(CHUNK_BYTES)
+            data = pending + chunk
+            if not chunk:
+                if not data.strip():
+                    break
+                data += b"\n"
+            cut = data.rfind(b"\n") + 1
+            block, pending = data[:cut], data[cut:]
+            position = file.tell() - len(pending)
+            buf = np.frombuffer(block, dtype=np.uint8)
+            parsed = None if iso_time else parse_block(buf, roles)
+            if parsed is not None:
+                values, ends = parsed
+                texts = {column: text_fields(buf, ends, len(roles), column)
+                         for column, role in enumerate(roles) if role is not None and role[0] == "source"}
+            else:
+                values, texts = parse_text(block, roles)
+            yield table_columns(store, roles, values, texts), position
+            if not chunk:
+                break
+
+
+def read_parquet(path, store, offset=0):
+    # Yields (column-store arrays, rows read) per record batch; needs pyarrow
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    roles = header_roles(parquet.schema_arrow.names)
+    done = 0
+    for batch in parquet.iter_batches(batch_size=CHUNK_ROWS):
+        if done + batch.num_rows <= offset:
+            done += batch.num_rows
+            continue
+        if done < offset:
+            batch = batch.slice(offset - done)
+            done = offset
+        values = np.full((batch.num_rows, len(roles)), np.nan)
+        texts = {}
+        for column, role in enumerate(roles):
+            if role is None:
+                continue
+            array = batch.column(column)
+            if pa.types.is_timestamp(array.type):
+                # Zone-aware or naive-as-UTC timestamps become epoch milliseconds
+                values[:, column] = array.cast(pa.timestamp("ms", array.type.tz)).cast(pa.int64()).to_numpy(zero_copy_only=False)
+                roles[column] = ("ts", 1)
+            elif role[0] in ("time", "source"):
+                cells = ["" if cell is None else str(cell) for cell in array.to_pylist()]
+                if role[0] == "source":
+                    names, inverse = np.unique(np.array(cells, dtype=str), return_inverse=True)
+                    cells = names.tolist(), inverse.ravel()
+                texts[column] = cells
+            else:
+                values[:, column] = array.cast(pa.float64()).to_numpy(zero_copy_only=False)
+        done += batch.num_rows
+        yield table_columns(store, roles, values, texts), done
+
+
+def read_legacy(path, store, offset=0):
+    # Yields (column-store arrays, readings read) from the old TinyDB document.
+    # It is one JSON object, so it is loaded whole, but the readings are turned
+    # into arrays a day at a time with no dict per reading.
+    with open(path, "r") as file:
+        days = json.load(file).get("_default", {}).get("1", {})
+    done = 0
+    batch_ts, batch_values = [], {field: [] for field in storage.FIELDS}
+    for date_str in sorted(days):
+        readings = days[date_str]
+        times = sorted(readings)
+        if done + len(times) <= offset:
+            done += len(times)
+            continue
+        if done < offset:
+            times = times[offset - done:]
+            done = offset
+        ts = legacy_day_ms(date_str, times)
+        batch_ts.append(ts)
+        for field in storage.FIELDS:
+            batch_values[field].append(np.array([readings[t].get(field) for t in times], dtype=np.float64))
+        done += len(times)
+        if sum(len(ts) for ts in batch_ts) >= CHUNK_ROWS:
+            yield make_columns(store, np.concatenate(batch_ts), {f: np.concatenate(v) for f, v in batch_values.items()}), done
+            batch_ts, batch_values = [], {field: [] for field in storage.FIELDS}
+    if batch_ts:
+        yield make_columns(store, np.concatenate(batch_ts), {f: np.concatenate(v) for f, v in batch_values.items()}), done
+
+
+def legacy_day_ms(date_str, times):
+    # Epoch ms for "HH:MM:SS" keys of one local day; a day with a DST change
+    # is converted reading by reading, like storage.iter_legacy_records
+    midnight = datetime.strptime(date_str, "%Y-%m-%d")
+    start, end = midnight.timestamp(), (midnight + timedelta(days=1)).timestamp()
+    if end - start != 86400:
+        return np.array([round(datetime.strptime(f"{date_str} {t}", "%Y-%m-%d %H:%M:%S").timestamp() * 1000) for t in times],
+                        dtype=np.int64)
+    parts = np.array([t.split(":") for t in times], dtype=np.int64).reshape(-1, 3)
+    return (round(start * 1000) + (parts @ np.array([3600, 60, 1])) * 1000).astype(np.int64)
+
+
+READERS = {".csv": read_csv, ".parquet": read_parquet, ".json": read_legacy}
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return {"file": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_progress(path, progress_path=PROGRESS_PATH):
+    # Saved position of an interrupted import of this same file, or None
+    try:
+        with open(progress_path, "r") as file:
+            progress = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    return progress if all(progress.get(key) == value for key, value in file_key(path).items()) else None
+
+
+def import_file(path, store, progress_path=PROGRESS_PATH, resume=True, log=print):
+    # Stream a CSV, Parquet or legacy JSON file into the column store. A
+    # checkpoint after every block lets an interrupted import carry on where
+    # it stopped: rows past the last checkpoint are cut off and read again.
+    # Imported rows are not copied to the segment store, which only journals
+    # what ingest received; the column store is the copy of every reading.
+    reader = READERS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        raise ValueError(f"Unsupported file type: {path} (use .csv, .parquet or .json)")
+    progress = load_progress(path, progress_path) if resume else None
+    if progress is not None:
+        store.truncate(progress["store_rows"])
+        first_row, offset, rows = progress["first_row"], progress["offset"], progress["rows"]
+        log(f"Resuming {path} at row {rows}")
+    else:
+        first_row, offset, rows = store.next_row, 0, 0
+
+    size = os.path.getsize(path)
+    started = last_report = time.perf_counter()
+    resumed_rows = rows
+    for columns, offset in reader(path, store, offset):
+        store.append_columns(columns)
+        store.sync()
+        rows += len(columns[columnar.TIMESTAMP_COLUMN])
+        storage.write_json_atomic(progress_path, {**file_key(path), "first_row": first_row, "offset": offset,
+                                                  "rows": rows, "store_rows": store.next_row})
+        if time.perf_counter() - last_report >= PROGRESS_INTERVAL:
+            last_report = time.perf_counter()
+            done = f" ({offset / size:.0%})" if reader is read_csv and size else ""
+            log(f"Imported {rows} rows{done}, {(rows - resumed_rows) / (last_report - started):,.0f} rows/s")
+    return first_row, rows, rows - resumed_rows, time.perf_counter() - started
+
+
+def finish_import(store, first_row, rollup_path=rollup.ROLLUP_PATH, events_path=anomaly.EVENTS_PATH,
+                  state_path=anomaly.STATE_PATH):
+    # Bring the rollup index and anomaly events up to date in one pass over
+    # the new rows. Imported history is checked on its own: it starts from a
+    # fresh detector state, and the state of the live stream is kept.
+    rollups = rollup.open_index(store, rollup_path)
+    rollups.save()
+    detector = anomaly.AnomalyDetector(anomaly.AnomalyLog(events_path), store.fields, store.source_id, state_path)
+    if os.path.exists(state_path):
+        try:
+            detector.load(state_path)
+        except (OSError, ValueError, KeyError):
+            detector.rows, detector.state = 0, {}
+    if detector.rows > store.next_row:
+        detector.rows, detector.state = 0, {}
+    detector.log.truncate(detector.rows)
+    detector.catch_up(store, stop=first_row)
+    live, detector.state = detector.state, {}
+    detector.catch_up(store)
+    detector.state = live
+    detector.close()
+    return rollups.rows, detector.found
+
+
+def fixed_point_text(scaled, decimals, valid):
+    # ASCII for integers scaled by 10 ** decimals, without trailing zeros, as
+    # a (rows, width) byte matrix and a mask of the bytes to keep
+    magnitude = np.abs(scaled)
+    width = max(len(str(int(magnitude.max(initial=0)))), decimals + 1)
+    place = np.arange(width - 1, -1, -1)  # Power of ten of each digit column
+    digits = (magnitude[:, None] // 10 ** place) % 10
+    keep = np.where(place >= decimals, (magnitude[:, None] >= 10 ** place) | (place == decimals),
+                    magnitude[:, None] % 10 ** (place + 1) != 0)
+    whole, fraction = width - decimals, decimals
+    chars = np.empty((len(scaled), width + 2), dtype=np.uint8)
+    mask = np.empty(chars.shape, dtype=bool)
+    chars[:, 0], mask[:, 0] = MINUS, (scaled < 0)
+    chars[:, 1:1 + whole], mask[:, 1:1 + whole] = digits[:, :whole] + 48, keep[:, :whole]
+    chars[:, 1 + whole], mask[:, 1 + whole] = DOT, magnitude % 10 ** decimals != 0 if decimals else False
+    chars[:, 2 + whole:], mask[:, 2 + whole:] = digits[:, whole:] + 48, keep[:, whole:]
+    mask &= valid[:, None]
+    return chars, mask
+
+
+def label_text(ids, names):
+    # Byte matrix and mask for a column of labels picked from `names` by id
+    encoded = [name.encode("utf-8") for name in names]
+    width = max((len(name) for name in encoded), default=0) or 1
+    table = np.zeros((len(encoded), width), dtype=np.uint8)
+    for row, name in enumerate(encoded):
+        table[row, :len(name)] = np.frombuffer(name, dtype=np.uint8)
+    lengths = np.array([len(name) for name in encoded])
+    return table[ids], np.arange(width) < lengths[ids][:, None]
+
+
+def csv_block(pieces):
+    # Join (chars, mask) pieces into CSV lines; every row keeps its own bytes in order
+    rows = len(pieces[0][0])
+    chars, masks = [], []
+    for index, (piece_chars, piece_mask) in enumerate(pieces):
+        chars.append(piece_chars)
+        masks.append(piece_mask)
+        separator = np.full((rows, 1), NEWLINE if index == len(pieces) - 1 else COMMA, dtype=np.uint8)
+        chars.append(separator)
+        masks.append(np.ones((rows, 1), dtype=bool))
+    return np.hstack(chars)[np.hstack(masks)].tobytes()
+
+
+def export_rows(store, window=None):
+    # Row selectors of the raw rows inside the window, in time order, CHUNK_ROWS at a time
+    rows = timerange.TimeIndex(store).range_rows(*(window[:2] if window else (None, None)))
+    if isinstance(rows, slice):
+        for start in range(rows.start, rows.stop, CHUNK_ROWS):
+            yield slice(start, min(start + CHUNK_ROWS, rows.stop))
+    else:
+        for start in range(0, len(rows), CHUNK_ROWS):
+            yield rows[start:start + CHUNK_ROWS]
+
+
+def export_csv(store, path, fields, window=None, with_source=False):
+    count = 0
+    with open(path, "wb") as file:
+        file.write((",".join(["ts"] + list(fields) + ([SOURCE_COLUMN] if with_source else [])) + "\n").encode("utf-8"))
+        for rows in export_rows(store, window):
+            ts = np.asarray(store.ts[rows], dtype=np.int64)
+            pieces = [fixed_point_text(ts, 3, np.ones(len(ts), dtype=bool))]
+            for field in fields:
+                values = np.rint(store.values(field)[rows].astype(np.float64) * 10 ** EXPORT_DECIMALS)
+                valid = store.valid(field)[rows] & np.isfinite(values)
+                pieces.append(fixed_point_text(np.where(valid, values, 0).astype(np.int64), EXPORT_DECIMALS, valid))
+            if with_source:
+                pieces.append(label_text(np.asarray(store.arrays[columnar.SOURCE_COLUMN][rows]), store.sources))
+            file.write(csv_block(pieces))
+            count += len(ts)
+    return count
+
+
+def export_parquet(store, path, fields, window=None, with_source=False):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("ts", pa.timestamp("ms", "UTC"))] + [(field, pa.float32()) for field in fields]
+                       + ([(SOURCE_COLUMN, pa.string())] if with_source else []))
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in export_rows(store, window):
+            arrays = [pa.array(np.asarray(store.ts[rows], dtype=np.int64), pa.timestamp("ms", "UTC"))]
+            for field in fields:
+                arrays.append(pa.array(np.asarray(store.values(field)[rows]), mask=~np.asarray(store.valid(field)[rows])))
+            if with_source:
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    np.asarray(store.arrays[columnar.SOURCE_COLUMN][rows]).astype(np.int32), store.sources).cast(pa.string()))
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            count += len(arrays[0])
+    return count
+
+
+def export_legacy(store, path, fields, window=None, with_source=False):
+    # The old TinyDB document; readings in the same second share one key there
+    days = {}
+    count = 0
+    for rows in export_rows(store, window):
+        ts = store.ts[rows].tolist()
+        values = {}
+        for field in fields:
+            column = np.where(store.valid(field)[rows], store.values(field)[rows], np.nan).astype(np.float64)
+            values[field] = [None if value != value else round(value, EXPORT_DECIMALS) for value in column.tolist()]
+        for index, ms in enumerate(ts):
+            moment = datetime.fromtimestamp(ms / 1000)
+            days.setdefault(moment.strftime("%Y-%m-%d"), {})[moment.strftime("%H:%M:%S")] = {
+                field: values[field][index] for field in fields}
+        count += len(ts)
+    with open(path, "w") as file:
+        json.dump({"_default": {"1": days}}, file)
+    return count
+
+
+WRITERS = {".csv": export_csv, ".parquet": export_parquet, ".json": export_legacy}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk import into or export from the column store")
+    parser.add_argument("--columns", default=columnar.COLUMN_DIR)
+    parser.add_argument("--store", default=storage.STORE_DIR, help="segment store written by ingest")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("import", help="load a .csv, .parquet or legacy sensor_data.json file; stop ingest first")
+    load.add_argument("path")
+    load.add_argument("--restart", action="store_true", help="ignore a saved position and import the whole file again")
+    dump = commands.add_parser("export", help="write raw readings to a .csv, .parquet or legacy .json file")
+    dump.add_argument("path")
+    dump.add_argument("--fields", default=",".join(storage.FIELDS))
+    dump.add_argument("--range", default="", help='time window as in the chat, e.g. "last 7 days" or "between 2025-03-20 and 2025-04-01"')
+    dump.add_argument("--source", action="store_true", help="add a source column")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "import":
+            store = columnar.ColumnStore(args.columns)
+            progress_path = os.path.join(args.columns, os.path.basename(PROGRESS_PATH))
+            if store.next_row == 0 and os.path.exists(os.path.join(args.store, storage.MANIFEST_NAME)):
+                # The column store must hold every reading: start it from what ingest
+                # stored so far, as Upload2db.py would, before the file goes in
+                seeded = store.import_records(storage.SegmentStorage(args.store, readonly=True).records())
+                print(f"Built column store with {seeded} readings from {args.store}")
+            first_row, rows, new_rows, seconds = import_file(args.path, store, progress_path, resume=not args.restart)
+            print(f"Imported {rows} rows, {new_rows} in {seconds:.2f}s ({new_rows / max(seconds, 1e-9):,.0f} rows/s)")
+            started = time.perf_counter()
+            indexed, found = finish_import(store, first_row, os.path.join(args.columns, "rollups.npz"),
+                                           os.path.join(args.columns, "anomalies.bin"),
+                                           os.path.join(args.columns, "anomaly_state.json"))
+            store.close()
+            os.remove(progress_path)
+            print(f"Indexed {indexed} rows in {time.perf_counter() - started:.2f}s, {found} anomalies in the new rows")
+        else:
+            writer = WRITERS.get(os.path.splitext(args.path)[1].lower())
+            if writer is None:
+                parser.error("export to a .csv, .parquet or .json file")
+            fields = [field for field in args.fields.split(",") if field]
+            store = columnar.ColumnStore(args.columns, readonly=True)
+            unknown = [field for field in fields if field not in store.fields]
+            if unknown:
+                parser.error(f"unknown field: {unknown[0]}")
+            window = timerange.parse_range(args.range) if args.range else None
+            if args.range and window is None:
+                parser.error(f"could not read a time window from {args.range!r}")
+            started = time.perf_counter()
+            count = writer(store, args.path, fields, window, args.source)
+            seconds = time.perf_counter() - started
+            print(f"Exported {count} rows in {seconds:.2f}s ({count / max(seconds, 1e-9):,.0f} rows/s)")
+    except ImportError:
+        parser.error("Parquet files need the pyarrow package")
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
@@ -0,0 +1,175 @@
+import tkinter as tk
+from tkinter import ttk, scrolledtext
+import argparse
+import analytics_server
+import timerange
+import llm_worker
+import metrics
+# The Tk chat window shared by chatbot.py (Gemini) and test.py (Grok). Each
+# console mixes ChatWindow into its assistant class, which builds the
+# provider's LLM requests, and adds its greeting and graph colors.
+
+# Stats, graphs and anomaly answers come from the shared analytics server
+# (python analytics_server.py serve); without one they are computed in this process
+ANALYTICS_URL = analytics_server.ANALYTICS_URL
+REFRESH_MS = 2000  # How often new readings are picked up from the column store
+LOAD_POLL_MS = 50  # How often the window checks whether the data has finished loading
+
+
+class ChatWindow:
+    name = "llm"  # Response cache file and metrics label
+    speaker = "Assistant"  # Prefix of every reply
+    title = "Chatbot - Multi-Sensor Analysis"
+    metrics_port = None  # Query, LLM and graph timings on http://127.0.0.1:<port>/metrics (None = off)
+
+    def __init__(self, root):
+        super().__init__()
+        self.root = root
+        self.root.title(self.title)
+        self.root.geometry("800x600")
+
+        # Chat display
+        self.chat_display = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=80, height=20)
+        self.chat_display.grid(row=0, column=0, columnspan=2, padx=10, pady=10)
+
+        # Input field
+        self.input_field = ttk.Entry(root, width=60)
+        self.input_field.grid(row=1, column=0, padx=10, pady=10)
+        self.input_field.bind("<Return>", self.process_input)
+
+        # Send button
+        self.send_button = ttk.Button(root, text="Send", command=self.process_input)
+        self.send_button.grid(row=1, column=1, padx=10, pady=10)
+
+        # Graph frame
+        self.graph_frame = ttk.Frame(root)
+        self.graph_frame.grid(row=0, column=2, rowspan=2, padx=10, pady=10)
+
+        # LLM calls run on worker threads; answers are cached on disk across restarts
+        self.llm_worker = llm_worker.LLMWorker(root, llm_worker.ResponseCache(llm_worker.cache_path_for(self.name)), name=self.name)
+        metrics.serve(self.metrics_port)
+
+        # One plot canvas (created on the first graph request) reused for every graph;
+        # plot_request is the (question, fields) on screen, redrawn when new readings arrive
+        self.plot = None
+        self.plot_request = None
+
+        # Shared analytics server, or analytics in this process if none is running.
+        # It is found (or the store opened) on a background thread while the window
+        # appears; questions asked before it is ready are answered once it is.
+        self.data_span = None
+        self.rows = 0  # Rows seen so far; new ones trigger a graph update
+        self.pending = []
+        self.chat_display.insert(tk.END, "Loading sensor data...\n")
+        self.loading = analytics_server.connect_async(ANALYTICS_URL)
+        self.root.after(LOAD_POLL_MS, self.finish_loading)
+
+    def finish_loading(self):
+        if not self.loading.done():
+            self.root.after(LOAD_POLL_MS, self.finish_loading)
+            return
+        try:
+            self.analytics, info = self.loading.result()
+        except Exception as e:
+            # The server failed mid-answer or the store did not open on the
+            # loading thread: say so and analyse in this process instead
+            self.chat_display.insert(tk.END, f"Error: Could not load sensor data ({e}); retrying in this process\n")
+            try:
+                self.analytics = analytics_server.Analytics()
+                info = self.analytics.info()
+            except Exception as e:
+                self.analytics = None  # Questions get an error reply
+                info = {"error": f"Error: Could not load sensor data ({e})", "span": "no data loaded", "rows": 0}
+        if info["error"]:
+            self.chat_display.insert(tk.END, info["error"] + "\n")
+        self.data_span = info["span"]
+        self.rows = info["rows"]
+        self.display_initial_message()
+        for question in self.pending:
+            self.answer(question)
+        self.pending = []
+        if self.analytics is not None:
+            self.root.after(REFRESH_MS, self.poll_updates)
+
+    def display_initial_message(self):
+        self.chat_display.insert(tk.END, f"{self.speaker}: Hello! Ask me about the sensor store ({self.data_span}).\n\n")
+
+    def process_input(self, event=None):
+        user_input = self.input_field.get().strip()
+        if not user_input:
+            return
+
+        self.chat_display.insert(tk.END, f"You: {user_input}\n")
+        self.input_field.delete(0, tk.END)
+        if self.data_span is None:  # Still loading
+            self.pending.append(user_input)
+            return
+        self.answer(user_input)
+
+    def answer(self, user_input):
+        if self.analytics is None:
+            self.chat_display.insert(tk.END, f"{self.speaker}: Error: No valid sensor data loaded.\n\n")
+            return
+        response = self.process_query(user_input)
+        if isinstance(response, llm_worker.LLMRequest):
+            # Stream the answer in from a worker thread instead of blocking the UI
+            self.llm_worker.submit(response, llm_worker.TextStream(self.chat_display, f"{self.speaker}: "))
+            return
+        self.chat_display.insert(tk.END, f"{self.speaker}: {response}\n\n")
+        self.chat_display.see(tk.END)
+
+    def show_plot(self, query, series, title):
+        # series: [(field, label, color)]; draws into the one reused canvas, with
+        # the readings already downsampled to the canvas width by the analytics service
+        if self.plot is None:
+            import plotcanvas  # Matplotlib takes seconds to import; only on the first graph
+            self.plot = plotcanvas.PlotCanvas(self.graph_frame)
+        fields = [field for field, _, _ in series]
+        self.plot_request = (query, fields)
+        times, values, limits = analytics_server.series_arrays(self.analytics.series(fields, query, self.plot.threshold()))
+        self.plot.show(times, [(column, label, color) for column, (_, label, color) in zip(values, series)], title, limits)
+
+    def poll_updates(self):
+        # Ask whether readings arrived since the last poll (the analytics side
+        # tails the column store) and redraw the graph on screen if they did
+        try:
+            update = self.analytics.refresh(self.rows)
+            if update["since"] is not None:
+                self.update_live_plot(update["since"])
+            self.rows = update["rows"]
+        except (OSError, ValueError):
+            pass  # Server or store briefly unavailable; try again on the next tick
+        self.root.after(REFRESH_MS, self.poll_updates)
+
+    def update_live_plot(self, since):
+        if self.plot_request is None:
+            return
+        # Re-parse so "last 6 hours" keeps sliding; a window that ended before the new rows is unchanged
+        query, fields = self.plot_request
+        window = timerange.parse_range(query)
+        if window and window.end is not None and window.end <= since:
+            return
+        times, values, limits = analytics_server.series_arrays(self.analytics.series(fields, query, self.plot.threshold()))
+        self.plot.update(times, values, limits)
+
+
+def main(assistant_class, window_class, description):
+    # A console's command line: the chat window, or with --headless one answer
+    # printed as it arrives, without a window or matplotlib
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--headless", metavar="QUESTION", help="print the answer to one question and exit, without a window or graphs")
+    args = parser.parse_args()
+    if args.headless is None:
+        root = tk.Tk()
+        window_class(root)
+        root.mainloop()
+        return
+
+    assistant = assistant_class(analytics_server.connect(ANALYTICS_URL))
+    response = assistant.process_query(args.headless)
+    if isinstance(response, llm_worker.LLMRequest):
+        cache = llm_worker.ResponseCache(llm_worker.cache_path_for(window_class.name))
+        llm_worker.answer_now(response, cache, lambda text: print(text, end="", flush=True))
+        print()
+    else:
+        print(response)
@@ -0,0 +1,457 @@
+import functools
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+import storage
+
+COLUMN_DIR = "sensor_columns"
+META_NAME = "meta.json"
+WRITER_LOCK_NAME = "writer.lock"  # Held by the one process that may write the store
+
+# One flat binary file per column. Timestamps are epoch milliseconds; every
+# sensor field has a float32 value column and a one-byte-per-row validity
+# mask, so a missing reading never needs a Python None.
+TIMESTAMP_COLUMN = "ts"
+TIMESTAMP_DTYPE = np.dtype("<i8")
+VALUE_DTYPE = np.dtype("<f4")
+VALID_DTYPE = np.dtype("u1")
+
+# Which payload/link each reading came from, as an index into meta["sources"]
+SOURCE_COLUMN = "source"
+SOURCE_DTYPE = np.dtype("<u2")
+DEFAULT_SOURCE = "default"
+
+IMPORT_CHUNK = 100000
+COPY_CHUNK = 200000  # Rows copied per step when compaction starts a new generation of files
+
+# Timestamps are stored in UTC; the GUIs show local wall-clock time like the
+# old date/time keys. The UTC offset is looked up per day spanned, then per
+# hour and per timestamp only where daylight saving time changes it.
+OFFSET_STEPS = (86400000, 3600000)
+
+
+def column_files(fields=storage.FIELDS):
+    files = {TIMESTAMP_COLUMN: ("ts.i8", TIMESTAMP_DTYPE), SOURCE_COLUMN: ("source.u2", SOURCE_DTYPE)}
+    for field in fields:
+        files[field] = (f"{field}.f4", VALUE_DTYPE)
+        files[field + ".valid"] = (f"{field}.valid", VALID_DTYPE)
+    return files
+
+
+def generation_dir(path, generation):
+    # Generation 0 is the column directory itself; compaction (retention.py)
+    # writes each later generation to a subdirectory and switches meta.json to it
+    return path if generation == 0 else os.path.join(path, f"gen-{generation:06d}")
+
+
+def records_to_columns(records, fields=storage.FIELDS, source_id=None):
+    # Convert a batch of reading dicts into one array per column; `source_id`
+    # maps a record's "source" tag to its number (all 0 when not given)
+    columns = {
+        TIMESTAMP_COLUMN: np.rint(np.array([r["ts"] for r in records], dtype=np.float64) * 1000).astype(TIMESTAMP_DTYPE)
+    }
+    if source_id is None:
+        columns[SOURCE_COLUMN] = np.zeros(len(records), dtype=SOURCE_DTYPE)
+    else:
+        columns[SOURCE_COLUMN] = np.array([source_id(r.get("source")) for r in records], dtype=SOURCE_DTYPE)
+    for field in fields:
+        raw = [r.get(field) for r in records]
+        valid = np.array([v is not None for v in raw], dtype=bool)
+        values = np.array([v if v is not None else np.nan for v in raw], dtype=VALUE_DTYPE)
+        columns[field] = values
+        columns[field + ".valid"] = valid.view(VALID_DTYPE)
+    return columns
+
+
+def lock_writer(path):
+    # Exclusive lock on a column directory, so a second ingest, a bulk import
+    # or an anomaly backfill cannot write it while another process does.
+    # Returns the open lock file (closing it releases the lock), or None if
+    # another process holds it.
+    handle = open(os.path.join(path, WRITER_LOCK_NAME), "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+@functools.lru_cache(maxsize=65536)
+def offset_at(seconds):
+    # UTC offset of local time at an epoch second, in ms
+    return time.localtime(seconds).tm_gmtoff * 1000
+
+
+def local_offsets_ms(ts, steps=OFFSET_STEPS):
+    # UTC offset of local time at each epoch-ms timestamp, daylight saving included
+    ts = np.asarray(ts, dtype=np.int64)
+    if len(ts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    if not steps:
+        return np.array([offset_at(int(t) // 1000) for t in ts.tolist()], dtype=np.int64)
+    step = steps[0]
+    keys = ts // step
+    lo, hi = int(keys.min()), int(keys.max())
+    if hi - lo <= len(ts):
+        spans, where = np.arange(lo, hi + 1), keys - lo
+    else:
+        spans, where = np.unique(keys, return_inverse=True)  # A few far-apart timestamps
+    starts = np.array([offset_at(key * step // 1000) for key in spans.tolist()], dtype=np.int64)
+    ends = np.array([offset_at((key + 1) * step // 1000) for key in spans.tolist()], dtype=np.int64)
+    offsets = starts[where]
+    changing = (starts != ends)[where]
+    if changing.any():
+        offsets[changing] = local_offsets_ms(ts[changing], steps[1:])
+    return offsets
+
+
+def to_local(ts):
+    # Epoch ms -> local wall-clock datetime64, each with the offset in force at that moment
+    ts = np.asarray(ts, dtype=np.int64)
+    return (ts + local_offsets_ms(ts)).astype("datetime64[ms]")
+
+
+def from_local(local_ms):
+    # Local wall-clock ms (as from to_local) -> epoch ms; a wall-clock time
+    # skipped or repeated by a clock change maps to one side of it
+    local_ms = np.asarray(local_ms, dtype=np.int64)
+    guess = local_ms - local_offsets_ms(local_ms)
+    return local_ms - local_offsets_ms(guess)
+
+
+class ColumnStore:
+    # Memory-mapped columnar copy of the telemetry. Readers map the column
+    # files read-only, so opening a store of any size costs almost nothing
+    # and aggregations run on array slices. Row numbers are logical: once old
+    # rows have been compacted away, physical row 0 is row `first_row`.
+
+    def __init__(self, path=COLUMN_DIR, readonly=False, fields=storage.FIELDS):
+        self.path = path
+        self.readonly = readonly
+        self.fields = tuple(fields)
+        self.files = column_files(self.fields)
+        self.arrays = {}
+        self._handles = {}
+        self._writer_lock = None
+        self.meta_path = os.path.join(path, META_NAME)
+
+        if readonly:
+            self.load_meta()
+            self.files = column_files(self.fields)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self._writer_lock = lock_writer(path)
+            if self._writer_lock is None:
+                raise OSError(f"{path} is being written by another process (Upload2db.py, ingest_daemon.py or an import); stop it first")
+            if not os.path.exists(self.meta_path):
+                self.sources = [DEFAULT_SOURCE]
+                self.generation, self.first_row, self.raw_from = 0, 0, None
+                self.write_meta()
+            self.load_meta()
+            self.recover()
+            self._handles = {name: open(self.file_path(name), "ab") for name in self.files}
+
+        self.refresh()
+
+    @classmethod
+    def from_records(cls, records, fields=storage.FIELDS):
+        # In-memory store for data that has not been written to a column directory yet
+        store = cls.__new__(cls)
+        store.path = None
+        store.readonly = True
+        store.fields = tuple(fields)
+        store.files = column_files(store.fields)
+        store._handles = {}
+        store._writer_lock = None
+        store.sources = [DEFAULT_SOURCE]
+        store.generation, store.first_row, store.raw_from = 0, 0, None
+        store.data_dir = None
+        store.arrays = {name: np.empty(0, dtype) for name, (_, dtype) in store.files.items()}
+        store.extend_columns(records_to_columns(list(records), store.fields, store.source_id))
+        return store
+
+    def load_meta(self):
+        with open(self.meta_path, "r") as file:
+            meta = json.load(file)
+        self.fields = tuple(meta["fields"])
+        self.sources = meta.get("sources", [DEFAULT_SOURCE])
+        # Compaction state: which file generation is current, the logical
+        # number of its first row, and the time from which every raw reading
+        # is still present (None = nothing has been compacted)
+        self.generation = meta.get("generation", 0)
+        self.first_row = meta.get("first_row", 0)
+        self.raw_from = meta.get("raw_from")
+        self.data_dir = generation_dir(self.path, self.generation)
+        self._meta_mtime = os.stat(self.meta_path).st_mtime_ns
+
+    def write_meta(self):
+        storage.write_json_atomic(self.meta_path, {
+            "version": 1, "fields": list(self.fields), "sources": self.sources,
+            "generation": self.generation, "first_row": self.first_row, "raw_from": self.raw_from,
+        })
+
+    def source_id(self, name):
+        # Number for a source tag, registering new sources in meta.json
+        if name is None:
+            return 0
+        if name not in self.sources:
+            self.sources.append(name)
+            if self.path is not None:
+                self.write_meta()
+        return self.sources.index(name)
+
+    def file_path(self, name):
+        return os.path.join(self.data_dir, self.files[name][0])
+
+    def committed_rows(self):
+        # Rows present in every column file; anything past that is a torn write.
+        # Columns added after the store was created (no file yet) are skipped.
+        rows = None
+        for name, (_, dtype) in self.files.items():
+            try:
+                size = os.path.getsize(self.file_path(name))
+            except FileNotFoundError:
+                continue
+            count = size // dtype.itemsize
+            rows = count if rows is None else min(rows, count)
+        return rows or 0
+
+    def recover(self):
+        # Cut every column back to the last complete row; a column missing from
+        # an older store is created zero-filled (source 0) for the existing rows
+        rows = self.committed_rows()
+        for name, (_, dtype) in self.files.items():
+            path = self.file_path(name)
+            with open(path, "ab") as file:
+                size = file.tell()
+                if size < rows * dtype.itemsize:
+                    file.write(bytes(rows * dtype.itemsize - size))
+                file.truncate(rows * dtype.itemsize)
+
+    def refresh(self):
+        # (Re)map the column files; call again to pick up rows appended since.
+        # The new maps are swapped in with one assignment, so a thread holding
+        # self.arrays (compaction, queries) always sees columns of equal length.
+        if self.path is None:
+            return len(self)
+        if self.readonly and os.stat(self.meta_path).st_mtime_ns != self._meta_mtime:
+            self.load_meta()  # New sources registered, or a compaction switched generations
+        rows = self.committed_rows()
+        arrays = {}
+        for name, (_, dtype) in self.files.items():
+            if rows == 0:
+                arrays[name] = np.empty(0, dtype)
+            elif not os.path.exists(self.file_path(name)):
+                arrays[name] = np.zeros(rows, dtype)
+            else:
+                arrays[name] = np.memmap(self.file_path(name), dtype=dtype, mode="r", shape=(rows,))
+        self.arrays = arrays
+        return rows
+
+    def __len__(self):
+        # Rows still present, i.e. not compacted away
+        return len(self.arrays[TIMESTAMP_COLUMN])
+
+    @property
+    def next_row(self):
+        # Logical number of the next row appended (all rows ever stored)
+        return self.first_row + len(self)
+
+    def position(self, row):
+        # Array index of logical row `row`; rows compacted away map to 0
+        return max(row - self.first_row, 0)
+
+    @property
+    def ts(self):
+        return self.arrays[TIMESTAMP_COLUMN]
+
+    def values(self, field):
+        return self.arrays[field]
+
+    def valid(self, field):
+        return self.arrays[field + ".valid"].view(bool)
+
+    def extend_columns(self, columns):
+        for name, values in columns.items():
+            self.arrays[name] = np.concatenate([self.arrays[name], values])
+
+    def append_many(self, records):
+        if not records:
+            return
+        self.append_columns(records_to_columns(records, self.fields, self.source_id))
+
+    def append_columns(self, columns):
+        # Append one array per column (as made by records_to_columns)
+        if self.path is None:
+            self.extend_columns(columns)
+            return
+
+        # Each column is flushed as soon as it is written, timestamps last, so a
+        # reader never sees a timestamp before its values. Rows count only when
+        # every file holds them (committed_rows), which is also where recover()
+        # cuts back to after a crash, whatever the OS wrote out first.
+        for name in sorted(columns, key=lambda name: name == TIMESTAMP_COLUMN):
+            handle = self._handles[name]
+            handle.write(np.ascontiguousarray(columns[name], dtype=self.files[name][1]).tobytes())
+            handle.flush()
+        self.refresh()
+
+    def truncate(self, row):
+        # Drop rows from logical row `row` on, e.g. a bulk import being redone
+        if row >= self.next_row:
+            return
+        self.arrays = {name: np.empty(0, dtype) for name, (_, dtype) in self.files.items()}  # Release the maps first
+        for name, handle in self._handles.items():
+            handle.flush()
+            handle.truncate(self.position(row) * self.files[name][1].itemsize)
+        self.refresh()
+
+    def sync(self):
+        for handle in self._handles.values():
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    def close_files(self):
+        for handle in self._handles.values():
+            handle.flush()
+            handle.close()
+        self._handles = {}
+
+    def close(self):
+        self.close_files()
+        if self._writer_lock is not None:
+            self._writer_lock.close()
+            self._writer_lock = None
+
+    def compact(self, row, raw_from, lock, chunk=COPY_CHUNK):
+        # Drop rows before logical row `row` by copying the rest into a new
+        # generation of files and switching meta.json to it. The bulk copy runs
+        # without `lock` (the ingest writer takes it per batch); only rows
+        # appended meanwhile are copied while holding it. The old files are
+        # left for readers still mapping them and removed by remove_stale().
+        generation = self.generation + 1
+        directory = generation_dir(self.path, generation)
+        shutil.rmtree(directory, ignore_errors=True)  # Half-written by an earlier crash
+        os.makedirs(directory)
+        handles = {name: open(os.path.join(directory, filename), "wb") for name, (filename, _) in self.files.items()}
+        copied = row
+
+        def copy():
+            # Up to the end of one snapshot of the columns (refresh() swaps in a
+            # whole new dict, so every column in it has the same rows)
+            nonlocal copied
+            arrays = self.arrays
+            stop = self.first_row + len(arrays[TIMESTAMP_COLUMN])
+            while copied < stop:
+                end = min(copied + chunk, stop)
+                for name, handle in handles.items():
+                    handle.write(np.asarray(arrays[name][self.position(copied):self.position(end)]).tobytes())
+                copied = end
+
+        try:
+            copy()
+            with lock:
+                copy()
+                for handle in handles.values():
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                    handle.close()
+                self.close_files()
+                self.generation, self.first_row, self.raw_from = generation, row, raw_from
+                self.data_dir = directory
+                self.write_meta()
+                self._handles = {name: open(self.file_path(name), "ab") for name in self.files}
+                self.refresh()
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return generation
+
+    def remove_stale(self):
+        # Delete column files of earlier generations; ones still mapped by a
+        # reader (Windows refuses) are retried on the next compaction
+        removed = 0
+        stale = [name for name in os.listdir(self.path) if name.startswith("gen-")
+                 and os.path.join(self.path, name) != self.data_dir]
+        for name in stale:
+            try:
+                shutil.rmtree(os.path.join(self.path, name))
+                removed += 1
+            except OSError:
+                pass
+        if self.generation:
+            for filename, _ in self.files.values():
+                try:
+                    os.remove(os.path.join(self.path, filename))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def disk_bytes(self):
+        return sum(os.path.getsize(self.file_path(name)) for name in self.files if os.path.exists(self.file_path(name)))
+
+    def import_records(self, records, chunk=IMPORT_CHUNK):
+        batch = []
+        count = 0
+        for record in records:
+            batch.append(record)
+            if len(batch) >= chunk:
+                self.append_many(batch)
+                count += len(batch)
+                batch = []
+        self.append_many(batch)
+        return count + len(batch)
+
+    def records(self, chunk=IMPORT_CHUNK):
+        # Every stored reading as a segment-store record (ts in epoch seconds,
+        # missing readings left out), oldest row first
+        for start in range(0, len(self), chunk):
+            stop = min(start + chunk, len(self))
+            ts = (np.asarray(self.ts[start:stop], dtype=np.float64) / 1000).tolist()
+            values = {field: np.round(self.series(field, start, stop).astype(np.float64), 3).tolist() for field in self.fields}
+            sources = self.arrays[SOURCE_COLUMN][start:stop].tolist()
+            for index, moment in enumerate(ts):
+                record = {"ts": moment}
+                for field in self.fields:
+                    if values[field][index] == values[field][index]:
+                        record[field] = values[field][index]
+                if sources[index]:
+                    record["source"] = self.sources[sources[index]]
+                yield record
+
+    def series(self, field, start=0, stop=None):
+        # Field values for rows [start, stop) with missing readings as NaN
+        values = self.values(field)[start:stop]
+        return np.where(self.valid(field)[start:stop], values, np.float32(np.nan))
+
+    def mean(self, field, start=0, stop=None):
+        values = self.values(field)[start:stop]
+        valid = self.valid(field)[start:stop]
+        if not valid.any():
+            return None
+        return float(np.mean(values[valid], dtype=np.float64))
+
+    def local_times(self, start=0, stop=None):
+        return to_local(self.ts[start:stop])
+
+
+def open_dataset(column_dir=COLUMN_DIR, store_dir=storage.STORE_DIR, legacy_path=storage.LEGACY_JSON_PATH):
+    # Prefer the memory-mapped column store written by Upload2db.py. Without one,
+    # build an in-memory copy from the segment store or the legacy JSON file.
+    if os.path.exists(os.path.join(column_dir, META_NAME)):
+        return ColumnStore(column_dir, readonly=True)
+    if os.path.exists(os.path.join(store_dir, storage.MANIFEST_NAME)):
+        return ColumnStore.from_records(storage.SegmentStorage(store_dir, readonly=True).records())
+    with open(legacy_path, "r") as file:
+        return ColumnStore.from_records(storage.iter_legacy_records(json.load(file)))
@@ -8,9 +8,140 @@ DHT dht(DHTPIN, DHTTYPE);
 #define MQ135_PIN 34    // Air quality sensor pin
 #define LDR_PIN 35      // Light intensity sensor pin
 
+// 1 = send compact 17-byte binary frames (decoded by frames.py), 0 = JSON lines
+#define USE_BINARY_FRAMES 0
+#define FRAME_VERSION 1
+#define NODE_ID 0       // Give each payload on a shared link its own id
+
+// 1 = send 37-byte encrypted, authenticated frames instead (securelink.py).
+// Needs LINK_KEY below to hold the bytes of the ground station's link.key.
+#define USE_SECURE_FRAMES 0
+#define SECURE_FRAME_VERSION 2  // HMAC-SHA256 mode
+
+uint16_t frameSeq = 0;
+
+// CRC-16/CCITT-FALSE, the same check as binascii.crc_hqx(data, 0xFFFF)
+uint16_t crc16(const uint8_t* data, size_t length) {
+    uint16_t crc = 0xFFFF;
+    for (size_t i = 0; i < length; i++) {
+        crc ^= (uint16_t)data[i] << 8;
+        for (int bit = 0; bit < 8; bit++) {
+            crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+        }
+    }
+    return crc;
+}
+
+void putU16(uint8_t* out, uint16_t value) {
+    out[0] = value & 0xFF;  // Little-endian
+    out[1] = value >> 8;
+}
+
+// Fills a 17-byte frame; bytes 6-14 (flags and readings) are also the payload of a secure frame
+void buildFrame(uint8_t* frame, float temperature, float humidity, float airQuality, float lightIntensity) {
+    uint8_t flags = 0x0C;  // Air quality and light are always read
+    int16_t temperatureCenti = 0;
+    uint16_t humidityCenti = 0;
+    if (!isnan(temperature)) {
+        flags |= 0x01;
+        temperatureCenti = (int16_t)lroundf(temperature * 100);
+    }
+    if (!isnan(humidity)) {
+        flags |= 0x02;
+        humidityCenti = (uint16_t)lroundf(humidity * 100);
+    }
+
+    frame[0] = 0xA5;  // Sync word
+    frame[1] = 0x5A;
+    frame[2] = FRAME_VERSION;
+    frame[3] = NODE_ID;
+    putU16(frame + 4, frameSeq++);
+    frame[6] = flags;
+    putU16(frame + 7, (uint16_t)temperatureCenti);
+    putU16(frame + 9, humidityCenti);
+    putU16(frame + 11, (uint16_t)lroundf(airQuality * 10));
+    putU16(frame + 13, (uint16_t)lroundf(lightIntensity));
+    putU16(frame + 15, crc16(frame + 2, 13));
+}
+
+void sendFrame(float temperature, float humidity, float airQuality, float lightIntensity) {
+    uint8_t frame[17];
+    buildFrame(frame, temperature, humidity, airQuality, lightIntensity);
+    Serial.write(frame, sizeof(frame));
+}
+
+#if USE_SECURE_FRAMES
+#include "mbedtls/md.h"
+#include <Preferences.h>
+
+const uint8_t LINK_KEY[32] = { 0 };  // Replace with the 32 bytes from link.key
+// Boot counter kept in flash, so keys and nonces are never reused and the
+// ground station can tell a new boot from a replayed old one. Erasing the
+// flash resets it: make a new link.key when you do.
+uint32_t linkSession;
+uint32_t linkSeq = 0;
+uint8_t encryptKey[32];
+uint8_t macKey[32];
+
+void hmacSha256(const uint8_t* key, const uint8_t* data, size_t length, uint8_t* out) {
+    mbedtls_md_hmac(mbedtls_md_info_from_type(MBEDTLS_MD_SHA256), key, 32, data, length, out);
+}
+
+void putU32(uint8_t* out, uint32_t value) {
+    putU16(out, value & 0xFFFF);
+    putU16(out + 2, value >> 16);
+}
+
+void startSecureLink() {
+    // Session key = HMAC(link key, context | node | session), then one key each for encryption and tags
+    const char context[] = "sat-payload link v1";
+    uint8_t info[sizeof(context) - 1 + 5];
+    uint8_t sessionKey[32];
+    Preferences prefs;
+    prefs.begin("securelink", false);
+    linkSession = prefs.getUInt("session", 0) + 1;
+    prefs.putUInt("session", linkSession);  // Stored before the first frame goes out
+    prefs.end();
+    memcpy(info, context, sizeof(context) - 1);
+    info[sizeof(context) - 1] = NODE_ID;
+    putU32(info + sizeof(context), linkSession);
+    hmacSha256(LINK_KEY, info, sizeof(info), sessionKey);
+    hmacSha256(sessionKey, (const uint8_t*)"encrypt", 7, encryptKey);
+    hmacSha256(sessionKey, (const uint8_t*)"authenticate", 12, macKey);
+}
+
+void sendSecureFrame(float temperature, float humidity, float airQuality, float lightIntensity) {
+    uint8_t plain[17];
+    uint8_t frame[37];
+    uint8_t nonce[12] = { 0 };
+    uint8_t digest[32];
+    buildFrame(plain, temperature, humidity, airQuality, lightIntensity);
+
+    frame[0] = 0xA5;  // Sync word
+    frame[1] = 0x5A;
+    frame[2] = SECURE_FRAME_VERSION;
+    frame[3] = NODE_ID;
+    putU32(frame + 4, linkSession);
+    putU32(frame + 8, linkSeq++);
+
+    // Keystream = HMAC(encrypt key, node | session | sequence), tag = HMAC(mac key, header | ciphertext)
+    memcpy(nonce, frame + 3, 9);
+    hmacSha256(encryptKey, nonce, sizeof(nonce), digest);
+    for (int i = 0; i < 9; i++) {
+        frame[12 + i] = plain[6 + i] ^ digest[i];
+    }
+    hmacSha256(macKey, frame, 21, digest);
+    memcpy(frame + 21, digest, 16);
+    Serial.write(frame, sizeof(frame));
+}
+#endif
+
 void setup() {
     Serial.begin(115200);
     dht.begin();
+#if USE_SECURE_FRAMES
+    startSecureLink();
+#endif
 }
 
 void loop() {
@@ -25,6 +156,11 @@ void loop() {
     // Scale light intensity (0-4095) to realistic values
     float light_intensity_scaled = map(light_intensity, 0, 4095, 0, 2000);
 
+#if USE_SECURE_FRAMES
+    sendSecureFrame(temperature, humidity, air_quality_scaled, light_intensity_scaled);
+#elif USE_BINARY_FRAMES
+    sendFrame(temperature, humidity, air_quality_scaled, light_intensity_scaled);
+#else
     // Create JSON object
     StaticJsonDocument<200> doc;
     doc["temperature"] = temperature;
@@ -36,6 +172,7 @@ void loop() {
     String jsonData;
     serializeJson(doc, jsonData);
     Serial.println(jsonData);
+#endif
 
     delay(2000); // Send data every 2 seconds
 }
@@ -0,0 +1,282 @@
+import math
+from datetime import datetime
+
+import numpy as np
+
+import anomaly
+import columnar
+import rollup
+
+# Compact text summary of the readings in a time window for an LLM prompt,
+# kept under a token budget. In priority order: overall stats with where the
+# extremes fell, trends, gaps in the data, anomaly events, then a per-period
+# table whose resolution gets coarser as the window gets longer. Everything is
+# read from the rollup index and the anomaly event table, which ingest keeps
+# up to date as rows arrive, so a digest of a year costs about as much as one
+# of an hour and never touches the raw readings.
+DIGEST_TOKENS = 1000  # Default budget
+CHARS_PER_TOKEN = 3.0  # Rough; numbers, dates and units split into more tokens than prose
+MIN_PERIODS = 3  # A table shorter than this is left out
+TREND_PERIODS = 48  # Period means a trend is fitted to
+MAX_GAPS = 5
+MAX_EVENTS = 5
+GAP_MS = 5 * 60000  # Shorter stretches without readings are not reported
+DAY_MS = 86400000
+HOUR_MS = 3600000
+
+# Table resolutions, finest first: (label, rollup level, buckets per period).
+# Periods follow the local clock; days and weeks are made from hour buckets
+# while those are kept, and from the (UTC) day buckets after that.
+RESOLUTIONS = (
+    ("minute", "minute", 1),
+    ("5 minutes", "minute", 5),
+    ("15 minutes", "minute", 15),
+    ("hour", "hour", 1),
+    ("3 hours", "hour", 3),
+    ("6 hours", "hour", 6),
+    ("day", "hour", 24),
+    ("day", "day", 1),
+    ("week", "hour", 168),
+    ("week", "day", 7),
+    ("4 weeks", "day", 28),
+)
+WIDTHS = dict(rollup.LEVELS)
+
+NAMES = {"temperature": "temp", "humidity": "humidity", "air_quality": "pm2.5", "light_intensity": "light"}
+UNITS = {"temperature": "°C", "humidity": "%", "air_quality": " µg/m³", "light_intensity": " lux"}
+DIGITS = {"temperature": 1, "humidity": 0, "air_quality": 0, "light_intensity": 0}
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def moment(ms, width=0):
+    return datetime.fromtimestamp(ms / 1000).strftime("%Y-%m-%d" if width >= DAY_MS else "%Y-%m-%d %H:%M")
+
+
+def duration(ms):
+    if ms >= 2 * DAY_MS:
+        return f"{ms / DAY_MS:.1f} days"
+    if ms >= 2 * HOUR_MS:
+        return f"{ms / HOUR_MS:.1f} h"
+    return f"{ms / 60000:.0f} min"
+
+
+def number(field, value):
+    return f"{value:.{DIGITS.get(field, 1)}f}"
+
+
+def covers(rollups, name, start):
+    # Whether a level still holds every bucket from `start` on (retention prunes old minutes and hours)
+    kept_from = rollups.kept_from.get(name)
+    return kept_from is None or kept_from <= start
+
+
+def buckets(rollups, name, start, end):
+    # (keys, stats) of the buckets at one level overlapping start <= ts < end
+    width = WIDTHS[name]
+    level = rollups.levels[name]
+    first = np.searchsorted(level.keys, (start + rollups.offset_ms) // width)
+    last = np.searchsorted(level.keys, -(-(end + rollups.offset_ms) // width))
+    return level.keys[first:last], level.stats[first:last]
+
+
+def finest_level(rollups, start):
+    for name, _ in reversed(rollup.LEVELS):
+        if covers(rollups, name, start):
+            return name
+    return "day"
+
+
+def periods(rollups, start, end, limit):
+    # (label, width ms, period starts, stats per period) at the finest
+    # resolution with at most `limit` periods holding readings, or None
+    for label, name, multiple in RESOLUTIONS:
+        if not covers(rollups, name, start):
+            continue
+        keys, stats = buckets(rollups, name, start, end)
+        if len(keys) > limit * multiple:
+            continue  # Too many periods for sure; skip the grouping
+        width = WIDTHS[name] * multiple
+        starts = keys * WIDTHS[name] - rollups.offset_ms
+        groups, grouped = rollup.reduce_groups((starts + columnar.local_offsets_ms(starts)) // width, stats)
+        if len(groups) <= limit:
+            return label, width, columnar.from_local(groups * width), grouped
+    return None
+
+
+def period_means(stats):
+    # Mean per period and field (NaN where a period has no readings)
+    count = stats[..., rollup.COUNT]
+    return np.divide(stats[..., rollup.SUM], count, out=np.full(count.shape, np.nan), where=count > 0)
+
+
+def summary_lines(engine, window, fields, start, end):
+    rollups = engine.rollups
+    name = finest_level(rollups, start)
+    level_width = WIDTHS[name]
+    keys, stats = buckets(rollups, name, start, end)
+    lines = []
+    for index, field in enumerate(fields):
+        overall = engine.stats(field, window)
+        if not overall:
+            lines.append(f"- {NAMES.get(field, field)}: no readings")
+            continue
+        unit = UNITS.get(field, "")
+        text = (f"- {NAMES.get(field, field)}: mean {number(field, overall['mean'])}{unit}, "
+                f"std {number(field, overall['std'])}, min {number(field, overall['min'])}")
+        # Where the extremes fell, to the bucket
+        field_stats = stats[:, index]
+        if len(keys) and field_stats[:, rollup.COUNT].any():
+            low = int(keys[np.argmin(field_stats[:, rollup.MIN])]) * level_width - rollups.offset_ms
+            high = int(keys[np.argmax(field_stats[:, rollup.MAX])]) * level_width - rollups.offset_ms
+            text += f" around {moment(low, level_width)}, max {number(field, overall['max'])} around {moment(high, level_width)}"
+        else:
+            text += f", max {number(field, overall['max'])}"
+        lines.append(text + f" ({overall['count']} readings)")
+    return lines
+
+
+def trend_lines(rollups, fields, start, end):
+    found = periods(rollups, start, end, TREND_PERIODS)
+    if found is None or len(found[2]) < MIN_PERIODS:
+        return []
+    _, width, starts, stats = found
+    means = period_means(stats)
+    per, per_ms = ("day", DAY_MS) if width >= 6 * HOUR_MS else ("hour", HOUR_MS)
+    lines = []
+    for index, field in enumerate(fields):
+        y = means[:, index]
+        keep = np.isfinite(y)
+        if keep.sum() < MIN_PERIODS:
+            continue
+        x = (starts[keep] + width / 2) / per_ms
+        weights = stats[keep, index, rollup.COUNT]
+        slope = np.polyfit(x, y[keep], 1, w=np.sqrt(weights))[0]
+        # Steady unless the fitted line moves by over half the spread of the period means
+        change = slope * (x[-1] - x[0])
+        text = f"- {NAMES.get(field, field)}: "
+        if abs(change) <= 0.5 * np.std(y[keep]) or abs(change) < 10 ** -DIGITS.get(field, 1):
+            text += "steady"
+        else:
+            text += f"{'rising' if slope > 0 else 'falling'} {slope:+.{DIGITS.get(field, 1) + 1}f}{UNITS.get(field, '')}/{per}"
+        lines.append(text + f" (period means {number(field, y[keep][0])} -> {number(field, y[keep][-1])})")
+    return lines
+
+
+def gap_lines(engine, window, start, end, now_ms):
+    rollups = engine.rollups
+    name = finest_level(rollups, start)
+    width = WIDTHS[name]
+    keys, _ = buckets(rollups, name, start, end)
+    gaps = []
+    if len(keys) > 1:
+        missing = np.diff(keys) - 1
+        for i in np.nonzero(missing * width >= max(GAP_MS, width))[0]:
+            gap_start = (int(keys[i]) + 1) * width - rollups.offset_ms
+            gaps.append((int(missing[i]) * width, gap_start, gap_start + int(missing[i]) * width))
+    gaps.sort(reverse=True)
+    lines = []
+    if gaps:
+        lines.append(f"{len(gaps)} gap{'s' if len(gaps) != 1 else ''} without readings, {duration(sum(gap[0] for gap in gaps))} in all"
+                     + (f", longest {MAX_GAPS}:" if len(gaps) > MAX_GAPS else ":"))
+        for length, gap_start, gap_end in gaps[:MAX_GAPS]:
+            lines.append(f"- {moment(gap_start, width)} to {moment(gap_end, width)} ({duration(length)})")
+    last = engine.last_ts()
+    if (window is None or window.end is None or window.end > last) and now_ms - last >= GAP_MS:
+        lines.append(f"No readings since {moment(last)} ({duration(now_ms - last)} ago)")
+    return lines
+
+
+def anomaly_lines(engine, window, fields):
+    events = engine.events(window)
+    if events is None:
+        return []
+    if len(events) == 0:
+        return ["No anomaly events"]
+    counts = []
+    for index, field in enumerate(fields):
+        kinds = events["kind"][events["field"] == index]
+        if len(kinds):
+            parts = ", ".join(f"{kind} {int((kinds == code).sum())}" for code, kind in enumerate(anomaly.KINDS) if (kinds == code).any())
+            counts.append(f"{NAMES.get(field, field)} {len(kinds)} ({parts})")
+    lines = [f"{len(events)} anomaly events: " + "; ".join(counts) + (f". Latest {MAX_EVENTS}:" if len(events) > MAX_EVENTS else ":")]
+    sources = engine.store.sources
+    for event in events[-MAX_EVENTS:]:
+        source = sources[event["source"]] if event["source"] < len(sources) else event["source"]
+        lines.append(f"- {moment(int(event['ts']))}{'' if source == columnar.DEFAULT_SOURCE else f' [{source}]'}: "
+                     f"{anomaly.describe(event, fields)}")
+    return lines
+
+
+def table_row(fields, start, width, stats):
+    cells = [moment(start, width)]
+    for index, field in enumerate(fields):
+        summary = rollup.summarize(stats[index])
+        cells.append("-" if summary is None else
+                     f"{number(field, summary['mean'])} ({number(field, summary['min'])}..{number(field, summary['max'])})")
+    cells.append(str(int(stats[:, rollup.COUNT].max())))
+    return " | ".join(cells)
+
+
+def build(engine, window=None, budget=DIGEST_TOKENS, now=None):
+    # {"text", "tokens", "budget", "resolution", "periods"} for the readings
+    # in `window` (a timerange.TimeRange, None = everything)
+    fields = list(engine.store.fields)
+    rollups = engine.rollups
+    label = window.label if window and window.label else "over all stored data"
+    first, last = engine.first_ts(), engine.last_ts()
+    start = window.start if window and window.start is not None else first
+    end = window.end if window and window.end is not None else (last + 1 if last is not None else None)
+    result = {"text": "", "tokens": 0, "budget": budget, "resolution": None, "periods": 0}
+    if first is None or engine.count(window) == 0:
+        result["text"] = f"No sensor readings {label}."
+        result["tokens"] = estimate_tokens(result["text"])
+        return result
+    start, end = max(start, first), min(end, last + 1)
+    now_ms = int((datetime.now().timestamp() if now is None else now) * 1000)
+
+    sections = [
+        [f"Sensor digest {label}: {engine.count(window)} readings from {moment(start)} to {moment(end - 1)}.",
+         "Overall:"] + summary_lines(engine, window, fields, start, end),
+        ["Trends:"] + trend_lines(rollups, fields, start, end),
+        gap_lines(engine, window, start, end, now_ms),
+        anomaly_lines(engine, window, fields),
+    ]
+    lines = []
+    used = 0
+    for line in [line for section in sections if not (len(section) == 1 and section[0].endswith(":")) for line in section]:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break  # Everything after this is lower priority
+        lines.append(line)
+        used += cost
+    if lines and lines[-1].endswith(":"):
+        used -= estimate_tokens(lines.pop()) + 1  # A heading whose items did not fit
+
+    # The per-period table gets what is left, most recent periods first if it has to be cut
+    header = "Per period: start | " + " | ".join(f"{NAMES.get(field, field)} mean (min..max)" for field in fields) + " | readings"
+    sample = table_row(fields, start, DAY_MS, rollups.levels["day"].stats[-1])
+    room = (budget - used - estimate_tokens(header) - 1) // (estimate_tokens(sample) + 2)
+    found = periods(rollups, start, end, room) if room >= MIN_PERIODS else None
+    if found is not None and len(found[2]) >= MIN_PERIODS:
+        resolution, width, starts, stats = found
+        rows = [table_row(fields, int(moment_ms), width, period) for moment_ms, period in zip(starts, stats)]
+        used += estimate_tokens(header) + 1
+        kept = []
+        for row in reversed(rows):
+            cost = estimate_tokens(row) + 1
+            if used + cost > budget:
+                break
+            kept.append(row)
+            used += cost
+        if len(kept) >= MIN_PERIODS:
+            lines.append(header.replace("Per period", f"Per {resolution}"))
+            lines.extend(reversed(kept))
+            result["resolution"] = resolution
+            result["periods"] = len(kept)
+
+    result["text"] = "\n".join(lines)
+    result["tokens"] = estimate_tokens(result["text"])
+    return result
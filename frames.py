@@ -0,0 +1,295 @@
+import binascii
+import struct
+
+import numpy as np
+
+import storage
+
+# Binary telemetry frame, little-endian, 17 bytes:
+#   sync 0xA5 0x5A | version | node id | sequence (u16) | valid-field flags |
+#   temperature (i16, 0.01 °C) | humidity (u16, 0.01 %) | air quality (u16, 0.1) |
+#   light intensity (u16, 1 lux) | CRC-16/CCITT-FALSE of version..payload
+# The same serial link may also carry JSON lines; anything that is not a
+# valid frame is treated as text.
+SYNC = b"\xa5\x5a"
+VERSION = 1
+FRAME_DTYPE = np.dtype([
+    ("sync", "<u2"),
+    ("version", "u1"),
+    ("node", "u1"),
+    ("seq", "<u2"),
+    ("flags", "u1"),
+    ("temperature", "<i2"),
+    ("humidity", "<u2"),
+    ("air_quality", "<u2"),
+    ("light_intensity", "<u2"),
+    ("crc", "<u2"),
+])
+FRAME_SIZE = FRAME_DTYPE.itemsize
+CRC_START = 2  # CRC covers everything after the sync word
+CRC_END = FRAME_SIZE - 2
+
+# Fixed-point scale per field (stored value = reading * scale)
+SCALE = {"temperature": 100, "humidity": 100, "air_quality": 10, "light_intensity": 1}
+
+MAX_PENDING = 65536  # Longest unterminated text kept between reads
+SEQ_WINDOW = 1024  # Sequence jumps larger than this are a device restart, not lost frames
+
+
+def crc_table(bits):
+    # CRC-16/CCITT-FALSE lookup table for shifting `bits` (8 or 16) input bits at once
+    crc = np.arange(1 << bits, dtype=np.uint32) << (16 - bits)
+    for _ in range(bits):
+        crc = np.where(crc & 0x8000, (crc << 1) ^ 0x1021, crc << 1) & 0xFFFF
+    return crc.astype(np.uint16)
+
+
+CRC_TABLE = crc_table(8)
+CRC_WORD_TABLE = crc_table(16)
+
+
+def crc16(rows):
+    # CRC-16/CCITT-FALSE of every row of a 2-D uint8 array at once (same
+    # result as binascii.crc_hqx(row, 0xFFFF)), one table lookup per 16-bit word
+    crc = np.full(len(rows), 0xFFFF, dtype=np.uint16)
+    width = rows.shape[1] - rows.shape[1] % 2
+    words = np.ascontiguousarray(rows[:, :width]).view(">u2")
+    for column in range(words.shape[1]):
+        crc = CRC_WORD_TABLE[crc ^ words[:, column]]
+    if width < rows.shape[1]:
+        crc = (crc << 8) ^ CRC_TABLE[(crc >> 8) ^ rows[:, width]]
+    return crc
+
+
+def encode_frame(record, seq, node=0):
+    # Reference encoder, matching the firmware in demo/demo.ino
+    flags = 0
+    values = []
+    for bit, field in enumerate(storage.FIELDS):
+        value = record.get(field)
+        if value is None:
+            values.append(0)
+            continue
+        flags |= 1 << bit
+        limits = (-32768, 32767) if field == "temperature" else (0, 65535)
+        values.append(min(max(int(round(value * SCALE[field])), limits[0]), limits[1]))
+    body = struct.pack("<BBHBhHHH", VERSION, node, seq & 0xFFFF, flags, *values)
+    return SYNC + body + struct.pack("<H", binascii.crc_hqx(body, 0xFFFF))
+
+
+def source_name(base, node):
+    # Node 0 is the link itself; other nodes get their own source tag
+    if node == 0:
+        return base
+    return f"{base}.{node}" if base else f"node{node}"
+
+
+def frame_records(frames, received_at, source=None):
+    # Reading dicts (the same shape parse_reading returns) for decoded frames
+    columns = []
+    for bit, field in enumerate(storage.FIELDS):
+        values = (frames[field] / SCALE[field]).tolist()
+        for row in np.flatnonzero(((frames["flags"] >> bit) & 1) == 0).tolist():
+            values[row] = None
+        columns.append(values)
+    records = [{"ts": received_at, "temperature": temperature, "humidity": humidity,
+                "air_quality": air_quality, "light_intensity": light_intensity}
+               for temperature, humidity, air_quality, light_intensity in zip(*columns)]
+
+    nodes = frames["node"]
+    if len(nodes) and (nodes == nodes[0]).all():
+        name = source_name(source, int(nodes[0]))
+        if name is not None:
+            for record in records:
+                record["source"] = name
+    elif len(nodes):
+        names = {node: source_name(source, node) for node in np.unique(nodes).tolist()}
+        for record, node in zip(records, nodes.tolist()):
+            if names[node] is not None:
+                record["source"] = names[node]
+    return records
+
+
+class FrameDecoder:
+    # Splits a serial byte stream into binary frames and JSON text lines.
+    # Each read is scanned as a whole: sync words are found with NumPy, all
+    # candidates are CRC-checked together, and the bytes between valid frames
+    # are handed back as text lines. Corrupt frames are skipped (the next sync
+    # word resyncs) and sequence numbers are checked per node. Subclasses with
+    # another frame layout override frame_size, check() and check_sequence().
+
+    frame_size = FRAME_SIZE
+
+    def __init__(self):
+        self.pending = b""
+        self.last_seq = {}
+        self.frames = 0
+        self.lines = 0
+        self.crc_errors = 0
+        self.skipped_bytes = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.restarts = 0
+
+    def feed(self, chunk):
+        # Returns (frames as a FRAME_DTYPE array, list of text lines)
+        size = self.frame_size
+        data = self.pending + chunk
+        buf = np.frombuffer(data, dtype=np.uint8)
+        n = len(buf)
+
+        # Fast path: a clean stream is a whole number of back-to-back frames
+        count = n // size
+        frames = None
+        if count and buf[0] == SYNC[0] and buf[1] == SYNC[1]:
+            ok, decoded = self.check(buf[:count * size].reshape(count, size))
+            if ok.all():
+                frames = decoded
+                starts = np.arange(0, count * size, size)
+                tail = buf[count * size:]
+                incomplete = np.flatnonzero((tail[:-1] == SYNC[0]) & (tail[1:] == SYNC[1])) + count * size
+        if frames is None:
+            starts, frames, incomplete = self.resync(buf)
+
+        # Text between frames; an unterminated piece before a frame is noise
+        lines = []
+        ends = starts + size
+        gaps = np.flatnonzero(starts > np.concatenate([[0], ends[:-1]]))
+        for gap in gaps.tolist():
+            *complete, rest = data[int(ends[gap - 1]) if gap else 0:int(starts[gap])].split(b"\n")
+            lines += complete
+            self.skipped_bytes += len(rest.strip())
+        position = int(ends[-1]) if len(ends) else 0
+
+        # The tail may end in a partial line or a partial frame; keep both for the next read
+        tail_end = int(incomplete[0]) if len(incomplete) else n
+        *complete, rest = data[position:tail_end].split(b"\n")
+        lines += complete
+        self.pending = rest + data[tail_end:]
+        if len(self.pending) > MAX_PENDING:
+            self.skipped_bytes += len(self.pending) - (size - 1)
+            self.pending = self.pending[-(size - 1):]
+
+        lines = [line for line in (line.strip() for line in lines) if line]
+        self.lines += len(lines)
+        if len(frames):
+            frames = self.check_sequence(frames)
+            self.frames += len(frames)
+        return frames, lines
+
+    def check(self, raw):
+        # (mask of valid rows, frames) for candidate frames, one row of bytes each
+        crc = raw[:, CRC_END].astype(np.uint16) | (raw[:, CRC_END + 1].astype(np.uint16) << 8)
+        ok = ((raw[:, 0] == SYNC[0]) & (raw[:, 1] == SYNC[1]) & (raw[:, 2] == VERSION)
+              & (crc16(raw[:, CRC_START:CRC_END]) == crc))
+        return ok, np.ascontiguousarray(raw).reshape(-1).view(FRAME_DTYPE)
+
+    def resync(self, buf):
+        # Every sync word is a candidate frame; keep the ones that pass check().
+        # Returns (frame starts, frames, sync words too close to the end to check yet).
+        size = self.frame_size
+        n = len(buf)
+        starts = np.flatnonzero((buf[:-1] == SYNC[0]) & (buf[1:] == SYNC[1]))
+        incomplete = starts[starts + size > n]
+        starts = starts[starts + size <= n]
+        ok, frames = self.check(buf[starts[:, None] + np.arange(size)])
+        self.crc_errors += int(len(ok) - ok.sum())
+        starts, frames = starts[ok], frames[ok]
+        if len(starts) > 1 and (np.diff(starts) < size).any():
+            # A sync pattern inside an accepted frame is not a frame of its own
+            keep, end = [], -1
+            for i, start in enumerate(starts.tolist()):
+                if start >= end:
+                    keep.append(i)
+                    end = start + size
+            starts, frames = starts[keep], frames[keep]
+        if len(starts):
+            incomplete = incomplete[incomplete >= starts[-1] + size]
+        return starts, frames, incomplete
+
+    def check_sequence(self, frames):
+        # Count lost frames from sequence gaps per node and drop repeats
+        keep = np.ones(len(frames), dtype=bool)
+        nodes = frames["node"]
+        single = bool((nodes == nodes[0]).all())
+        for node in [int(nodes[0])] if single else np.unique(nodes).tolist():
+            index = np.arange(len(frames)) if single else np.flatnonzero(nodes == node)
+            seq = frames["seq"][index].astype(np.int64)
+            previous = np.concatenate([[self.last_seq.get(node, seq[0] - 1)], seq[:-1]])
+            step = (seq - previous) % 65536
+            repeated = step == 0
+            jumped = step > SEQ_WINDOW
+            self.duplicates += int(repeated.sum())
+            self.restarts += int(jumped.sum())
+            self.lost += int((step[~repeated & ~jumped] - 1).sum())
+            keep[index[repeated]] = False
+            self.last_seq[node] = int(seq[-1])
+        return frames[keep]
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "text_lines": self.lines,
+            "crc_errors": self.crc_errors,
+            "skipped_bytes": self.skipped_bytes,
+            "lost_frames": self.lost,
+            "duplicate_frames": self.duplicates,
+            "restarts": self.restarts,
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    import time
+
+    import pipeline
+
+    # Size and host decode speed of the same readings as JSON lines and as frames
+    parser = argparse.ArgumentParser(description="Compare JSON lines with binary frames")
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=4096, help="bytes per serial read")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    readings = [{
+        "temperature": round(float(t), 2), "humidity": round(float(h), 2),
+        "air_quality": round(float(a), 1), "light_intensity": float(int(l)),
+    } for t, h, a, l in zip(rng.normal(25, 3, args.readings), rng.uniform(30, 90, args.readings),
+                            rng.uniform(0, 300, args.readings), rng.uniform(0, 2000, args.readings))]
+    text = b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in readings)
+    binary = b"".join(encode_frame(r, seq) for seq, r in enumerate(readings))
+
+    def chunks(data):
+        return [data[i:i + args.chunk] for i in range(0, len(data), args.chunk)]
+
+    started = time.perf_counter()
+    pending = b""
+    parsed = 0
+    for chunk in chunks(text):
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            pipeline.parse_reading(0.0, line)
+            parsed += 1
+    json_seconds = time.perf_counter() - started
+
+    decoder = FrameDecoder()
+    started = time.perf_counter()
+    decoded = 0
+    for chunk in chunks(binary):
+        frames, _ = decoder.feed(chunk)
+        decoded += len(frames)
+    frame_seconds = time.perf_counter() - started
+
+    decoder = FrameDecoder()
+    started = time.perf_counter()
+    for chunk in chunks(binary):
+        frame_records(decoder.feed(chunk)[0], 0.0)
+    record_seconds = time.perf_counter() - started
+
+    print(f"JSON lines: {len(text) / parsed:.1f} bytes/reading, {parsed / json_seconds:,.0f} readings/s")
+    print(f"Frames:     {FRAME_SIZE} bytes/reading, {decoded / frame_seconds:,.0f} readings/s decoded, "
+          f"{decoded / record_seconds:,.0f} readings/s as reading dicts")
+    print(f"Frames are {len(text) / len(binary):.1f}x smaller and decode {json_seconds / frame_seconds:.1f}x faster "
+          f"({json_seconds / record_seconds:.1f}x including dict conversion)")
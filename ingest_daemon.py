@@ -0,0 +1,455 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import frames
+import metrics
+import pipeline
+import retention
+import securelink
+
+# One asyncio process for every ground-station link: N serial ports plus M
+# ESP32 /data endpoints, all feeding one bounded queue and one batch writer.
+#
+#   python ingest_daemon.py --serial payload1=/dev/ttyUSB0 --serial payload2=/dev/ttyUSB1 \
+#       --http esp32a=http://192.168.64.65/data --http esp32b=http://192.168.64.66/data@2
+
+DEFAULT_BAUD = 115200
+DEFAULT_INTERVAL = 5.0  # Seconds between polls of an HTTP source (the ESP8266 sketch used 5 s)
+DEFAULT_JITTER = 0.1  # Fraction of the interval each poll is randomly shifted by
+HTTP_TIMEOUT = 5.0
+RECONNECT_DELAY = 2.0
+STATS_INTERVAL = 5
+
+# Per-source figures (SourceStats attributes) read when the metrics are scraped
+SOURCE_METRICS = (
+    ("readings", "ingest_source_readings_total", "Readings queued from the source"),
+    ("errors", "ingest_source_errors_total", "Parse, connection and HTTP errors"),
+    ("dropped", "ingest_source_dropped_total", "Readings dropped because the queue was full"),
+    ("lost_frames", "ingest_source_lost_frames_total", "Frames missing from the sequence numbers"),
+    ("rejected", "ingest_source_rejected_total", "Plain lines refused on an authenticated link"),
+)
+
+
+class SourceStats:
+    def __init__(self, source_id):
+        self.source_id = source_id
+        self.readings = 0
+        self.errors = 0
+        self.dropped = 0
+        self.lost_frames = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_seen = None
+
+    def error(self, message):
+        self.errors += 1
+        self.last_error = message
+        metrics.log.warning("source_error", source=self.source_id, error=message)
+
+    def summary(self):
+        fields = {"readings": self.readings, "errors": self.errors, "dropped": self.dropped,
+                  "last_seen_s": round(time.time() - self.last_seen, 1) if self.last_seen else "never"}
+        if self.lost_frames:
+            fields["lost_frames"] = self.lost_frames
+        if self.rejected:
+            fields["rejected"] = self.rejected
+        return fields
+
+    def register_metrics(self):
+        for attribute, name, help in SOURCE_METRICS:
+            metrics.counter(name, help, fn=lambda attribute=attribute: getattr(self, attribute), source=self.source_id)
+
+
+class KeepAliveClient:
+    # Minimal HTTP/1.1 GET client that keeps one connection open per endpoint
+    # instead of reconnecting for every poll
+
+    def __init__(self, url, timeout=HTTP_TIMEOUT):
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise ValueError(f"Only http:// sources are supported: {url}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        self.request = (f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+                        f"Connection: keep-alive\r\nAccept: application/json\r\n\r\n").encode("ascii")
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def get(self):
+        # Returns (status, body). A pooled connection the server has since
+        # closed is retried once on a fresh connection.
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+            try:
+                self.writer.write(self.request)
+                await self.writer.drain()
+                status, headers, body = await asyncio.wait_for(self.read_response(), self.timeout)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                await self.close()
+                if reused and attempt == 0:
+                    continue
+                raise
+            if headers.get("connection", "").lower() == "close":
+                await self.close()
+            return status, body
+
+    async def read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                body += await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+        elif "content-length" in headers:
+            body = await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await self.reader.read()
+            headers["connection"] = "close"
+        return status, headers, body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+
+class IngestDaemon:
+    def __init__(self, sink, durability=pipeline.DURABILITY_OS, capacity=pipeline.QUEUE_CAPACITY,
+                 max_records=pipeline.BATCH_MAX_RECORDS, max_latency=pipeline.BATCH_MAX_LATENCY,
+                 link_key=None, link_mode="hmac", link_workers=None, link_state=securelink.REPLAY_STATE_PATH):
+        self.sink = sink
+        self.durability = durability
+        self.capacity = capacity
+        self.max_records = max_records
+        self.max_latency = max_latency
+        self.sources = []
+        self.stats = {}
+        self.committed = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.last_error = None
+        self.queue = None
+        self.unwritten = []
+        # Disk writes run off the event loop, one at a time, in submission order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+
+        # With a link key every source must send authenticated frames (securelink.py);
+        # large reads are verified on a process pool shared by all sources, and
+        # the replay windows of all sources are saved to one file (link_state)
+        self.link_key = link_key
+        self.link_mode = link_mode
+        self.link_state = link_state
+        self.link_workers = link_workers if link_workers is not None else (os.cpu_count() or 1)
+        self.link_pool = ProcessPoolExecutor(self.link_workers) if link_key and self.link_workers > 1 else None
+        self.decoders = {}
+
+        metrics.counter("ingest_committed_total", "Readings stored", fn=lambda: self.committed)
+        metrics.counter("ingest_batches_total", "Batches stored", fn=lambda: self.batches)
+        metrics.counter("ingest_write_errors_total", "Batches that could not be stored", fn=lambda: self.write_errors)
+        metrics.gauge("ingest_queue_depth", "Readings waiting to be stored",
+                      fn=lambda: self.queue.qsize() if self.queue is not None else 0)
+
+    def add_source(self, source_id):
+        self.stats[source_id] = SourceStats(source_id)
+        self.stats[source_id].register_metrics()
+
+    def add_serial(self, source_id, port, baud=DEFAULT_BAUD):
+        self.add_source(source_id)
+        self.sources.append(lambda: self.read_serial(source_id, port, baud))
+
+    def add_http(self, source_id, url, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER):
+        self.add_source(source_id)
+        self.sources.append(lambda: self.poll_http(source_id, url, interval, jitter))
+
+    def enqueue(self, record, stats):
+        try:
+            self.queue.put_nowait(record)
+            stats.readings += 1
+            stats.last_seen = record["ts"]
+        except asyncio.QueueFull:
+            stats.dropped += 1
+
+    def handle_line(self, source_id, line, received_at):
+        stats = self.stats[source_id]
+        try:
+            self.enqueue(pipeline.parse_reading(received_at, line, source_id), stats)
+        except Exception as e:
+            stats.error(f"{e} in {line[:80]!r}")
+
+    def make_decoder(self):
+        if self.link_key is None:
+            return frames.FrameDecoder()
+        return securelink.SecureFrameDecoder(self.link_key, self.link_mode, self.link_workers, self.link_pool,
+                                             self.link_state)
+
+    def split_stream(self, source_id):
+        # Returns feed(chunk, received_at), which cuts a byte stream into
+        # binary frames and JSON lines (see frames.py). The decoder outlives
+        # reconnects, so the replay window of an authenticated link does too.
+        decoder = self.decoders.get(source_id)
+        if decoder is None:
+            decoder = self.decoders[source_id] = self.make_decoder()
+        decoder.pending = b""
+        stats = self.stats[source_id]
+
+        def feed(chunk, received_at):
+            started = time.perf_counter()
+            decoded, lines = decoder.feed(chunk)
+            if len(decoded):
+                for record in frames.frame_records(decoded, received_at, source_id):
+                    self.enqueue(record, stats)
+            if lines:
+                parse_started = time.perf_counter()
+                for line in lines:
+                    self.handle_line(source_id, line, received_at)
+                pipeline.PARSE_SECONDS.observe(time.perf_counter() - parse_started)
+            stats.lost_frames = decoder.lost
+            stats.rejected = getattr(decoder, "rejected", 0)
+            pipeline.READ_SECONDS.observe(time.perf_counter() - started)
+
+        return feed
+
+    async def read_serial(self, source_id, port, baud):
+        import serial
+
+        stats = self.stats[source_id]
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                ser = serial.Serial(port, baud, timeout=0)
+            except (OSError, serial.SerialException) as e:
+                stats.error(f"Could not open {port}: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            feed = self.split_stream(source_id)
+            closed = loop.create_future()
+
+            def on_readable():
+                try:
+                    chunk = ser.read(ser.in_waiting or 1)
+                except (OSError, serial.SerialException) as e:
+                    if not closed.done():
+                        closed.set_exception(e)
+                    return
+                if chunk:
+                    feed(chunk, time.time())
+
+            try:
+                # The event loop wakes us only when the port has bytes; no thread per port
+                loop.add_reader(ser.fileno(), on_readable)
+            except (NotImplementedError, AttributeError):
+                # Windows event loops cannot watch serial handles; fall back to blocking reads on a thread
+                await self.read_serial_blocking(ser, feed, stats)
+                await asyncio.sleep(RECONNECT_DELAY)
+                continue
+
+            try:
+                await closed
+            except (OSError, serial.SerialException) as e:
+                stats.error(f"{port}: {e}")
+            finally:
+                loop.remove_reader(ser.fileno())
+                ser.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def read_serial_blocking(self, ser, feed, stats):
+        loop = asyncio.get_running_loop()
+        ser.timeout = pipeline.READ_TIMEOUT
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, lambda: ser.read(ser.in_waiting or 1))
+                if chunk:
+                    feed(chunk, time.time())
+        except Exception as e:
+            stats.error(f"{ser.port}: {e}")
+        finally:
+            ser.close()
+
+    async def poll_http(self, source_id, url, interval, jitter):
+        stats = self.stats[source_id]
+        client = KeepAliveClient(url)
+        feed = self.split_stream(source_id) if self.link_key is not None else None
+        # Random start phase so many endpoints on the same interval do not poll in lockstep
+        await asyncio.sleep(random.uniform(0, interval))
+        try:
+            while True:
+                started = time.monotonic()
+                try:
+                    status, body = await client.get()
+                    if status == 200 and feed is not None:
+                        feed(body, time.time())  # Only authenticated frames are accepted
+                    elif status == 200:
+                        self.enqueue(pipeline.normalize_reading(time.time(), json.loads(body), source_id), stats)
+                    else:
+                        stats.error(f"HTTP {status}: {body[:80]!r}")
+                except Exception as e:
+                    stats.error(f"{url}: {e!r}")
+                delay = interval * (1 + random.uniform(-jitter, jitter))
+                await asyncio.sleep(max(0.0, delay - (time.monotonic() - started)))
+        finally:
+            await client.close()
+
+    def commit(self, records):
+        started = time.perf_counter()
+        try:
+            self.sink.append_many(records)
+            if self.durability == pipeline.DURABILITY_FSYNC:
+                self.sink.sync()
+        except Exception as e:
+            self.write_errors += 1
+            self.last_error = f"Could not store batch of {len(records)}: {e}"
+            metrics.log.error("write_error", error=self.last_error)
+            return
+        pipeline.COMMIT_SECONDS.observe(time.perf_counter() - started)
+        self.committed += len(records)
+        self.batches += 1
+
+    async def write_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = []
+            try:
+                batch.append(await self.queue.get())
+                deadline = loop.time() + self.max_latency
+                while len(batch) < self.max_records:
+                    while not self.queue.empty() and len(batch) < self.max_records:
+                        batch.append(self.queue.get_nowait())
+                    remaining = deadline - loop.time()
+                    if len(batch) >= self.max_records or remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Keep the half-built batch so drain() still stores it
+                self.unwritten = batch
+                raise
+            # Once handed to the executor the commit finishes even if we are cancelled
+            await loop.run_in_executor(self.executor, self.commit, batch)
+
+    async def report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            metrics.log.info("ingest", committed=self.committed, batches=self.batches,
+                             queue_depth=self.queue.qsize(), write_errors=self.write_errors)
+            for stats in self.stats.values():
+                metrics.log.info("source", source=stats.source_id, **stats.summary())
+
+    async def drain(self):
+        batch, self.unwritten = self.unwritten, []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.commit, batch)
+
+    async def run(self, stats_interval=STATS_INTERVAL):
+        self.queue = asyncio.Queue(self.capacity)
+        tasks = [asyncio.create_task(source()) for source in self.sources]
+        writer = asyncio.create_task(self.write_batches())
+        if stats_interval:
+            tasks.append(asyncio.create_task(self.report(stats_interval)))
+        try:
+            await asyncio.gather(*tasks, writer)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
+            await self.drain()
+            self.executor.shutdown(wait=True)
+            for decoder in self.decoders.values():
+                if hasattr(decoder, "close"):
+                    decoder.close()
+            if self.link_pool is not None:
+                self.link_pool.shutdown()
+
+
+def parse_source(spec, default_id):
+    # "id=target" or just "target"; HTTP targets may end in "@seconds"
+    source_id, _, target = spec.partition("=") if "=" in spec.split("://")[0] else ("", "", spec)
+    return source_id or default_id, target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest telemetry from several serial ports and ESP32 HTTP endpoints")
+    parser.add_argument("--serial", action="append", default=[], metavar="[ID=]PORT[:BAUD]")
+    parser.add_argument("--http", action="append", default=[], metavar="[ID=]URL[@SECONDS]")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="default HTTP poll interval")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER, help="poll jitter as a fraction of the interval")
+    parser.add_argument("--backend", default="segments", choices=["segments", "tinydb"])
+    parser.add_argument("--durability", default=pipeline.DURABILITY_OS, choices=[pipeline.DURABILITY_OS, pipeline.DURABILITY_FSYNC])
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL)
+    parser.add_argument("--metrics-port", type=int, default=metrics.DEFAULT_PORT, help="port for /metrics (0 = off)")
+    parser.add_argument("--link-key", metavar="PATH", help="accept only frames authenticated with this key (securelink.py)")
+    parser.add_argument("--link-mode", default="hmac", choices=sorted(securelink.MODES))
+    parser.add_argument("--link-workers", type=int, help="processes verifying large reads (default: one per core)")
+    parser.add_argument("--raw-days", type=float, default=retention.RAW_DAYS, help="days of raw readings to keep (0 = forever)")
+    parser.add_argument("--minute-days", type=float, default=retention.MINUTE_DAYS, help="days of minute rollups to keep (0 = forever)")
+    parser.add_argument("--hour-days", type=float, default=retention.HOUR_DAYS or 0, help="days of hourly rollups to keep (0 = forever)")
+    args = parser.parse_args()
+    if not args.serial and not args.http:
+        parser.error("give at least one --serial or --http source")
+
+    link_key = securelink.load_key(args.link_key) if args.link_key else None
+    sink = pipeline.open_store_group(args.backend, policy=retention.Policy(args.raw_days, args.minute_days, args.hour_days))
+    sink.compactor.start()
+    daemon = IngestDaemon(sink, durability=args.durability, link_key=link_key,
+                          link_mode=args.link_mode, link_workers=args.link_workers)
+
+    for number, spec in enumerate(args.serial, 1):
+        source_id, target = parse_source(spec, f"serial{number}")
+        port, _, baud = target.rpartition(":") if target.rpartition(":")[2].isdigit() else (target, "", "")
+        daemon.add_serial(source_id, port, int(baud) if baud else DEFAULT_BAUD)
+    for number, spec in enumerate(args.http, 1):
+        source_id, target = parse_source(spec, f"http{number}")
+        url, _, interval = target.rpartition("@") if "@" in target else (target, "", "")
+        daemon.add_http(source_id, url, float(interval) if interval else args.interval, args.jitter)
+
+    metrics.serve(args.metrics_port)
+    try:
+        asyncio.run(daemon.run(args.stats_interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sink.close()
+        metrics.log.info("stopped", committed=daemon.committed, batches=daemon.batches)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+import storage
+
+CACHE_PATH = "llm_cache.json"
+CACHE_MAX_ENTRIES = 256
+CACHE_TTL = 6 * 3600  # Seconds before a cached answer is asked again
+QUANT_STEP = 0.5  # Averages are rounded to this step before keying the cache
+POLL_MS = 30  # How often the Tk thread drains results from the workers
+
+
+def quantize(value, step=QUANT_STEP):
+    if value is None:
+        return None
+    return round(round(float(value) / step) * step, 6)
+
+
+def cache_key(intent, template, averages, context=""):
+    # Same intent + prompt template + (rounded) data + data digest -> same
+    # answer, however the question was worded
+    quantized = {name: quantize(value) for name, value in sorted(averages.items())}
+    raw = json.dumps([intent, template, quantized, context], sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # LRU + TTL cache of LLM answers, persisted to a JSON file so it survives restarts
+
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as file:
+                entries = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+        now = time.time()
+        for key, (stored_at, value) in entries.items():
+            if now - stored_at < self.ttl:
+                self._entries[key] = (stored_at, value)
+
+    def save(self):
+        if self.path:
+            storage.write_json_atomic(self.path, dict(self._entries))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.save()
+
+
+class LLMRequest:
+    # A deferred LLM answer: `stream()` yields text chunks (run on a worker
+    # thread), `fallback(error)` produces the reply when the call fails
+
+    def __init__(self, stream, fallback, intent=None, template=None, averages=None, context=""):
+        self.stream = stream
+        self.fallback = fallback
+        self.key = cache_key(intent, template, averages or {}, context) if intent else None
+
+
+class TextStream:
+    # Appends a streamed reply at a fixed spot in a Text widget, so later
+    # messages can be added below it while it is still arriving
+
+    _counter = 0
+
+    def __init__(self, widget, prefix):
+        TextStream._counter += 1
+        self.widget = widget
+        self.mark = f"llm-reply-{TextStream._counter}"
+        widget.insert("end", prefix)
+        widget.mark_set(self.mark, "end-1c")
+        widget.mark_gravity(self.mark, "right")
+        widget.insert("end", "\n\n")
+        widget.see("end")
+
+    def write(self, text):
+        self.widget.insert(self.mark, text)
+        self.widget.see(self.mark)
+
+    def close(self):
+        self.widget.mark_unset(self.mark)
+
+
+class LLMWorker:
+    # Runs LLM calls on a thread pool and hands tokens back to the Tk thread
+    # through a queue drained with root.after, so the UI never blocks
+
+    def __init__(self, root, cache=None, max_workers=2, name="llm"):
+        self.root = root
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm")
+        self.pending = 0
+        self._events = queue.Queue()
+        self._polling = False
+        # Round trips are timed per model: to the first streamed chunk and to the end of the reply
+        self.first_chunk_seconds = metrics.histogram("llm_first_chunk_seconds", "Time from request to the first streamed chunk", model=name)
+        self.seconds = {outcome: metrics.histogram("llm_request_seconds", "LLM round-trip time", model=name, outcome=outcome)
+                        for outcome in ("ok", "error")}
+        if cache is not None:
+            metrics.counter("llm_cache_hits_total", "LLM answers served from the cache", fn=lambda: cache.hits, model=name)
+            metrics.counter("llm_cache_misses_total", "LLM answers not in the cache", fn=lambda: cache.misses, model=name)
+
+    def submit(self, request, output):
+        # `output` is a TextStream (or anything with write/close)
+        cached = self.cache.get(request.key) if self.cache and request.key else None
+        if cached is not None:
+            output.write(cached)
+            output.close()
+            return
+        self.pending += 1
+        self.executor.submit(self._run, request, output)
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._drain)
+
+    def _run(self, request, output):
+        chunks = []
+        started = time.perf_counter()
+        try:
+            for chunk in request.stream():
+                if chunk:
+                    if not chunks:
+                        self.first_chunk_seconds.observe(time.perf_counter() - started)
+                    chunks.append(chunk)
+                    self._events.put((output.write, chunk))
+            self.seconds["ok"].observe(time.perf_counter() - started)
+            text = "".join(chunks)
+            if self.cache and request.key and text:
+                self.cache.put(request.key, text)
+        except Exception as e:
+            self.seconds["error"].observe(time.perf_counter() - started)
+            metrics.log.warning("llm_error", error=str(e))
+            try:
+                reply = request.fallback(e)
+            except Exception:
+                reply = f"Error: {str(e)}. Please try again."
+            self._events.put((output.write, ("\n" if chunks else "") + reply))
+        self._events.put((self._finish, output))
+
+    def _finish(self, output):
+        output.close()
+        self.pending -= 1
+
+    def _drain(self):
+        try:
+            while True:
+                callback, argument = self._events.get_nowait()
+                callback(argument)
+        except queue.Empty:
+            pass
+        if self.pending:
+            self.root.after(POLL_MS, self._drain)
+        else:
+            self._polling = False
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def answer_now(request, cache=None, write=print):
+    # Blocking LLMWorker.submit for consoles without a Tk loop (--headless):
+    # the cached answer, or the reply streamed to `write` chunk by chunk
+    cached = cache.get(request.key) if cache and request.key else None
+    if cached is not None:
+        write(cached)
+        return cached
+    chunks = []
+    try:
+        for chunk in request.stream():
+            if chunk:
+                chunks.append(chunk)
+                write(chunk)
+        text = "".join(chunks)
+        if cache and request.key and text:
+            cache.put(request.key, text)
+        return text
+    except Exception as e:
+        metrics.log.warning("llm_error", error=str(e))
+        try:
+            reply = request.fallback(e)
+        except Exception:
+            reply = f"Error: {str(e)}. Please try again."
+        write(("\n" if chunks else "") + reply)
+        return reply
+
+
+def cache_path_for(name):
+    # Separate cache file per chatbot so different models never share answers
+    root, ext = os.path.splitext(CACHE_PATH)
+    return f"{root}_{name}{ext}"
@@ -0,0 +1,308 @@
+import bisect
+import collections
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# In-process counters, gauges and latency histograms, served as Prometheus
+# text on a local port. Hot paths record once per serial read or batch, not
+# per reading, and figures that already live on objects (queue depth, CRC
+# errors) are read through callbacks only when scraped, so this stays on in
+# production.
+DEFAULT_PORT = 9108
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds, from a fast frame decode to a slow LLM reply
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROFILE_SECONDS = 5.0  # Default length of a /debug/profile sample
+MAX_PROFILE_SECONDS = 60.0
+PROFILE_INTERVAL = 0.005  # Seconds between stack samples
+
+# At most LOG_BURST lines per event name (and source) every LOG_WINDOW
+# seconds; the rest are counted and reported with the next line that gets through
+LOG_BURST = 5
+LOG_WINDOW = 10.0
+
+
+class Metric:
+    # One time series: a metric name plus fixed label values. With `fn` the
+    # value is read from it at scrape time instead of being recorded.
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labels, fn=None):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.fn = fn
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        return self.fn() if self.fn is not None else self.value
+
+    def samples(self):
+        yield "", self.labels, self.get()
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels, fn=None, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self):
+        return Timer(self)
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            yield "_bucket", {**self.labels, "le": "+Inf" if bound == float("inf") else repr(bound)}, cumulative
+        yield "_sum", self.labels, total
+        yield "_count", self.labels, cumulative
+
+
+class Timer:
+    # with histogram.time(): ... observes the seconds spent inside
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+
+
+REGISTRY = {}  # (name, sorted label items) -> Metric, in registration order
+_registry_lock = threading.Lock()
+
+
+def metric(cls, name, help, fn=None, **labels):
+    # The series for `name` and `labels`, created on first use. Passing `fn`
+    # again replaces the callback, e.g. when a pipeline is restarted.
+    key = (name, tuple(sorted(labels.items())))
+    series = REGISTRY.get(key)
+    if series is None:
+        with _registry_lock:
+            series = REGISTRY.get(key)
+            if series is None:
+                series = REGISTRY[key] = cls(name, help, labels, fn)
+    if fn is not None:
+        series.fn = fn
+    return series
+
+
+def counter(name, help, fn=None, **labels):
+    return metric(Counter, name, help, fn, **labels)
+
+
+def gauge(name, help, fn=None, **labels):
+    return metric(Gauge, name, help, fn, **labels)
+
+
+def histogram(name, help, **labels):
+    return metric(Histogram, name, help, **labels)
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def render():
+    # Every series in the Prometheus text exposition format
+    by_name = collections.OrderedDict()
+    for series in list(REGISTRY.values()):
+        by_name.setdefault(series.name, []).append(series)
+    lines = []
+    for name, group in by_name.items():
+        lines.append(f"# HELP {name} {group[0].help}")
+        lines.append(f"# TYPE {name} {group[0].kind}")
+        for series in group:
+            try:
+                samples = list(series.samples())
+            except Exception:
+                continue  # A callback whose object has gone away; skip it this scrape
+            for suffix, labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{suffix}{label_text(labels)} {float(value):.10g}")
+    return "\n".join(lines) + "\n"
+
+
+def sample_stacks(seconds=PROFILE_SECONDS, interval=PROFILE_INTERVAL):
+    # Poor man's sampling profiler: how often each thread stack was seen over
+    # `seconds`, as "thread;module:function;... count" lines (the folded
+    # format flamegraph.pl and speedscope read). Costs nothing when not asked for.
+    tally = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + min(seconds, MAX_PROFILE_SECONDS)
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            tally[";".join([names.get(ident, str(ident))] + stack[::-1])] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in tally.most_common())
+
+
+def handle(path, params):
+    # (status, content type, body) for the metrics paths, or None for any other
+    # path; lets another HTTP server (analytics_server.py) serve them too
+    if path == "/metrics":
+        return 200, CONTENT_TYPE, render().encode("utf-8")
+    if path == "/debug/profile":
+        seconds = float(params.get("seconds", PROFILE_SECONDS))
+        return 200, "text/plain; charset=utf-8", sample_stacks(seconds).encode("utf-8")
+    return None
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            response = handle(url.path, params) or (404, "text/plain", b"Not found")
+        except ValueError as e:
+            response = (400, "text/plain", f"Bad request: {e}".encode("utf-8"))
+        status, content_type, body = response
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port=DEFAULT_PORT, host="127.0.0.1"):
+    # Serve /metrics and /debug/profile from a daemon thread. Returns the
+    # server, or None when the port is taken (e.g. a second chatbot) or 0/None.
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        log.warning("metrics_unavailable", port=port, error=str(e))
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+def logfmt(value):
+    text = str(value)
+    if text == "" or any(char in text for char in ' "=\n'):
+        return json.dumps(text, ensure_ascii=False)
+    return text
+
+
+class EventLog:
+    # Structured, rate-limited console log: one "key=value" line per event,
+    # at most `burst` lines per event name and source every `window` seconds
+
+    def __init__(self, write=print, burst=LOG_BURST, window=LOG_WINDOW):
+        self.write = write
+        self.burst = burst
+        self.window = window
+        self._events = {}  # (event, source) -> [window start, lines written, lines suppressed]
+        self._lock = threading.Lock()
+
+    def emit(self, level, event, **fields):
+        now = time.monotonic()
+        key = (event, fields.get("source"))
+        with self._lock:
+            state = self._events.get(key)
+            suppressed = 0
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                state = self._events[key] = [now, 0, 0]
+            if state[1] >= self.burst:
+                state[2] += 1
+                counter("log_suppressed_total", "Log lines dropped by rate limiting", level=level).inc()
+                return False
+            state[1] += 1
+        counter("log_lines_total", "Log lines written", level=level).inc()
+        if suppressed:
+            fields["suppressed"] = suppressed
+        parts = [datetime.now().isoformat(timespec="milliseconds"), f"level={level}", f"event={logfmt(event)}"]
+        parts.extend(f"{key}={logfmt(value)}" for key, value in fields.items())
+        self.write(" ".join(parts))
+        return True
+
+    def info(self, event, **fields):
+        return self.emit("info", event, **fields)
+
+    def warning(self, event, **fields):
+        return self.emit("warning", event, **fields)
+
+    def error(self, event, **fields):
+        return self.emit("error", event, **fields)
+
+
+log = EventLog()
+
+
+if __name__ == "__main__":
+    import argparse
+    from urllib.request import urlopen
+
+    # Quick look at a running process: python metrics.py [--profile 5] [--port 9108]
+    parser = argparse.ArgumentParser(description="Print the metrics or a stack profile of a running process")
+    parser.add_argument("--url", help="base URL (default: http://127.0.0.1:PORT)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--profile", type=float, metavar="SECONDS", help="sample thread stacks instead")
+    args = parser.parse_args()
+    base = args.url or f"http://127.0.0.1:{args.port}"
+    path = f"/debug/profile?seconds={args.profile}" if args.profile else "/metrics"
+    with urlopen(base + path, timeout=(args.profile or 0) + 10) as response:
+        sys.stdout.write(response.read().decode("utf-8"))
@@ -0,0 +1,357 @@
+import collections
+import json
+import os
+import threading
+import time
+
+import anomaly
+import columnar
+import frames
+import metrics
+import retention
+import rollup
+import storage
+
+# Group-commit defaults: a batch is written once it holds BATCH_MAX_RECORDS
+# readings or its oldest reading has waited BATCH_MAX_LATENCY seconds
+BATCH_MAX_RECORDS = 500
+BATCH_MAX_LATENCY = 0.2
+QUEUE_CAPACITY = 20000
+PUT_TIMEOUT = 0.05  # How long the reader may wait for space before dropping a reading
+
+# "fsync" forces every batch to disk; "os" leaves it in the OS page cache
+DURABILITY_FSYNC = "fsync"
+DURABILITY_OS = "os"
+
+READ_TIMEOUT = 0.1
+RECONNECT_DELAY = 2.0  # Seconds between attempts to reopen a serial port that failed
+
+# Latency histograms (metrics.py), recorded once per serial read or batch
+READ_SECONDS = metrics.histogram("ingest_read_seconds", "Time to decode one serial read and queue its readings")
+PARSE_SECONDS = metrics.histogram("ingest_parse_seconds", "Time to parse the JSON lines of one batch")
+COMMIT_SECONDS = metrics.histogram("ingest_commit_seconds", "Time to store one batch in every backend")
+
+# Figures from IngestPipeline.stats(), read when the metrics are scraped
+STATS_METRICS = (
+    ("lines", metrics.counter, "ingest_lines_total", "JSON lines read from the link"),
+    ("frames", metrics.counter, "ingest_frames_total", "Binary frames decoded"),
+    ("bytes", metrics.counter, "ingest_link_bytes_total", "Bytes read from the link"),
+    ("crc_errors", metrics.counter, "ingest_crc_errors_total", "Frames dropped for a bad CRC"),
+    ("lost_frames", metrics.counter, "ingest_lost_frames_total", "Frames missing from the sequence numbers"),
+    ("committed", metrics.counter, "ingest_committed_total", "Readings stored"),
+    ("batches", metrics.counter, "ingest_batches_total", "Batches stored"),
+    ("auth_errors", metrics.counter, "ingest_auth_errors_total", "Frames that failed authentication (securelink.py)"),
+    ("rejected_lines", metrics.counter, "ingest_rejected_lines_total", "Plain lines refused on an authenticated link"),
+    ("replayed", metrics.counter, "ingest_replayed_total", "Authenticated frames refused as replays"),
+    ("parse_errors", metrics.counter, "ingest_parse_errors_total", "Lines that could not be parsed"),
+    ("write_errors", metrics.counter, "ingest_write_errors_total", "Batches that could not be stored"),
+    ("read_errors", metrics.counter, "ingest_read_errors_total", "Serial reads or reopens that failed"),
+    ("connected", metrics.gauge, "ingest_link_connected", "1 while the serial port is open and reading"),
+    ("dropped", metrics.counter, "ingest_dropped_total", "Readings dropped because the queue was full"),
+    ("backpressure_waits", metrics.counter, "ingest_backpressure_waits_total", "Times the reader waited for queue space"),
+    ("queue_depth", metrics.gauge, "ingest_queue_depth", "Readings waiting to be stored"),
+    ("max_queue_depth", metrics.gauge, "ingest_max_queue_depth", "Most readings ever waiting"),
+)
+
+
+class RingBuffer:
+    # Bounded queue between the serial reader and the batch writer
+
+    def __init__(self, capacity=QUEUE_CAPACITY):
+        self.capacity = capacity
+        self.closed = False
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.max_depth = 0
+        self._items = collections.deque()
+        self._cond = threading.Condition()
+        self._notify_at = 1
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, timeout=PUT_TIMEOUT):
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                self.backpressure_waits += 1
+                deadline = time.monotonic() + timeout
+                while len(self._items) >= self.capacity and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.dropped += 1
+                        return False
+                    self._cond.wait(remaining)
+            if self.closed:
+                self.dropped += 1
+                return False
+
+            self._items.append(item)
+            depth = len(self._items)
+            self.max_depth = max(self.max_depth, depth)
+            # Only wake the writer when a batch can start or is full, not per reading
+            if depth == 1 or depth >= self._notify_at:
+                self._cond.notify_all()
+            return True
+
+    def get_batch(self, max_items=BATCH_MAX_RECORDS, max_latency=BATCH_MAX_LATENCY):
+        # Blocks for the first item, then until the batch is full or the
+        # latency deadline passes. Returns [] once closed and drained.
+        with self._cond:
+            while not self._items and not self.closed:
+                self._cond.wait()
+
+            self._notify_at = max_items
+            deadline = time.monotonic() + max_latency
+            while len(self._items) < max_items and not self.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            count = min(max_items, len(self._items))
+            batch = [self._items.popleft() for _ in range(count)]
+            self._cond.notify_all()  # Release a reader waiting for space
+            return batch
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+# Alternative key spellings sent by the sketches (ESP32.ino sends "airQuality")
+FIELD_ALIASES = {
+    "airQuality": "air_quality",
+    "lightIntensity": "light_intensity",
+}
+
+
+def normalize_reading(ts, data, source=None):
+    # Temperature and humidity are required; air quality and light are optional
+    for alias, field in FIELD_ALIASES.items():
+        if alias in data and field not in data:
+            data[field] = data[alias]
+    record = {
+        "ts": ts,
+        "temperature": data["temperature"],
+        "humidity": data["humidity"],
+        "air_quality": data.get("air_quality"),
+        "light_intensity": data.get("light_intensity"),
+    }
+    if source is not None:
+        record["source"] = source
+    return record
+
+
+def parse_reading(ts, line, source=None):
+    return normalize_reading(ts, json.loads(line), source)
+
+
+def open_store_group(backend="segments", log=print, policy=None):
+    # Segment store + column store + rollup index + anomaly detector, migrating
+    # older data on first use. With a retention `policy` the group gets a
+    # retention.Compactor (not started) as group.compactor.
+    db = storage.open_storage(backend)
+
+    # Carry over readings from the old single-document file the first time the store is used
+    if backend == "segments" and len(db) == 0 and os.path.exists(storage.LEGACY_JSON_PATH):
+        imported = db.import_legacy(storage.LEGACY_JSON_PATH)
+        log(f"Imported {imported} readings from {storage.LEGACY_JSON_PATH}")
+
+    # Columnar copy memory-mapped by the chatbots; built from the store on first use
+    columns = columnar.ColumnStore(columnar.COLUMN_DIR)
+    if columns.next_row == 0 and len(db) > 0:
+        log(f"Built column store with {columns.import_records(db.records())} readings")
+
+    # Minute/hour/day aggregates kept up to date as readings are stored
+    rollups = rollup.open_index(columns, rollup.ROLLUP_PATH)
+
+    # Anomaly checks on every batch; events go to a side table next to the columns
+    detector = anomaly.open_detector(columns)
+
+    group = storage.StorageGroup(db, columns, rollups, detector)
+    if policy is not None:
+        segments = db if backend == "segments" else None
+        group.compactor = retention.Compactor(columns, rollups, detector, segments, group.lock, policy, log=log)
+    return group
+
+
+class SerialReader(threading.Thread):
+    # Drains the serial port into the ring buffer. Blocks in read() with a
+    # short timeout instead of spinning on in_waiting. The link may carry JSON
+    # lines, binary frames (frames.py) or a mix; frames are decoded here, a
+    # whole read at a time, and queued as ready-made readings. An authenticated
+    # link passes a securelink.SecureFrameDecoder instead. A port that fails
+    # (e.g. the USB cable is pulled) is closed and reopened every few seconds.
+
+    def __init__(self, ser, buffer, decoder=None):
+        super().__init__(name="serial-reader", daemon=True)
+        self.ser = ser
+        self.buffer = buffer
+        self.lines = 0
+        self.bytes = 0
+        self.decoder = decoder if decoder is not None else frames.FrameDecoder()
+        self.read_errors = 0
+        self.last_error = None
+        self.connected = True
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                if not self.connected:
+                    self.ser.open()
+                    self.connected = True
+                    metrics.log.info("serial_reopened", port=self.ser.port)
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+            except OSError as e:  # serial.SerialException is an OSError
+                self.failed(e)
+                continue
+            if not chunk:
+                continue
+            received_at = time.time()
+            started = time.perf_counter()
+            self.bytes += len(chunk)
+
+            decoded, lines = self.decoder.feed(chunk)
+            if len(decoded):
+                for record in frames.frame_records(decoded, received_at):
+                    self.buffer.put((received_at, record))
+            for line in lines:
+                self.lines += 1
+                self.buffer.put((received_at, line))
+            READ_SECONDS.observe(time.perf_counter() - started)
+
+    def failed(self, error):
+        self.read_errors += 1
+        self.last_error = f"{self.ser.port}: {error}"
+        metrics.log.warning("serial_error", error=self.last_error)
+        if self.connected:
+            self.connected = False
+            try:
+                self.ser.close()
+            except OSError:
+                pass
+        self._stop_event.wait(RECONNECT_DELAY)
+
+
+class BatchWriter(threading.Thread):
+    # Parses queued lines (frames arrive already decoded) and commits them to
+    # storage one batch at a time
+
+    def __init__(self, buffer, sink, durability=DURABILITY_OS,
+                 max_records=BATCH_MAX_RECORDS, max_latency=BATCH_MAX_LATENCY,
+                 parse=parse_reading, on_commit=None):
+        super().__init__(name="batch-writer", daemon=True)
+        if durability not in (DURABILITY_FSYNC, DURABILITY_OS):
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.buffer = buffer
+        self.sink = sink
+        self.durability = durability
+        self.max_records = max_records
+        self.max_latency = max_latency
+        self.parse = parse
+        self.on_commit = on_commit
+        self.committed = 0
+        self.batches = 0
+        self.parse_errors = 0
+        self.write_errors = 0
+        self.last_error = None
+        self.last_commit_seconds = 0.0
+
+    def run(self):
+        while True:
+            batch = self.buffer.get_batch(self.max_records, self.max_latency)
+            if not batch:
+                break
+            self.commit(batch)
+
+    def commit(self, batch):
+        records = []
+        parsed = False
+        started = time.perf_counter()
+        for received_at, line in batch:
+            if isinstance(line, dict):
+                records.append(line)  # Already decoded from a binary frame
+                continue
+            parsed = True
+            try:
+                records.append(self.parse(received_at, line))
+            except Exception as e:
+                self.parse_errors += 1
+                self.last_error = f"{e} in {line[:80]!r}"
+                metrics.log.warning("parse_error", error=self.last_error)
+        if parsed:
+            PARSE_SECONDS.observe(time.perf_counter() - started)
+        if not records:
+            return
+
+        started = time.perf_counter()
+        try:
+            self.sink.append_many(records)
+            if self.durability == DURABILITY_FSYNC:
+                self.sink.sync()
+        except Exception as e:
+            self.write_errors += 1
+            self.last_error = f"Could not store batch of {len(records)}: {e}"
+            metrics.log.error("write_error", error=self.last_error)
+            return
+        self.last_commit_seconds = time.perf_counter() - started
+        COMMIT_SECONDS.observe(self.last_commit_seconds)
+
+        self.committed += len(records)
+        self.batches += 1
+        if self.on_commit is not None:
+            self.on_commit(records)
+
+
+class IngestPipeline:
+    # Serial reader thread -> bounded ring buffer -> group-commit writer thread
+
+    def __init__(self, ser, sink, durability=DURABILITY_OS, capacity=QUEUE_CAPACITY,
+                 max_records=BATCH_MAX_RECORDS, max_latency=BATCH_MAX_LATENCY, on_commit=None,
+                 decoder=None):
+        self.buffer = RingBuffer(capacity)
+        self.reader = SerialReader(ser, self.buffer, decoder)
+        self.writer = BatchWriter(self.buffer, sink, durability, max_records, max_latency,
+                                  on_commit=on_commit)
+        for key, kind, name, help in STATS_METRICS:
+            kind(name, help, fn=lambda key=key: self.stats().get(key))
+
+    def start(self):
+        self.writer.start()
+        self.reader.start()
+
+    def stop(self, timeout=5.0):
+        # Stop reading, then let the writer drain whatever is still queued
+        self.reader.stop()
+        self.reader.join(timeout)
+        self.buffer.close()
+        self.writer.join(timeout)
+        if hasattr(self.reader.decoder, "close"):
+            self.reader.decoder.close()
+
+    def stats(self):
+        link = self.reader.decoder.stats()
+        return {
+            "lines": self.reader.lines,
+            "frames": self.reader.decoder.frames,
+            "bytes": self.reader.bytes,
+            "crc_errors": self.reader.decoder.crc_errors,
+            "lost_frames": self.reader.decoder.lost,
+            **{key: link[key] for key in ("auth_errors", "rejected_lines", "replayed") if key in link},
+            "committed": self.writer.committed,
+            "batches": self.writer.batches,
+            "parse_errors": self.writer.parse_errors,
+            "write_errors": self.writer.write_errors,
+            "read_errors": self.reader.read_errors,
+            "connected": int(self.reader.connected),
+            "dropped": self.buffer.dropped,
+            "backpressure_waits": self.buffer.backpressure_waits,
+            "queue_depth": len(self.buffer),
+            "max_queue_depth": self.buffer.max_depth,
+            "last_commit_ms": round(self.writer.last_commit_seconds * 1000, 3),
+        }
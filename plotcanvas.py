@@ -0,0 +1,114 @@
+import time
+
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+import metrics
+import timerange
+
+POINTS_PER_PIXEL = 2  # LTTB keeps about this many points per pixel of axes width
+MIN_POINTS = 200
+
+# From a graph request to its pixels on screen: a full redraw (including the
+# wait for Tk to get to it) or a blitted live update
+DRAW_SECONDS = metrics.histogram("plot_render_seconds", "Time to render a graph", mode="draw")
+BLIT_SECONDS = metrics.histogram("plot_render_seconds", "Time to render a graph", mode="blit")
+
+
+def downsample(times, values, threshold):
+    # Matplotlib date numbers and values for at most `threshold` points;
+    # missing readings (NaN) are left out
+    times = np.asarray(times, dtype="datetime64[ms]")
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.isfinite(values)
+    if not keep.all():
+        times, values = times[keep], values[keep]
+    picked = timerange.lttb(times.astype(np.int64).astype(np.float64), values, threshold)
+    return mdates.date2num(times[picked]), values[picked]
+
+
+class PlotCanvas:
+    # One figure and Tk canvas reused for every graph. A new graph replaces the
+    # line data in place; live updates are blitted when the axes limits have
+    # not changed, so only the lines are redrawn.
+
+    def __init__(self, master, figsize=(6, 4)):
+        self.figure = Figure(figsize=figsize)
+        self.ax = self.figure.add_subplot()
+        self.twin = self.ax.twinx()  # Second y axis for two-field graphs
+        self.axes = (self.ax, self.twin)
+        self.lines = [axis.plot([], [], animated=True)[0] for axis in self.axes]
+        self.ax.xaxis_date()
+        locator = mdates.AutoDateLocator()
+        self.ax.xaxis.set_major_locator(locator)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        self.ax.set_xlabel("Time")
+        self.ax.grid(True)
+        self.count = 0
+        self.background = None
+        self.requested = None  # perf_counter() of a redraw not drawn yet
+
+        self.canvas = FigureCanvasTkAgg(self.figure, master=master)
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.canvas.get_tk_widget().pack()
+
+    def on_draw(self, event):
+        # The lines are animated (skipped by a full draw), so save the static
+        # background for blitting and then paint them on top
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+        if self.requested is not None:
+            DRAW_SECONDS.observe(time.perf_counter() - self.requested)
+            self.requested = None
+
+    def draw_lines(self):
+        for line in self.lines[:self.count]:
+            line.axes.draw_artist(line)
+
+    def threshold(self):
+        return max(MIN_POINTS, int(self.ax.bbox.width) * POINTS_PER_PIXEL)
+
+    def set_data(self, times, series, xlim):
+        threshold = self.threshold()
+        for line, values in zip(self.lines, series):
+            line.set_data(*downsample(times, values, threshold))
+        for axis, line in zip(self.axes, self.lines):
+            axis.relim()
+            axis.autoscale_view()
+        if xlim is not None:
+            self.ax.set_xlim(mdates.date2num(xlim[0]), mdates.date2num(xlim[1]))
+
+    def show(self, times, series, title, xlim=None):
+        # `series` is [(values, label, color)], one or two entries; the second
+        # goes on its own y axis. `xlim` pins the time axis to a window.
+        self.requested = time.perf_counter()
+        self.count = len(series)
+        self.twin.set_visible(self.count > 1)
+        for axis, line, (_, label, color) in zip(self.axes, self.lines, series):
+            line.set_label(label)
+            line.set_color(color)
+            axis.set_ylabel(label, color=color if self.count > 1 else "black")
+            axis.tick_params(axis="y", labelcolor=color if self.count > 1 else "black")
+        for line in self.lines[self.count:]:
+            line.set_data([], [])
+        self.set_data(times, [values for values, _, _ in series], xlim)
+        self.ax.set_title(title)
+        self.ax.legend(handles=self.lines[:self.count], loc="upper left")
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    def update(self, times, series, xlim=None):
+        # New data for the graph on screen (same fields as the last show())
+        started = time.perf_counter()
+        limits = [axis.get_xlim() + axis.get_ylim() for axis in self.axes]
+        self.set_data(times, series, xlim)
+        if self.background is not None and limits == [axis.get_xlim() + axis.get_ylim() for axis in self.axes]:
+            self.canvas.restore_region(self.background)
+            self.draw_lines()
+            self.canvas.blit(self.figure.bbox)
+            BLIT_SECONDS.observe(time.perf_counter() - started)
+        else:
+            self.requested = self.requested or started
+            self.canvas.draw_idle()
@@ -0,0 +1,187 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import rollup
+
+# How long each tier is kept, in days (None or 0 = forever). Raw readings
+# older than raw_days only live on as minute rollups, minute rollups older
+# than minute_days as hourly ones, and so on; day buckets are never dropped.
+Policy = namedtuple("Policy", ["raw_days", "minute_days", "hour_days"])
+RAW_DAYS = 7
+MINUTE_DAYS = 90
+HOUR_DAYS = None
+DEFAULT_POLICY = Policy(RAW_DAYS, MINUTE_DAYS, HOUR_DAYS)
+
+DAY_MS = 86400000
+COMPACT_INTERVAL = 600  # Seconds between compaction passes while ingesting
+# Raw column files are only rewritten once this share of their rows can go,
+# so each reading is copied a handful of times over its life, not every pass
+MIN_DROP_FRACTION = 0.25
+
+# Tier below which each cut-off is aligned: raw readings give way to whole
+# minutes, minutes to whole hours, hours to whole days
+TIERS = (("raw", "minute"), ("minute", "hour"), ("hour", "day"))
+
+
+def cutoffs(policy, now_ms, offset_ms):
+    # Oldest time (epoch ms) kept per tier, None = kept forever. A coarser
+    # tier never ends before a finer one, so every moment is covered.
+    widths = dict(rollup.LEVELS)
+    result = {}
+    previous = now_ms
+    for (tier, coarser), days in zip(TIERS, policy):
+        if not days or previous is None:
+            result[tier] = previous = None
+            continue
+        width = widths[coarser]
+        cutoff = min(now_ms - int(days * DAY_MS), previous)
+        result[tier] = previous = (cutoff + offset_ms) // width * width - offset_ms
+    return result
+
+
+class Compactor(threading.Thread):
+    # Background retention for the ingest side. Every pass prunes minute and
+    # hour buckets past the policy, then drops raw rows older than raw_days
+    # from the column store (columnar.ColumnStore.compact copies the rest to a
+    # new file generation, outside the writer lock) and deletes sealed segment
+    # files that only hold such rows. Rows are only dropped once the rollup
+    # index and anomaly detector have seen them and the index is saved.
+
+    def __init__(self, columns, rollups, detector=None, segments=None, lock=None,
+                 policy=DEFAULT_POLICY, interval=COMPACT_INTERVAL, log=print):
+        super().__init__(name="compactor", daemon=True)
+        self.columns = columns
+        self.rollups = rollups
+        self.detector = detector
+        self.segments = segments
+        self.lock = lock or threading.Lock()
+        self.policy = policy
+        self.interval = interval
+        self.log = log
+        self.passes = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_result = None
+        self._stop_event = threading.Event()
+
+    def stop(self, timeout=60.0):
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                result = self.compact()
+                if any(value for key, value in result.items() if key != "seconds"):
+                    self.log("Compacted: " + " ".join(f"{key}={value}" for key, value in result.items()))
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"Compaction failed: {e!r}"
+                self.log(self.last_error)
+            self._stop_event.wait(self.interval)
+
+    def raw_cut(self, cutoff, covered):
+        # Logical row before which every row is older than `cutoff`, and at
+        # most `covered`, the rows the saved rollup index and detector state
+        # include. Stops at the first newer row, so an out-of-order row keeps
+        # the rest around.
+        ts = self.columns.ts
+        below = np.asarray(ts < cutoff)
+        count = len(below) if below.all() else int(np.argmin(below))
+        return min(self.columns.first_row + count, covered)
+
+    def compact(self, now=None):
+        started = time.perf_counter()
+        now_ms = int((time.time() if now is None else now) * 1000)
+        cuts = cutoffs(self.policy, now_ms, self.rollups.offset_ms)
+        result = {"raw_rows": 0, "segment_rows": 0, "minute_buckets": 0, "hour_buckets": 0}
+        self.columns.remove_stale()
+
+        # Coarse tiers first, saved before any raw row goes, so the saved
+        # index always covers every row missing from the column store. The
+        # row counts are taken as saved: ingest keeps adding rows to the live
+        # index after the lock is released, and those are not on disk yet.
+        with self.lock:
+            for tier in ("minute", "hour"):
+                if cuts[tier] is not None:
+                    result[tier + "_buckets"] = self.rollups.prune(tier, cuts[tier])
+            if self.rollups.path:
+                self.rollups.save()
+            covered = self.rollups.rows
+            if self.detector is not None:
+                if self.detector.path:
+                    self.detector.save()
+                covered = min(covered, self.detector.rows)
+
+        if cuts["raw"] is not None:
+            row = self.raw_cut(cuts["raw"], covered)
+            dropped = row - self.columns.first_row
+            if dropped > 0 and dropped >= MIN_DROP_FRACTION * len(self.columns):
+                self.columns.compact(row, cuts["raw"], self.lock)
+                result["raw_rows"] = dropped
+                # Segments go only once the column store has let go of the same
+                # readings: up to the cutoff, or the oldest row it still holds
+                if self.segments is not None:
+                    kept_ms = cuts["raw"] if len(self.columns) == 0 else min(cuts["raw"], int(self.columns.ts[0]))
+                    with self.lock:
+                        result["segment_rows"] = self.segments.prune(kept_ms / 1000)
+
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        self.passes += 1
+        self.last_result = result
+        return result
+
+
+def footprint(columns, rollup_path=rollup.ROLLUP_PATH, segments=None):
+    # Disk bytes per tier, for status output
+    sizes = {"raw_columns": columns.disk_bytes()}
+    if rollup_path and os.path.exists(rollup_path):
+        sizes["rollups"] = os.path.getsize(rollup_path)
+    if segments is not None:
+        sizes["segments"] = segments.disk_bytes()
+    return sizes
+
+
+if __name__ == "__main__":
+    import argparse
+    from datetime import datetime
+
+    import pipeline
+
+    # Offline compaction, or a look at the tiers; the ingest scripts run the
+    # same compaction in the background, so stop them before using --compact
+    parser = argparse.ArgumentParser(description="Show or apply the telemetry retention policy")
+    parser.add_argument("--raw-days", type=float, default=RAW_DAYS, help="days of raw readings to keep (0 = forever)")
+    parser.add_argument("--minute-days", type=float, default=MINUTE_DAYS, help="days of minute rollups to keep (0 = forever)")
+    parser.add_argument("--hour-days", type=float, default=HOUR_DAYS or 0, help="days of hourly rollups to keep (0 = forever)")
+    parser.add_argument("--compact", action="store_true", help="compact now")
+    args = parser.parse_args()
+    policy = Policy(args.raw_days, args.minute_days, args.hour_days)
+
+    group = pipeline.open_store_group(policy=policy)
+    segments, columns, rollups = group.backends[:3]
+    try:
+        if args.compact:
+            for key, value in group.compactor.compact().items():
+                print(f"{key}: {value}")
+            columns.remove_stale()
+
+        def moment(ms):
+            return datetime.fromtimestamp(ms / 1000).strftime("%Y-%m-%d %H:%M") if ms is not None else "start"
+
+        cuts = cutoffs(policy, int(time.time() * 1000), rollups.offset_ms)
+        print(f"Raw readings:   {len(columns)} rows from {moment(columns.raw_from)} (policy keeps from {moment(cuts['raw'])})")
+        for name in ("minute", "hour", "day"):
+            level = rollups.levels[name]
+            kept_from = rollups.kept_from.get(name)
+            print(f"{name.capitalize() + ' buckets:':15} {level.size} from {moment(kept_from)}"
+                  + (f" (policy keeps from {moment(cuts[name])})" if name in cuts else ""))
+        for name, size in footprint(columns, rollups.path, segments).items():
+            print(f"{name}: {size / 1e6:.1f} MB")
+    finally:
+        group.close()
@@ -0,0 +1,462 @@
+import os
+import time
+
+import numpy as np
+
+import columnar
+import storage
+
+ROLLUP_PATH = os.path.join(columnar.COLUMN_DIR, "rollups.npz")
+CHECKPOINT_INTERVAL = 60  # Seconds between saves while ingesting; unsaved rows are replayed from the column store
+REBUILD_CHUNK = 200000
+
+# Bucket widths in milliseconds, coarsest first
+LEVELS = (
+    ("day", 86400000),
+    ("hour", 3600000),
+    ("minute", 60000),
+)
+
+# Per bucket and field: count, sum, sum of squares, min, max
+COUNT, SUM, SUMSQ, MIN, MAX = range(5)
+STAT_COUNT = 5
+
+
+def empty_stats(rows, fields):
+    stats = np.zeros((rows, fields, STAT_COUNT), dtype=np.float64)
+    stats[..., MIN] = np.inf
+    stats[..., MAX] = -np.inf
+    return stats
+
+
+def row_stats(columns, fields):
+    # Per-row stats so raw rows and buckets can be reduced the same way
+    stats = empty_stats(len(columns[columnar.TIMESTAMP_COLUMN]), len(fields))
+    for index, field in enumerate(fields):
+        valid = columns[field + ".valid"].view(bool)
+        values = columns[field].astype(np.float64)
+        stats[:, index, COUNT] = valid
+        stats[:, index, SUM] = np.where(valid, values, 0.0)
+        stats[:, index, SUMSQ] = stats[:, index, SUM] ** 2
+        stats[:, index, MIN] = np.where(valid, values, np.inf)
+        stats[:, index, MAX] = np.where(valid, values, -np.inf)
+    return stats
+
+
+def reduce_groups(ids, stats):
+    # Combine stats rows sharing a bucket id; returns (sorted unique ids, stats)
+    keys, inverse = np.unique(ids, return_inverse=True)
+    out = empty_stats(len(keys), stats.shape[1])
+    np.add.at(out[..., :MIN], inverse, stats[..., :MIN])
+    np.minimum.at(out[..., MIN], inverse, stats[..., MIN])
+    np.maximum.at(out[..., MAX], inverse, stats[..., MAX])
+    return keys, out
+
+
+def merge_into(target, stats):
+    target[..., :MIN] += stats[..., :MIN]
+    np.minimum(target[..., MIN], stats[..., MIN], out=target[..., MIN])
+    np.maximum(target[..., MAX], stats[..., MAX], out=target[..., MAX])
+
+
+def total(stats):
+    # Collapse a (buckets, STAT_COUNT) block into one stats vector
+    out = np.zeros(STAT_COUNT)
+    if len(stats):
+        out[:MIN] = stats[:, :MIN].sum(axis=0)
+        out[MIN] = stats[:, MIN].min()
+        out[MAX] = stats[:, MAX].max()
+    else:
+        out[MIN], out[MAX] = np.inf, -np.inf
+    return out
+
+
+def summarize(stats):
+    count = int(stats[COUNT])
+    if count == 0:
+        return None
+    mean = stats[SUM] / count
+    variance = max(stats[SUMSQ] / count - mean * mean, 0.0)
+    return {
+        "count": count,
+        "mean": float(mean),
+        "std": float(np.sqrt(variance)),
+        "min": float(stats[MIN]),
+        "max": float(stats[MAX]),
+    }
+
+
+class RollupLevel:
+    # Sorted bucket ids with a stats block per bucket, grown by doubling so
+    # in-order ingest appends in amortised O(1)
+
+    def __init__(self, width, fields, keys=None, stats=None):
+        self.width = width
+        self.fields = fields
+        if keys is None:
+            keys = np.empty(0, dtype=np.int64)
+            stats = empty_stats(0, fields)
+        self.size = len(keys)
+        self._keys = keys
+        self._stats = stats
+
+    @property
+    def keys(self):
+        return self._keys[:self.size]
+
+    @property
+    def stats(self):
+        return self._stats[:self.size]
+
+    def reserve(self, rows):
+        if rows <= len(self._keys):
+            return
+        capacity = max(rows, 2 * len(self._keys), 64)
+        keys = np.empty(capacity, dtype=np.int64)
+        keys[:self.size] = self.keys
+        stats = empty_stats(capacity, self.fields)
+        stats[:self.size] = self.stats
+        self._keys, self._stats = keys, stats
+
+    def merge(self, ids, stats):
+        # ids are sorted and unique
+        keys = self.keys
+        positions = np.searchsorted(keys, ids)
+        exists = positions < self.size
+        exists[exists] = keys[positions[exists]] == ids[exists]
+        if exists.any():
+            existing = positions[exists]
+            block = self._stats[existing]
+            merge_into(block, stats[exists])
+            self._stats[existing] = block
+
+        new = ~exists
+        if not new.any():
+            return
+        new_ids, new_stats = ids[new], stats[new]
+        if self.size == 0 or new_ids[0] > keys[-1]:
+            self.reserve(self.size + len(new_ids))
+            self._keys[self.size:self.size + len(new_ids)] = new_ids
+            self._stats[self.size:self.size + len(new_ids)] = new_stats
+            self.size += len(new_ids)
+        else:
+            # Out-of-order data (e.g. a backfill): rare, so a full insert is fine
+            at = positions[new]
+            self._keys = np.insert(self.keys, at, new_ids)
+            self._stats = np.insert(self.stats, at, new_stats, axis=0)
+            self.size = len(self._keys)
+
+    def drop_before(self, key):
+        # Forget buckets with id < key; returns how many were dropped
+        lo = int(np.searchsorted(self.keys, key))
+        if lo:
+            self._keys = self.keys[lo:].copy()
+            self._stats = self.stats[lo:].copy()
+            self.size = len(self._keys)
+        return lo
+
+    def block(self, first, last, field_index):
+        # Stats of buckets with first <= id < last for one field
+        lo, hi = np.searchsorted(self.keys, [first, last])
+        return self._stats[lo:hi, field_index]
+
+
+class RollupIndex:
+    # Incremental count/sum/sum-of-squares/min/max per field at minute, hour
+    # and day granularity. Window stats merge a few buckets per level and only
+    # touch raw rows for the partial minutes at the edges. Under a retention
+    # policy (retention.py) old minute and hour buckets are pruned; kept_from
+    # records where each of those levels starts being complete.
+
+    def __init__(self, fields=storage.FIELDS, offset_ms=0, path=None):
+        self.fields = tuple(fields)
+        # Bucket ids count UTC minutes/hours/days, so a clock change or a new
+        # time zone never moves a reading to another bucket; local days are
+        # made from hours where they are shown (timerange.py, digest.py).
+        # Indexes saved before this used one fixed local offset.
+        self.offset_ms = offset_ms
+        self.path = path
+        self.rows = 0
+        self.levels = {name: RollupLevel(width, len(self.fields)) for name, width in LEVELS}
+        self.kept_from = {"hour": None, "minute": None}  # Epoch ms, None = complete
+        self.index_path = path  # Saved index kept up to date by the ingest side
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            index = cls([str(field) for field in data["fields"]], int(data["offset_ms"]), path)
+            index.rows = int(data["rows"])
+            for name, width in LEVELS:
+                keys = data[f"{name}_keys"]
+                index.levels[name] = RollupLevel(width, len(index.fields), keys.copy(), data[f"{name}_stats"].copy())
+            for name in index.kept_from:
+                if f"{name}_from" in data.files:
+                    index.kept_from[name] = int(data[f"{name}_from"])
+        return index
+
+    def save(self, path=None):
+        path = path or self.path
+        arrays = {
+            "fields": np.array(self.fields),
+            "offset_ms": np.int64(self.offset_ms),
+            "rows": np.int64(self.rows),
+        }
+        for name, level in self.levels.items():
+            arrays[f"{name}_keys"] = level.keys
+            arrays[f"{name}_stats"] = level.stats
+        for name, kept_from in self.kept_from.items():
+            if kept_from is not None:
+                arrays[f"{name}_from"] = np.int64(kept_from)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as file:
+            np.savez(file, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        self._last_save = time.monotonic()
+
+    def update_columns(self, columns):
+        ts = columns[columnar.TIMESTAMP_COLUMN]
+        if len(ts) == 0:
+            return
+        stats = row_stats(columns, self.fields)
+        ids = (np.asarray(ts, dtype=np.int64) + self.offset_ms) // LEVELS[-1][1]
+
+        # Minute buckets from raw rows, then each coarser level from the one below it
+        finer_width = None
+        for name, width in reversed(LEVELS):
+            if finer_width is not None:
+                ids = ids // (width // finer_width)
+            ids, stats = reduce_groups(ids, stats)
+            self.levels[name].merge(ids, stats)
+            finer_width = width
+        self.rows += len(ts)
+
+    def catch_up(self, store, chunk=REBUILD_CHUNK):
+        # Fold in column-store rows the index has not seen yet. Rows compacted
+        # away before this copy of the index saw them cannot be replayed.
+        self.rows = max(self.rows, store.first_row)
+        total_rows = store.next_row
+        while self.rows < total_rows:
+            stop = min(self.rows + chunk, total_rows)
+            self.update_columns({name: store.arrays[name][store.position(self.rows):store.position(stop)]
+                                 for name in store.files})
+        return self.rows
+
+    def prune(self, name, before):
+        # Drop `name` buckets starting before `before` (epoch ms); stats that
+        # old are answered from the next coarser level from now on
+        level = self.levels[name]
+        dropped = level.drop_before(-(-(before + self.offset_ms) // level.width))
+        if self.kept_from[name] is None or before > self.kept_from[name]:
+            self.kept_from[name] = before
+        return dropped
+
+    def rebuild(self, store):
+        if store.first_row:
+            raise ValueError(f"rows before row {store.first_row} have been compacted into the rollups; a rebuild would lose them")
+        self.rows = 0
+        self.kept_from = {"hour": None, "minute": None}
+        self.levels = {name: RollupLevel(width, len(self.fields)) for name, width in LEVELS}
+        return self.catch_up(store)
+
+    def verify(self, store, rtol=1e-9):
+        # Compare every bucket against a fresh full scan; returns a list of problems
+        # Only buckets starting after the compacted part of the store can be checked
+        fresh = RollupIndex(self.fields, self.offset_ms)
+        fresh.catch_up(store)
+        problems = []
+        if fresh.rows != self.rows:
+            problems.append(f"index covers {self.rows} rows, store has {fresh.rows}")
+        for name, level in self.levels.items():
+            expected = fresh.levels[name]
+            first = -(-(store.raw_from + self.offset_ms) // level.width) if store.raw_from is not None else None
+            keys, stats = level.keys, level.stats
+            expected_keys, expected_stats = expected.keys, expected.stats
+            if first is not None:
+                keys, stats = keys[keys >= first], stats[keys >= first]
+                expected_keys, expected_stats = expected_keys[expected_keys >= first], expected_stats[expected_keys >= first]
+            if not np.array_equal(keys, expected_keys):
+                problems.append(f"{name}: bucket ids differ")
+                continue
+            mismatch = ~np.isclose(stats, expected_stats, rtol=rtol, equal_nan=True)
+            for bucket, field_index in sorted(set(zip(*np.nonzero(mismatch)[:2]))):
+                problems.append(f"{name} bucket {keys[bucket]}: {self.fields[field_index]} differs")
+        return problems
+
+    # Ingest sink interface, so the index can sit in a StorageGroup next to the stores
+
+    def append_many(self, records):
+        if records:
+            self.update_columns(columnar.records_to_columns(records, self.fields))
+        if self.path and time.monotonic() - self._last_save >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def sync(self):
+        pass  # Anything not yet saved is replayed from the column store on the next start
+
+    def close(self):
+        if self.path:
+            self.save()
+
+    def first_ts(self):
+        # Start of the oldest bucket at the finest level that reaches back to it
+        for name, width in reversed(LEVELS):
+            level = self.levels[name]
+            if level.size and self.kept_from.get(name) is None:
+                return int(level.keys[0]) * width - self.offset_ms
+        return None
+
+    def end_ts(self):
+        # End of the newest bucket at the finest level holding any
+        for name, width in reversed(LEVELS):
+            level = self.levels[name]
+            if level.size:
+                return (int(level.keys[-1]) + 1) * width - self.offset_ms
+        return None
+
+    def stats(self, field, start=None, end=None, source=None):
+        # Stats for start <= ts < end (epoch ms, None = unbounded). With a
+        # `source` time index the partial minutes at the edges are scanned
+        # exactly; without one they are taken from whole minute buckets. Edges
+        # older than what a finer tier still holds (raw rows before the store's
+        # raw_from, pruned minutes or hours) are rounded out to whole buckets
+        # of the level above it.
+        field_index = self.fields.index(field)
+        if self.levels["day"].size == 0:
+            return None
+        if start is None and end is None:
+            return summarize(total(self.levels["day"].stats[:, field_index]))
+
+        if start is None:
+            start = self.first_ts()
+        if end is None:
+            end = self.end_ts()
+
+        # Where the tier below each level stops being complete
+        raw_from = source.store.raw_from if source is not None else np.inf
+        finer_from = {"day": self.kept_from["hour"], "hour": self.kept_from["minute"], "minute": raw_from}
+
+        blocks = []
+        spans = [(start, end)]
+        for name, width in LEVELS:
+            remaining = []
+            for span_start, span_end in spans:
+                first = -(-(span_start + self.offset_ms) // width)
+                last = (span_end + self.offset_ms) // width
+                if first < last:
+                    blocks.append(self.levels[name].block(first, last, field_index))
+                    remaining.append((span_start, first * width - self.offset_ms))
+                    remaining.append((last * width - self.offset_ms, span_end))
+                else:
+                    remaining.append((span_start, span_end))
+
+            spans = []
+            cutoff = finer_from[name]
+            for span_start, span_end in remaining:
+                if span_start >= span_end:
+                    continue
+                if cutoff is not None and span_start < cutoff:
+                    outer_end = min(span_end, cutoff)
+                    first = (span_start + self.offset_ms) // width
+                    last = -(-(outer_end + self.offset_ms) // width)
+                    blocks.append(self.levels[name].block(first, last, field_index))
+                    span_start = outer_end
+                if span_start < span_end:
+                    spans.append((span_start, span_end))
+
+        for span_start, span_end in spans:
+            blocks.append(scan_stats(source, field, span_start, span_end)[None, :])
+
+        return summarize(total(np.concatenate(blocks)))
+
+    def points(self, fields, start, end, raw_from):
+        # Bucket midpoints (epoch ms) and per-field means for start <= ts <
+        # min(end, raw_from), each part from the finest level still kept for
+        # it; this stands in for raw readings that have been compacted away
+        times, means = [], {field: [] for field in fields}
+        lo = start
+        for (name, width), cutoff in zip(LEVELS, (self.kept_from["hour"], self.kept_from["minute"], raw_from)):
+            if cutoff is None:
+                continue  # The finer tier still reaches back to the start
+            hi = cutoff if end is None else min(end, cutoff)
+            if lo is None or lo < hi:
+                level = self.levels[name]
+                first = 0 if lo is None else np.searchsorted(level.keys, (lo + self.offset_ms) // width)
+                last = np.searchsorted(level.keys, -(-(hi + self.offset_ms) // width))
+                times.append(level.keys[first:last] * width - self.offset_ms + width // 2)
+                for field in fields:
+                    stats = level.stats[first:last, self.fields.index(field)]
+                    means[field].append(np.divide(stats[:, SUM], stats[:, COUNT], out=np.full(len(stats), np.nan),
+                                                  where=stats[:, COUNT] > 0))
+            lo = cutoff if lo is None else max(lo, cutoff)
+        if not times:
+            return np.empty(0, dtype=np.int64), {field: np.empty(0) for field in fields}
+        return np.concatenate(times), {field: np.concatenate(values) for field, values in means.items()}
+
+    def mean(self, field, start=None, end=None, source=None):
+        stats = self.stats(field, start, end, source)
+        return stats["mean"] if stats else None
+
+
+def scan_stats(source, field, start, end):
+    # Raw stats vector for start <= ts < end; `source` is a timerange.TimeIndex
+    rows = source.range_rows(start, end)
+    store = source.store
+    values = store.values(field)[rows][store.valid(field)[rows]].astype(np.float64)
+    out = np.zeros(STAT_COUNT)
+    out[COUNT] = len(values)
+    out[SUM] = values.sum()
+    out[SUMSQ] = np.dot(values, values)
+    out[MIN] = values.min() if len(values) else np.inf
+    out[MAX] = values.max() if len(values) else -np.inf
+    return out
+
+
+def open_index(store, path=ROLLUP_PATH, save=True):
+    # Load the saved index and replay rows added since, or rebuild it from the
+    # column store when it is missing or does not match the store
+    index = None
+    if path and os.path.exists(path):
+        try:
+            index = RollupIndex.load(path)
+        except (OSError, ValueError, KeyError):
+            index = None
+        if index is not None and (index.fields != tuple(store.fields) or index.rows > store.next_row):
+            index = None
+        elif index is not None and index.offset_ms and store.first_row == 0:
+            index = None  # Local-time buckets from an older version; rebuilt in UTC
+    if index is None:
+        index = RollupIndex(store.fields)
+    index.path = path if save else None
+    index.index_path = path
+    index.catch_up(store)
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild or verify the rollup index")
+    parser.add_argument("--columns", default=columnar.COLUMN_DIR)
+    parser.add_argument("--index", default=ROLLUP_PATH)
+    parser.add_argument("--rebuild", action="store_true", help="recompute every bucket from the column store")
+    parser.add_argument("--verify", action="store_true", help="compare the index against a full scan")
+    args = parser.parse_args()
+
+    store = columnar.ColumnStore(args.columns, readonly=True)
+    index = open_index(store, args.index, save=False)
+    if args.rebuild:
+        started = time.perf_counter()
+        try:
+            index.rebuild(store)
+        except ValueError as e:
+            parser.error(str(e))
+        index.save(args.index)
+        print(f"Rebuilt {index.rows} rows in {time.perf_counter() - started:.2f}s")
+    if args.verify:
+        problems = index.verify(store)
+        for problem in problems:
+            print("Mismatch:", problem)
+        print("Index OK" if not problems else f"{len(problems)} mismatches")
@@ -0,0 +1,410 @@
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import columnar
+import frames
+import storage
+
+# Authenticated telemetry frame, little-endian, 37 bytes:
+#   sync 0xA5 0x5A | version | node id | session id (u32) | sequence (u32) |
+#   encrypted payload (flags and readings, laid out as in frames.py) | 16-byte tag
+# The header is authenticated but sent in the clear. The session id is a boot
+# counter the device keeps in flash and increments on every boot; the session
+# key is derived from the shared link key, node and session, and the nonce is
+# (node, session, sequence), so a nonce is never reused under one key as long
+# as neither counter goes back or wraps.
+VERSION_HMAC = 2  # HMAC-SHA256 keystream + HMAC-SHA256 tag (standard library only)
+VERSION_AEAD = 3  # ChaCha20-Poly1305 (needs the "cryptography" package)
+MODES = {"hmac": VERSION_HMAC, "aead": VERSION_AEAD}
+
+HEADER_SIZE = 12
+PAYLOAD_SIZE = 9
+TAG_SIZE = 16
+SECURE_DTYPE = np.dtype([
+    ("sync", "<u2"),
+    ("version", "u1"),
+    ("node", "u1"),
+    ("session", "<u4"),
+    ("seq", "<u4"),
+    ("flags", "u1"),
+    ("temperature", "<i2"),
+    ("humidity", "<u2"),
+    ("air_quality", "<u2"),
+    ("light_intensity", "<u2"),
+    ("tag", "V16"),
+])
+SECURE_FRAME_SIZE = SECURE_DTYPE.itemsize
+PAYLOAD_END = HEADER_SIZE + PAYLOAD_SIZE
+
+KEY_PATH = "link.key"  # 32 random bytes as hex, shared with the firmware
+KEY_CONTEXT = b"sat-payload link v1"
+
+REPLAY_WINDOW = 64  # Frames up to this far behind the newest one may still arrive (reordered)
+POOL_MIN_ROWS = 2048  # Smaller reads are verified inline; the pool only pays off for bursts
+MAX_CIPHERS = 1024  # Session ciphers cached per process
+
+# Newest (session, sequence) accepted per node, kept next to the column store
+# so a restarted ground station still rejects earlier sessions and frames
+REPLAY_STATE_PATH = os.path.join(columnar.COLUMN_DIR, "replay_state.json")
+REPLAY_SAVE_INTERVAL = 1.0  # Seconds between saves within a session; a new session is saved at once
+
+
+def new_key():
+    return secrets.token_bytes(32)
+
+
+def load_key(path=KEY_PATH):
+    with open(path, "r") as file:
+        key = bytes.fromhex(file.read().strip())
+    if len(key) < 16:
+        raise ValueError(f"Link key in {path} is too short")
+    return key
+
+
+def session_key(key, node, session):
+    return hmac.digest(key, KEY_CONTEXT + struct.pack("<BI", node, session), "sha256")
+
+
+# Per-process cache of cipher state per (link key, mode, node, session)
+_sessions = {}
+
+
+def hmac_state(key):
+    # SHA-256 states with the HMAC inner and outer pads already hashed, so each
+    # message costs two short hashes instead of a full hmac.digest() setup
+    key = key.ljust(64, b"\0")
+    return (hashlib.sha256(bytes(byte ^ 0x36 for byte in key)),
+            hashlib.sha256(bytes(byte ^ 0x5C for byte in key)))
+
+
+def hmac_sha256(state, message):
+    inner, outer = state[0].copy(), state[1].copy()
+    inner.update(message)
+    outer.update(inner.digest())
+    return outer.digest()
+
+
+def xor(data, stream):
+    size = len(data)
+    return (int.from_bytes(data, "little") ^ int.from_bytes(stream[:size], "little")).to_bytes(size, "little")
+
+
+def session_cipher(key, version, node, session):
+    cached = _sessions.get((key, version, node, session))
+    if cached is None:
+        secret = session_key(key, node, session)
+        if version == VERSION_AEAD:
+            from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+            cached = ChaCha20Poly1305(secret)
+        else:
+            cached = (hmac_state(hmac.digest(secret, b"encrypt", "sha256")),
+                      hmac_state(hmac.digest(secret, b"authenticate", "sha256")))
+        if len(_sessions) > MAX_CIPHERS:
+            _sessions.clear()
+        _sessions[(key, version, node, session)] = cached
+    return cached
+
+
+def nonce(header):
+    return header[3:HEADER_SIZE] + b"\0\0\0"
+
+
+def seal(key, version, header, payload):
+    # Encrypted payload + tag for one frame
+    cipher = session_cipher(key, version, header[3], int.from_bytes(header[4:8], "little"))
+    if version == VERSION_AEAD:
+        return cipher.encrypt(nonce(header), payload, header)
+    encrypt_state, mac_state = cipher
+    body = xor(payload, hmac_sha256(encrypt_state, nonce(header)))
+    return body + hmac_sha256(mac_state, header + body)[:TAG_SIZE]
+
+
+def open_frames(key, version, rows):
+    # Verifies and decrypts frames (bytes, SECURE_FRAME_SIZE each, header
+    # already checked). Returns (ok flags, frames with the payload decrypted);
+    # module-level so it can run in a worker process.
+    out = bytearray(rows)
+    ok = bytearray(len(rows) // SECURE_FRAME_SIZE)
+    ciphers = {}
+    for i in range(len(ok)):
+        start = i * SECURE_FRAME_SIZE
+        header = rows[start:start + HEADER_SIZE]
+        sealed = rows[start + HEADER_SIZE:start + SECURE_FRAME_SIZE]
+        cipher = ciphers.get(header[3:8])
+        if cipher is None:
+            cipher = ciphers[header[3:8]] = session_cipher(key, version, header[3], int.from_bytes(header[4:8], "little"))
+        if version == VERSION_AEAD:
+            try:
+                payload = cipher.decrypt(nonce(header), sealed, header)
+            except Exception:
+                continue
+        else:
+            encrypt_state, mac_state = cipher
+            body = sealed[:PAYLOAD_SIZE]
+            if not hmac.compare_digest(hmac_sha256(mac_state, header + body)[:TAG_SIZE], sealed[PAYLOAD_SIZE:]):
+                continue
+            payload = xor(body, hmac_sha256(encrypt_state, nonce(header)))
+        out[start + HEADER_SIZE:start + PAYLOAD_END] = payload
+        ok[i] = 1
+    return bytes(ok), bytes(out)
+
+
+_last_session = 0
+
+
+def next_session():
+    # Boot counter for encoders without one of their own: the time in
+    # seconds, kept increasing within this process
+    global _last_session
+    _last_session = max(int(time.time()), _last_session + 1)
+    return _last_session
+
+
+class SecureEncoder:
+    # Reference encoder, matching the firmware in demo/demo.ino with
+    # USE_SECURE_FRAMES. A new encoder is a new session (a device boot);
+    # `session` is the boot counter and must be higher than the last one.
+
+    def __init__(self, key, node=0, mode="hmac", session=None):
+        self.key = key
+        self.node = node
+        self.version = MODES[mode]
+        self.session = next_session() if session is None else session
+        self.seq = 0
+
+    def encode(self, record):
+        # The payload is the body of a plain frame: flags and fixed-point readings
+        payload = frames.encode_frame(record, 0, self.node)[6:6 + PAYLOAD_SIZE]
+        header = frames.SYNC + struct.pack("<BBII", self.version, self.node, self.session, self.seq)
+        self.seq += 1
+        if self.seq > 0xFFFFFFFF:
+            raise OverflowError("Sequence counter exhausted; start a new session")
+        return header + seal(self.key, self.version, header, payload)
+
+
+class ReplayWindow:
+    # Sliding window over sequence numbers for one node, as in IPsec: the
+    # newest sequence seen plus a bitmap of the REPLAY_WINDOW before it.
+    # A frame is accepted once; late frames inside the window are counted as
+    # reordered, anything older is rejected. Session ids are boot counters, so
+    # only a higher one starts a new session; frames of any lower session,
+    # seen before or not, are replays and never displace the current one.
+    # A window restored from saved state treats the REPLAY_WINDOW frames up
+    # to `highest` as seen, since which of them arrived was not saved.
+
+    def __init__(self, session=None, highest=-1):
+        self.session = session
+        self.highest = highest
+        self.bitmap = 0 if session is None else (1 << REPLAY_WINDOW) - 1
+
+    def check(self, sessions, seqs, stats):
+        # Boolean mask of frames to accept (tags already verified), in arrival order
+        if (self.session is not None and (sessions == self.session).all() and seqs[0] > self.highest
+                and (len(seqs) == 1 or (np.diff(seqs) > 0).all())):
+            # In-order batch from the current session: everything is new
+            newest = int(seqs[-1])
+            behind = newest - seqs[-REPLAY_WINDOW:].astype(np.int64)
+            self.bitmap = (self.bitmap << (newest - self.highest)) & ((1 << REPLAY_WINDOW) - 1)
+            for offset in behind.tolist():
+                self.bitmap |= 1 << offset
+            stats["lost"] += newest - self.highest - len(seqs)
+            self.highest = newest
+            return np.ones(len(seqs), dtype=bool)
+
+        accept = np.zeros(len(seqs), dtype=bool)
+        for i, (session, seq) in enumerate(zip(sessions.tolist(), seqs.tolist())):
+            if session != self.session:
+                if self.session is not None and session < self.session:
+                    stats["replayed"] += 1  # Frame from an earlier boot
+                    continue
+                if self.session is not None:
+                    stats["restarts"] += 1
+                self.session, self.highest, self.bitmap = session, seq - 1, 0
+            if seq > self.highest:
+                shift = seq - self.highest
+                self.bitmap = ((self.bitmap << shift) | 1) & ((1 << REPLAY_WINDOW) - 1)
+                stats["lost"] += shift - 1
+                self.highest = seq
+            elif self.highest - seq >= REPLAY_WINDOW:
+                stats["too_old"] += 1
+                continue
+            elif self.bitmap >> (self.highest - seq) & 1:
+                stats["replayed"] += 1
+                continue
+            else:
+                self.bitmap |= 1 << (self.highest - seq)
+                stats["reordered"] += 1
+                stats["lost"] -= 1  # Counted as lost when the gap opened
+            accept[i] = True
+        return accept
+
+
+class SecureFrameDecoder(frames.FrameDecoder):
+    # FrameDecoder for an authenticated link: only frames with a valid tag are
+    # accepted. JSON lines and plain CRC frames are counted and dropped, since
+    # anything could have sent them. Tags are checked for a whole read at once,
+    # split across a process pool when the read is large enough. With a
+    # `state_path` the replay windows outlive a restart of the ground station.
+
+    frame_size = SECURE_FRAME_SIZE
+
+    def __init__(self, key, mode="hmac", workers=None, pool=None, state_path=None):
+        super().__init__()
+        self.key = key
+        self.version = MODES[mode]
+        if self.version == VERSION_AEAD:
+            session_cipher(key, self.version, 0, 0)  # Fail now if "cryptography" is missing
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.pool = pool  # May be shared by several decoders; only one made here is shut down
+        self.own_pool = False
+        self.windows = {}
+        self.counts = {"lost": 0, "replayed": 0, "reordered": 0, "too_old": 0, "restarts": 0}
+        self.state_path = state_path
+        self.saved_at = time.monotonic()
+        if state_path and os.path.exists(state_path):
+            for node, (session, highest) in self.load_state().items():
+                self.windows[node] = ReplayWindow(session, highest)
+
+    def load_state(self):
+        # {node: (session, highest sequence)}; an unreadable file is an error,
+        # since starting from nothing would accept every earlier session again
+        with open(self.state_path, "r") as file:
+            return {int(node): tuple(saved) for node, saved in json.load(file).items()}
+
+    def save_state(self):
+        # Several decoders may share the file (one per source in ingest_daemon.py),
+        # so nodes this one has not seen are kept and the newest entry wins
+        saved = self.load_state() if os.path.exists(self.state_path) else {}
+        for node, window in self.windows.items():
+            if window.session is not None:
+                saved[node] = max(saved.get(node, (-1, -1)), (window.session, window.highest))
+        storage.write_json_atomic(self.state_path, {str(node): list(entry) for node, entry in saved.items()})
+        self.saved_at = time.monotonic()
+
+    def feed(self, chunk):
+        # Text lines are counted by the base decoder and not passed on
+        return super().feed(chunk)[0], []
+
+    def check(self, raw):
+        count = len(raw)
+        ok = (raw[:, 0] == frames.SYNC[0]) & (raw[:, 1] == frames.SYNC[1]) & (raw[:, 2] == self.version)
+        out = np.ascontiguousarray(raw).copy()
+        candidates = np.flatnonzero(ok)
+        if len(candidates):
+            rows = out[candidates] if len(candidates) < count else out
+            verified, opened = self.verify(rows.tobytes())
+            ok[candidates] = np.frombuffer(verified, dtype=np.uint8).astype(bool)
+            out[candidates] = np.frombuffer(opened, dtype=np.uint8).reshape(-1, SECURE_FRAME_SIZE)
+        return ok, out.reshape(-1).view(SECURE_DTYPE)
+
+    def verify(self, rows):
+        count = len(rows) // SECURE_FRAME_SIZE
+        if self.workers <= 1 or count < POOL_MIN_ROWS:
+            return open_frames(self.key, self.version, rows)
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers)
+            self.own_pool = True
+        step = -(-count // self.workers) * SECURE_FRAME_SIZE
+        parts = [rows[start:start + step] for start in range(0, len(rows), step)]
+        results = list(self.pool.map(open_frames, [self.key] * len(parts), [self.version] * len(parts), parts))
+        return b"".join(ok for ok, _ in results), b"".join(opened for _, opened in results)
+
+    def check_sequence(self, frames):
+        # Replay and reordering checks per node, on authenticated frames only
+        keep = np.ones(len(frames), dtype=bool)
+        nodes = frames["node"]
+        single = bool((nodes == nodes[0]).all())
+        new_session = False
+        for node in [int(nodes[0])] if single else np.unique(nodes).tolist():
+            index = np.arange(len(frames)) if single else np.flatnonzero(nodes == node)
+            window = self.windows.setdefault(node, ReplayWindow())
+            session = window.session
+            keep[index] = window.check(frames["session"][index], frames["seq"][index].astype(np.int64), self.counts)
+            new_session |= window.session != session
+        self.lost = self.counts["lost"]
+        self.duplicates = self.counts["replayed"]
+        self.restarts = self.counts["restarts"]
+        if self.state_path and keep.any() and (new_session or time.monotonic() - self.saved_at >= REPLAY_SAVE_INTERVAL):
+            self.save_state()
+        return frames[keep]
+
+    @property
+    def rejected(self):
+        # Frames and lines dropped as unauthenticated, replayed or too old
+        return self.crc_errors + self.lines + self.counts["replayed"] + self.counts["too_old"]
+
+    def close(self):
+        if self.state_path and self.windows:
+            self.save_state()
+        if self.own_pool:
+            self.pool.shutdown()
+        self.pool = None
+        self.own_pool = False
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "auth_errors": self.crc_errors,
+            "rejected_lines": self.lines,
+            "skipped_bytes": self.skipped_bytes,
+            "lost_frames": self.lost,
+            "replayed": self.counts["replayed"],
+            "reordered": self.counts["reordered"],
+            "too_old": self.counts["too_old"],
+            "restarts": self.restarts,
+        }
+
+
+def open_decoder(path=KEY_PATH, mode="hmac", workers=None, pool=None, state_path=REPLAY_STATE_PATH):
+    return SecureFrameDecoder(load_key(path), mode, workers, pool, state_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Create a link key or benchmark frame verification")
+    parser.add_argument("--new-key", metavar="PATH", help="write a new random link key and exit")
+    parser.add_argument("--mode", default="hmac", choices=sorted(MODES))
+    parser.add_argument("--frames", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=65536, help="bytes per serial read")
+    args = parser.parse_args()
+
+    if args.new_key:
+        with open(args.new_key, "x") as file:
+            file.write(new_key().hex() + "\n")
+        print(f"Wrote {args.new_key}; put the same bytes in LINK_KEY in demo/demo.ino")
+        raise SystemExit
+
+    key = new_key()
+    rng = np.random.default_rng(0)
+    encoder = SecureEncoder(key, node=1, mode=args.mode)
+    started = time.perf_counter()
+    stream = b"".join(encoder.encode({field: float(value) for field, value in zip(storage.FIELDS, row)})
+                      for row in rng.uniform(0, 100, (args.frames, len(storage.FIELDS))))
+    print(f"Encoded {args.frames:,} {args.mode} frames ({SECURE_FRAME_SIZE} bytes each) "
+          f"at {args.frames / (time.perf_counter() - started):,.0f} frames/s")
+
+    cores = os.cpu_count() or 1
+    for workers in sorted({1, cores}):
+        decoder = SecureFrameDecoder(key, args.mode, workers)
+        if workers > 1:
+            decoder.verify(stream[:POOL_MIN_ROWS * SECURE_FRAME_SIZE])  # Start the pool outside the timing
+        started = time.perf_counter()
+        verified = 0
+        for start in range(0, len(stream), args.chunk):
+            verified += len(decoder.feed(stream[start:start + args.chunk])[0])
+        seconds = time.perf_counter() - started
+        decoder.close()
+        print(f"{workers} worker{'s' if workers > 1 else ''}: {verified / seconds:,.0f} verified frames/s "
+              f"({verified:,} of {args.frames:,} accepted)")
+    if cores == 1:
+        print("Only one core available; the pool is not used")
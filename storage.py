@@ -0,0 +1,316 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+# Sensor fields stored with every reading
+FIELDS = ("temperature", "humidity", "air_quality", "light_intensity")
+
+# Default locations of the append-only store and the legacy TinyDB document
+STORE_DIR = "sensor_store"
+LEGACY_JSON_PATH = "sensor_data.json"
+
+MANIFEST_NAME = "manifest.json"
+SEGMENT_MAX_RECORDS = 100000  # Readings per segment file before rolling to a new one
+
+
+def segment_name(index):
+    return f"segment-{index:06d}.jsonl"
+
+
+def segment_number(name):
+    return int(name[len("segment-"):-len(".jsonl")])
+
+
+def encode_record(record):
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def write_json_atomic(path, obj):
+    # Write to a temp file, fsync it, then rename over the target so readers
+    # only ever see the old or the new version, never a half-written file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(obj, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def scan_segment(path):
+    # Returns (records, good_offset). Stops at the first incomplete or corrupt
+    # line, which is what a crash in the middle of a write leaves behind.
+    records = []
+    offset = 0
+    try:
+        with open(path, "rb") as file:
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                offset += len(line)
+    except FileNotFoundError:
+        pass
+    return records, offset
+
+
+def record_to_date_time(record):
+    now = datetime.fromtimestamp(record["ts"])
+    return now.strftime("%Y-%m-%d"), now.strftime("%H:%M:%S")
+
+
+def legacy_view(records):
+    # Present readings as the old TinyDB document: {"_default": {"1": {date: {time: {...}}}}}
+    days = {}
+    for record in records:
+        date_str, time_str = record_to_date_time(record)
+        days.setdefault(date_str, {})[time_str] = {
+            field: record[field] for field in FIELDS if field in record
+        }
+    return {"_default": {"1": days}}
+
+
+def iter_legacy_records(data):
+    # Flatten the old nested document back into timestamped readings
+    days = data.get("_default", {}).get("1", {})
+    for date_str in sorted(days):
+        for time_str in sorted(days[date_str]):
+            values = days[date_str][time_str]
+            ts = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M:%S").timestamp()
+            record = {"ts": ts}
+            record.update((field, values[field]) for field in FIELDS if field in values)
+            yield record
+
+
+class SegmentStorage:
+    # Append-only store: one JSON line per reading in rolling segment files.
+    # Appending never touches existing data, so the cost per reading stays
+    # constant however much history has been collected.
+
+    def __init__(self, path=STORE_DIR, max_records=SEGMENT_MAX_RECORDS, readonly=False):
+        self.path = path
+        self.max_records = max_records
+        self.readonly = readonly
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+        self._file = None
+
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+        self.manifest = self.load_manifest()
+
+        if not readonly:
+            self.recover_active_segment()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            if self.readonly:
+                raise
+            manifest = {"version": 1, "segments": [], "active": segment_name(1)}
+            write_json_atomic(self.manifest_path, manifest)
+            return manifest
+
+    def recover_active_segment(self):
+        active_path = os.path.join(self.path, self.manifest["active"])
+        records, offset = scan_segment(active_path)
+
+        # Drop a torn tail left by a crash mid-write
+        if os.path.exists(active_path) and os.path.getsize(active_path) != offset:
+            with open(active_path, "r+b") as file:
+                file.truncate(offset)
+
+        self.active_records = len(records)
+        self.active_first_ts = records[0]["ts"] if records else None
+        self.active_last_ts = records[-1]["ts"] if records else None
+        self._file = open(active_path, "ab")
+
+    def __len__(self):
+        sealed = sum(segment["records"] for segment in self.manifest["segments"])
+        if self.readonly:
+            return sealed + len(scan_segment(os.path.join(self.path, self.manifest["active"]))[0])
+        return sealed + self.active_records
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        for record in records:
+            if self.active_records >= self.max_records:
+                self.roll_segment()
+            self._file.write(encode_record(record))
+            if self.active_first_ts is None:
+                self.active_first_ts = record["ts"]
+            self.active_last_ts = record["ts"]
+            self.active_records += 1
+        self._file.flush()
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def roll_segment(self):
+        # Seal the active segment in the manifest and start a new one
+        self.sync()
+        self._file.close()
+
+        self.manifest["segments"].append({
+            "name": self.manifest["active"],
+            "records": self.active_records,
+            "first_ts": self.active_first_ts,
+            "last_ts": self.active_last_ts,
+        })
+        self.manifest["active"] = segment_name(segment_number(self.manifest["active"]) + 1)
+        write_json_atomic(self.manifest_path, self.manifest)
+
+        self.active_records = 0
+        self.active_first_ts = None
+        self.active_last_ts = None
+        self._file = open(os.path.join(self.path, self.manifest["active"]), "ab")
+
+    def prune(self, before_ts):
+        # Drop sealed segments whose newest reading is older than before_ts
+        # (epoch seconds). The manifest is switched first, so a crash can only
+        # leave unreferenced files behind. Returns the number of readings dropped.
+        old = [segment for segment in self.manifest["segments"]
+               if segment["last_ts"] is not None and segment["last_ts"] < before_ts]
+        if not old:
+            return 0
+        self.manifest["segments"] = [segment for segment in self.manifest["segments"] if segment not in old]
+        write_json_atomic(self.manifest_path, self.manifest)
+        for segment in old:
+            try:
+                os.remove(os.path.join(self.path, segment["name"]))
+            except FileNotFoundError:
+                pass
+        return sum(segment["records"] for segment in old)
+
+    def disk_bytes(self):
+        names = [segment["name"] for segment in self.manifest["segments"]] + [self.manifest["active"]]
+        return sum(os.path.getsize(os.path.join(self.path, name)) for name in names
+                   if os.path.exists(os.path.join(self.path, name)))
+
+    def records(self):
+        names = [segment["name"] for segment in self.manifest["segments"]]
+        names.append(self.manifest["active"])
+        for name in names:
+            records, _ = scan_segment(os.path.join(self.path, name))
+            yield from records
+
+    def import_legacy(self, legacy_path=LEGACY_JSON_PATH):
+        # One-off migration of the old single-document file into the store
+        with open(legacy_path, "r") as file:
+            data = json.load(file)
+        records = list(iter_legacy_records(data))
+        self.append_many(records)
+        self.sync()
+        return len(records)
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+
+class TinyDBStorage:
+    # The original backend: one nested document rewritten on every reading.
+    # Kept for setups that still consume sensor_data.json directly.
+
+    def __init__(self, path=LEGACY_JSON_PATH):
+        from tinydb import TinyDB
+
+        self.db = TinyDB(path)
+
+    def __len__(self):
+        return sum(1 for _ in self.records())
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        db_data = self.db.all()
+        data = {"_default": {"1": db_data[0] if db_data else {}}}
+        days = data["_default"]["1"]
+        for record in records:
+            date_str, time_str = record_to_date_time(record)
+            days.setdefault(date_str, {})[time_str] = {field: record.get(field) for field in FIELDS}
+
+        self.db.truncate()
+        self.db.insert(days)
+
+    def sync(self):
+        pass
+
+    def records(self):
+        db_data = self.db.all()
+        return iter_legacy_records({"_default": {"1": db_data[0] if db_data else {}}})
+
+    def close(self):
+        self.db.close()
+
+
+class StorageGroup:
+    # Fans every batch out to several backends, e.g. segments plus columns.
+    # `lock` is held per batch, so background work such as compaction
+    # (retention.py) can briefly keep the writer out while it switches files.
+
+    def __init__(self, *backends):
+        self.backends = backends
+        self.lock = threading.Lock()
+        self.compactor = None
+
+    def __len__(self):
+        return len(self.backends[0])
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        with self.lock:
+            for backend in self.backends:
+                backend.append_many(records)
+
+    def sync(self):
+        with self.lock:
+            for backend in self.backends:
+                backend.sync()
+
+    def close(self):
+        if self.compactor is not None:
+            self.compactor.stop()
+        with self.lock:
+            for backend in self.backends:
+                backend.close()
+
+
+BACKENDS = {
+    "segments": SegmentStorage,
+    "tinydb": TinyDBStorage,
+}
+
+
+def open_storage(backend="segments", path=None, **kwargs):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    if path is None:
+        return BACKENDS[backend](**kwargs)
+    return BACKENDS[backend](path, **kwargs)
+
+
+def load_legacy_view(store_dir=STORE_DIR, legacy_path=LEGACY_JSON_PATH, column_dir=None):
+    # Compatibility reader for the chatbots. The column store is the one copy
+    # of every reading (bulk imports go only there); without one, the segment
+    # store, then the old sensor_data.json when no store has been created yet
+    import columnar  # columnar imports this module
+    column_dir = columnar.COLUMN_DIR if column_dir is None else column_dir
+    if os.path.exists(os.path.join(column_dir, columnar.META_NAME)):
+        return legacy_view(columnar.ColumnStore(column_dir, readonly=True).records())
+    if os.path.exists(os.path.join(store_dir, MANIFEST_NAME)):
+        return legacy_view(SegmentStorage(store_dir, readonly=True).records())
+    with open(legacy_path, "r") as file:
+        return json.load(file)
@@ -0,0 +1,140 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from digest import estimate_tokens
+
+# Local stand-in for the LLM endpoints so the chatbots can run offline:
+#   POST /v1/ask                      Gemini-style {"query": ...} -> {"response": ...}
+#                                     (NDJSON chunks when the request has "stream": true)
+#   POST /openai/v1/chat/completions  OpenAI/Groq-style chat completions (SSE when streaming)
+#   GET  /stats                       Number of requests served (to check the response cache), and the
+#                                     size and text of the prompts received (to check the data digest)
+#
+#   GEMINI_API_URL=http://127.0.0.1:8765/v1/ask python chatbot.py
+#   GROK_API_BASE=http://127.0.0.1:8765 python test.py
+
+DEFAULT_PORT = 8765
+
+
+def stub_answer(prompt, prompt_tokens):
+    return f"Stub answer ({prompt_tokens} prompt tokens) to: {prompt.strip()}"
+
+
+def split_tokens(text):
+    words = text.split(" ")
+    return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, content_type, lines):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for line in lines:
+            data = line.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def record_prompt(self, text):
+        # Estimated the same way as the digest budget (digest.py)
+        tokens = estimate_tokens(text)
+        with self.server.lock:
+            self.server.prompts.update(last=tokens, max=max(tokens, self.server.prompts["max"]),
+                                       total=self.server.prompts["total"] + tokens)
+            self.server.last_prompt = text
+        return tokens
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server.lock:
+                stats = {"requests": self.server.requests, "prompt_tokens": dict(self.server.prompts),
+                         "last_prompt": self.server.last_prompt}
+            self.send_body(200, "application/json", json.dumps(stats, ensure_ascii=False).encode("utf-8"))
+        else:
+            self.send_body(404, "text/plain", b"Not found")
+
+    def do_POST(self):
+        with self.server.lock:
+            self.server.requests += 1
+        payload = self.read_json()
+
+        if self.path == "/v1/ask":
+            tokens = self.record_prompt(f"{payload.get('context', '')}\n{payload.get('query', '')}")
+            answer = stub_answer(payload.get("query", ""), tokens)
+            if payload.get("stream"):
+                self.send_stream("application/x-ndjson", (json.dumps({"response": token}) + "\n" for token in split_tokens(answer)))
+            else:
+                self.send_body(200, "application/json", json.dumps({"response": answer}).encode("utf-8"))
+
+        elif self.path.endswith("/chat/completions"):
+            messages = payload.get("messages", [])
+            tokens = self.record_prompt("\n".join(message.get("content", "") for message in messages))
+            answer = stub_answer(messages[-1]["content"] if messages else "", tokens)
+            model = payload.get("model", "stub")
+            if payload.get("stream"):
+                events = []
+                for token in split_tokens(answer):
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                             "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}]}
+                    events.append(f"data: {json.dumps(chunk)}\n\n")
+                done = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                events.append(f"data: {json.dumps(done)}\n\n")
+                events.append("data: [DONE]\n\n")
+                self.send_stream("text/event-stream", events)
+            else:
+                body = {"id": "stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": tokens, "completion_tokens": len(split_tokens(answer)),
+                                  "total_tokens": tokens + len(split_tokens(answer))}}
+                self.send_body(200, "application/json", json.dumps(body).encode("utf-8"))
+        else:
+            self.send_body(404, "text/plain", b"Not found")
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, token_delay=0.02):
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.token_delay = token_delay
+    server.requests = 0
+    server.prompts = {"last": 0, "max": 0, "total": 0}
+    server.last_prompt = ""
+    server.lock = threading.Lock()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub LLM server for running the chatbots offline")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.token_delay)
+    print(f"Stub LLM server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,43 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+# The modules live at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import columnar
+import stub_llm_server
+
+
+@pytest.fixture
+def stub_server():
+    # stub_llm_server.py on a free port, without the per-token delay; the base
+    # URL is at server.url
+    server = stub_llm_server.make_server(port=0, token_delay=0)
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+
+@pytest.fixture
+def local_zone(monkeypatch):
+    # Call with a zone name (e.g. "Europe/Berlin") to run in that local time zone
+    if not hasattr(time, "tzset"):
+        pytest.skip("time zones cannot be switched on this platform")
+
+    def use(name):
+        monkeypatch.setenv("TZ", name)
+        time.tzset()
+        columnar.offset_at.cache_clear()
+
+    yield use
+    monkeypatch.undo()
+    time.tzset()
+    columnar.offset_at.cache_clear()
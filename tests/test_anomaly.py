@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import anomaly
+import bench
+import columnar
+import pipeline
+
+ANOMALY_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "anomaly.py")
+
+
+def backfill(directory):
+    return subprocess.run([sys.executable, ANOMALY_SCRIPT, "--backfill", "--last", "0"], cwd=directory,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_backfill_refuses_while_ingest_writes_the_store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    group = pipeline.open_store_group(log=lambda message: None)
+    ts, values = bench.simulate_readings(2000, rng=np.random.default_rng(0))
+    values["temperature"][1500] += 40  # One spike for the detector to find
+    group.append_many([{"ts": t / 1000, **{field: float(column[i]) for field, column in values.items()}}
+                       for i, t in enumerate(ts.tolist())])
+    group.sync()
+    found = len(group.backends[3].log)
+    assert found >= 1
+
+    refused = backfill(tmp_path)
+    assert refused.returncode != 0
+    assert "being written by another process" in refused.stderr
+    assert len(anomaly.AnomalyLog(anomaly.EVENTS_PATH, readonly=True)) == found
+
+    group.close()
+    done = backfill(tmp_path)
+    assert done.returncode == 0, done.stderr
+    assert "Checked 2000 rows" in done.stdout
+    assert len(anomaly.AnomalyLog(anomaly.EVENTS_PATH, readonly=True)) == found
+
+
+def test_second_writer_is_refused(tmp_path):
+    path = str(tmp_path / "columns")
+    store = columnar.ColumnStore(path)
+    with pytest.raises(OSError, match="being written by another process"):
+        columnar.ColumnStore(path)
+    store.close()
+    columnar.ColumnStore(path).close()
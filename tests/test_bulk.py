@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+import bulk
+import columnar
+import storage
+
+BULK_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bulk.py")
+
+ROLES = bulk.header_roles(["ts", "temperature", "humidity"])
+
+
+def parse(text):
+    return bulk.parse_block(np.frombuffer(text.encode(), np.uint8), ROLES)
+
+
+def test_signed_numbers_are_parsed_in_one_pass():
+    values, _ = parse("1700000000,-5.5,61\n1700000001, -0.25 ,-3\n")
+    assert values.tolist() == [[1700000000, -5.5, 61], [1700000001, -0.25, -3]]
+
+
+def test_minus_inside_a_number_goes_to_the_csv_module():
+    assert parse("1700000000,2025-03-20,61\n") is None
+    assert parse("1700000000,5-,61\n") is None
+    assert parse("1700000000,--5,61\n") is None
+    assert parse("1700000000,1 2,61\n") is None
+    values, _ = bulk.parse_text(b"1700000000,2025-03-20,61\n1700000001,5-,-3\n", ROLES)
+    assert np.isnan(values[:, 1]).all()
+    assert values[:, 2].tolist() == [61, -3]
+
+
+def write_csv(path, rows):
+    with open(path, "w") as file:
+        file.write("ts,temperature,humidity\n")
+        for i in range(rows):
+            file.write(f"{1700000000 + i},{20 + i % 7}.5,{40 + i % 11}\n")
+
+
+def test_resumed_import_does_not_duplicate_rows(tmp_path, monkeypatch):
+    path = str(tmp_path / "readings.csv")
+    write_csv(path, 5000)
+    monkeypatch.setattr(bulk, "CHUNK_BYTES", 8192)  # Several blocks
+    progress_path = str(tmp_path / "progress.json")
+    store = columnar.ColumnStore(str(tmp_path / "columns"))
+    checkpoint = storage.write_json_atomic
+    calls = []
+
+    def crash_on_third(*args):
+        # Killed after the third block is stored but before its checkpoint
+        calls.append(args)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        checkpoint(*args)
+
+    monkeypatch.setattr(storage, "write_json_atomic", crash_on_third)
+    with pytest.raises(KeyboardInterrupt):
+        bulk.import_file(path, store, progress_path, log=lambda message: None)
+    monkeypatch.setattr(storage, "write_json_atomic", checkpoint)
+    assert len(store) > 2 * 8192 // 20  # Three blocks are in the store
+
+    first_row, rows, new_rows, _ = bulk.import_file(path, store, progress_path, log=lambda message: None)
+    assert (first_row, rows) == (0, 5000)
+    assert 0 < new_rows < 5000
+    assert np.array_equal(np.asarray(store.ts), (1700000000 + np.arange(5000)) * 1000)
+    store.close()
+
+
+def test_import_starts_the_column_store_from_the_segment_store(tmp_path):
+    segments = storage.SegmentStorage(str(tmp_path / "sensor_store"))
+    segments.append_many([{"ts": 1600000000 + i, "temperature": 18.0, "humidity": 30.0} for i in range(5)])
+    segments.close()
+    write_csv(str(tmp_path / "readings.csv"), 10)
+    done = subprocess.run([sys.executable, BULK_SCRIPT, "import", "readings.csv"], cwd=tmp_path,
+                          capture_output=True, text=True, timeout=60)
+    assert done.returncode == 0, done.stderr
+    assert "Built column store with 5 readings" in done.stdout
+    # Readers take every reading, imported ones included, from the column store
+    view = storage.load_legacy_view(str(tmp_path / "sensor_store"), column_dir=str(tmp_path / "sensor_columns"))
+    assert sum(len(times) for times in view["_default"]["1"].values()) == 15
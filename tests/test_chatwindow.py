@@ -0,0 +1,136 @@
+import types
+from concurrent.futures import Future
+
+import pytest
+
+import chatbot
+import chatwindow
+import test as grok
+
+
+class FakeWidget:
+    # Enough of ScrolledText, Entry, Button and Frame to build a window without a display
+    def __init__(self, *args, **kwargs):
+        self.text = []
+        self.value = ""
+
+    def grid(self, **kwargs):
+        pass
+
+    def bind(self, *args):
+        pass
+
+    def insert(self, where, text):
+        self.text.append(text)
+
+    def see(self, *args):
+        pass
+
+    def get(self):
+        return self.value
+
+    def delete(self, *args):
+        self.value = ""
+
+
+class FakeRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def title(self, text):
+        pass
+
+    def geometry(self, size):
+        pass
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def run_next(self):
+        self.scheduled.pop(0)()
+
+
+class FakeAnalytics:
+    def __init__(self):
+        self.questions = []
+
+    def answer(self, question):
+        self.questions.append(question)
+        return {"type": "text", "text": f"{len(self.questions)} answered"}
+
+    def refresh(self, rows):
+        return {"rows": rows, "since": None}
+
+
+class FakeLocalAnalytics(FakeAnalytics):
+    def info(self):
+        return {"error": None, "span": "5 readings", "rows": 5}
+
+
+@pytest.fixture
+def window(monkeypatch):
+    monkeypatch.setattr(chatwindow, "scrolledtext", types.SimpleNamespace(ScrolledText=FakeWidget))
+    monkeypatch.setattr(chatwindow, "ttk", types.SimpleNamespace(Entry=FakeWidget, Button=FakeWidget, Frame=FakeWidget))
+    loading = Future()
+    monkeypatch.setattr(chatwindow.analytics_server, "connect_async", lambda url: loading)
+    monkeypatch.setattr(chatwindow.llm_worker, "cache_path_for", lambda name: None)  # No response cache file
+
+    def make(console_class):
+        monkeypatch.setattr(console_class, "metrics_port", None)
+        root = FakeRoot()
+        return console_class(root), root, loading
+
+    return make
+
+
+@pytest.mark.parametrize("console_class,speaker", [(grok.GrokChatbot, "Grok 3"), (chatbot.GeminiChatbot, "Gemini 3")])
+def test_questions_asked_while_loading_are_answered_once_loaded(window, console_class, speaker):
+    app, root, loading = window(console_class)
+    assert app.chat_display.text == ["Loading sensor data...\n"]
+    app.input_field.value = "average temperature"
+    app.process_input()
+    assert app.pending == ["average temperature"]
+
+    root.run_next()  # Still loading: polls again
+    assert len(root.scheduled) == 1
+    analytics = FakeAnalytics()
+    loading.set_result((analytics, {"error": None, "span": "3 readings", "rows": 3}))
+    root.run_next()
+    assert analytics.questions == ["average temperature"]
+    assert app.pending == []
+    assert app.chat_display.text[-2].startswith(f"{speaker}: Hello!")
+    assert app.chat_display.text[-1] == f"{speaker}: 1 answered\n\n"
+    assert root.scheduled == [app.poll_updates]
+
+    app.input_field.value = "average humidity"
+    app.process_input()
+    assert app.chat_display.text[-1] == f"{speaker}: 2 answered\n\n"
+
+
+def test_failed_load_falls_back_to_analytics_in_this_process(window, monkeypatch):
+    monkeypatch.setattr(chatwindow.analytics_server, "Analytics", FakeLocalAnalytics)
+    app, root, loading = window(grok.GrokChatbot)
+    app.input_field.value = "average temperature"
+    app.process_input()
+    loading.set_exception(ConnectionResetError("server went away"))
+    root.run_next()
+    assert "Could not load sensor data (server went away)" in app.chat_display.text[2]
+    assert isinstance(app.analytics, FakeLocalAnalytics)
+    assert app.data_span == "5 readings"
+    assert app.chat_display.text[-1] == "Grok 3: 1 answered\n\n"
+    assert root.scheduled == [app.poll_updates]
+
+
+def test_questions_get_an_error_when_no_data_can_be_loaded(window, monkeypatch):
+    def broken():
+        raise ValueError("corrupt store")
+
+    monkeypatch.setattr(chatwindow.analytics_server, "Analytics", broken)
+    app, root, loading = window(chatbot.GeminiChatbot)
+    loading.set_exception(OSError("no server"))
+    root.run_next()
+    assert any("corrupt store" in text for text in app.chat_display.text)
+    assert root.scheduled == []
+    app.input_field.value = "average temperature"
+    app.process_input()
+    assert app.chat_display.text[-1] == "Gemini 3: Error: No valid sensor data loaded.\n\n"
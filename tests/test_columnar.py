@@ -0,0 +1,86 @@
+import os
+
+import numpy as np
+
+import columnar
+
+READINGS = [{"ts": 1700000000 + i, "temperature": 20.0 + i, "humidity": 50.0, "air_quality": None,
+             "light_intensity": 300.0} for i in range(10)]
+
+
+class RecordingFile:
+    # Wraps a column file handle and notes when it is flushed
+    def __init__(self, name, handle, flushed):
+        self.name = name
+        self.handle = handle
+        self.flushed = flushed
+
+    def write(self, data):
+        return self.handle.write(data)
+
+    def flush(self):
+        self.handle.flush()
+        self.flushed.append(self.name)
+
+    def __getattr__(self, name):
+        return getattr(self.handle, name)
+
+
+def test_timestamps_are_flushed_after_every_other_column(tmp_path):
+    store = columnar.ColumnStore(str(tmp_path / "columns"))
+    flushed = []
+    store._handles = {name: RecordingFile(name, handle, flushed) for name, handle in store._handles.items()}
+    store.append_many(READINGS)
+    assert flushed[-1] == columnar.TIMESTAMP_COLUMN
+    assert sorted(flushed) == sorted(store.files)
+    store.close()
+
+
+def test_reopened_store_keeps_its_rows_and_sources(tmp_path):
+    path = str(tmp_path / "columns")
+    store = columnar.ColumnStore(path)
+    store.append_many(READINGS[:6] + [dict(READINGS[6], source="esp32")])
+    store.close()
+
+    store = columnar.ColumnStore(path)
+    assert len(store) == 7
+    assert store.sources == [columnar.DEFAULT_SOURCE, "esp32"]
+    store.append_many(READINGS[7:])
+    assert (np.asarray(store.ts) // 1000).tolist() == [reading["ts"] for reading in READINGS]
+    assert np.asarray(store.values("temperature")).tolist() == [reading["temperature"] for reading in READINGS]
+    assert not store.valid("air_quality").any()
+    assert np.asarray(store.arrays[columnar.SOURCE_COLUMN]).tolist() == [0] * 6 + [1, 0, 0, 0]
+    store.close()
+
+
+def test_torn_append_is_cut_back_to_the_last_complete_row(tmp_path):
+    path = str(tmp_path / "columns")
+    store = columnar.ColumnStore(path)
+    store.append_many(READINGS[:5])
+    files = {name: store.file_path(name) for name in store.files}
+    store.close()
+
+    # A crash after two more temperatures and half a timestamp reached the disk
+    with open(files["temperature"], "ab") as file:
+        file.write(np.array([99.0, 99.0], columnar.VALUE_DTYPE).tobytes())
+    with open(files[columnar.TIMESTAMP_COLUMN], "ab") as file:
+        file.write(b"\1\2\3")
+    assert len(columnar.ColumnStore(path, readonly=True)) == 5
+
+    store = columnar.ColumnStore(path)
+    assert len(store) == 5
+    for name, (_, dtype) in store.files.items():
+        assert os.path.getsize(files[name]) == 5 * dtype.itemsize
+    store.append_many(READINGS[5:])
+    assert np.asarray(store.values("temperature")).tolist() == [reading["temperature"] for reading in READINGS]
+    store.close()
+
+
+def test_local_times_follow_daylight_saving(local_zone):
+    local_zone("Europe/Berlin")
+    # 00:30 and 01:30 UTC on 2025-03-30, either side of the switch to summer time
+    ts = [1743294600000, 1743298200000]
+    assert columnar.to_local(ts).astype(str).tolist() == ["2025-03-30T01:30:00.000", "2025-03-30T03:30:00.000"]
+    assert columnar.from_local(columnar.to_local(ts).astype(np.int64)).tolist() == ts
+    # Winter and summer readings months apart in one call
+    assert columnar.local_offsets_ms([1736000000000, 1751000000000]).tolist() == [3600000, 7200000]
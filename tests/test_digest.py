@@ -0,0 +1,62 @@
+from datetime import datetime
+
+import pytest
+
+import analytics_server
+import bench
+import columnar
+import digest
+import rollup
+import timerange
+
+BUDGETS = [60, 150, 300, 600, 1000, 2000]
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    # Two days of 1 Hz readings with their rollup index and anomaly events
+    column_dir = str(tmp_path_factory.mktemp("digest") / "columns")
+    bench.build_store(column_dir, 2 * 86400, log=lambda message: None)
+    analytics = analytics_server.Analytics(column_dir=column_dir, rollup_path=column_dir + "/rollups.npz",
+                                           anomaly_path=column_dir + "/anomalies.bin")
+    return analytics.engine
+
+
+@pytest.mark.parametrize("budget", BUDGETS)
+def test_digest_stays_within_its_token_budget(engine, budget):
+    result = digest.build(engine, None, budget)
+    assert 0 < result["tokens"] <= budget
+    assert result["tokens"] == digest.estimate_tokens(result["text"])
+    assert result["budget"] == budget
+
+
+def test_larger_budget_gives_more_detail(engine):
+    results = [digest.build(engine, None, budget) for budget in BUDGETS]
+    assert [len(result["text"]) for result in results] == sorted(len(result["text"]) for result in results)
+    assert results[0]["periods"] == 0
+    assert results[-1]["periods"] > results[-2]["periods"] >= digest.MIN_PERIODS
+    # Cutting keeps the higher-priority text: every digest starts like the largest one
+    assert all(results[-1]["text"].startswith(result["text"].split("\n")[0]) for result in results)
+
+
+def test_empty_window_is_one_line(engine):
+    window = timerange.parse_range("between 2001-01-01 and 2001-01-02")
+    result = digest.build(engine, window, 1000)
+    assert result["text"].startswith("No sensor readings")
+    assert result["periods"] == 0
+
+
+def test_day_periods_follow_the_local_clock(tmp_path, local_zone):
+    local_zone("America/New_York")
+    store = columnar.ColumnStore(str(tmp_path / "columns"))
+    first = int(datetime(2025, 3, 8).timestamp())
+    # Every 10 minutes for 8 local days, across the switch to summer time on 2025-03-09
+    store.append_many([{"ts": first + i * 600, "temperature": 20.0, "humidity": 50.0} for i in range(8 * 144 - 6)])
+    engine = timerange.QueryEngine(store, rollup.open_index(store, None))
+    result = digest.build(engine, None, 600, now=first + 8 * 86400)
+    assert result["resolution"] == "day"
+    rows = result["text"].split("Per day")[1].splitlines()[1:]
+    assert [row.split(" | ")[0] for row in rows] == [f"2025-03-{day:02d}" for day in range(8, 16)]
+    assert rows[1].endswith(" | 138")  # 23 hours
+    assert rows[2].endswith(" | 144")
+    store.close()
@@ -0,0 +1,64 @@
+import frames
+
+READING = {"temperature": -3.25, "humidity": 61.5, "air_quality": None, "light_intensity": 800.0}
+
+
+def encode(seqs, node=0):
+    return [frames.encode_frame(READING, seq, node) for seq in seqs]
+
+
+def test_frames_round_trip_in_any_chunking():
+    stream = b"".join(encode(range(20)))
+    for chunk in (1, 7, frames.FRAME_SIZE, 100, len(stream)):
+        decoder = frames.FrameDecoder()
+        decoded = [frame for start in range(0, len(stream), chunk)
+                   for frame in decoder.feed(stream[start:start + chunk])[0]]
+        assert [int(frame["seq"]) for frame in decoded] == list(range(20))
+        assert (decoder.lost, decoder.crc_errors, decoder.skipped_bytes, decoder.pending) == (0, 0, 0, b"")
+    assert frames.frame_records(decoder.feed(encode([20])[0])[0], 5.0, "link") == [
+        {"ts": 5.0, "source": "link", **READING}]
+
+
+def test_resync_after_garbage_and_text():
+    decoder = frames.FrameDecoder()
+    good = encode(range(4))
+    # Noise with a stray sync word, then a JSON line between frames
+    stream = b"\x00\xff" + frames.SYNC + b"junk" + good[0] + good[1] + b'{"temperature": 1}\n' + good[2] + good[3]
+    decoded, lines = decoder.feed(stream)
+    assert decoded["seq"].tolist() == [0, 1, 2, 3]
+    assert lines == [b'{"temperature": 1}']
+    assert decoder.skipped_bytes == 8
+    assert decoder.crc_errors == 1  # The stray sync word
+    assert decoder.lost == 0
+
+
+def test_corrupt_frames_are_rejected_and_counted_as_lost():
+    decoder = frames.FrameDecoder()
+    stream = bytearray(b"".join(encode(range(6))))
+    stream[2 * frames.FRAME_SIZE + 8] ^= 0x01  # One bit of the third frame's temperature
+    decoded, lines = decoder.feed(bytes(stream))
+    assert decoded["seq"].tolist() == [0, 1, 3, 4, 5]
+    assert decoded["temperature"].tolist() == [-325] * 5
+    assert decoder.crc_errors == 1
+    assert decoder.lost == 1
+    assert lines == []
+
+
+def test_sequence_gaps_repeats_wraps_and_restarts():
+    decoder = frames.FrameDecoder()
+    decoder.feed(b"".join(encode([10, 11, 14, 14, 15])))
+    assert (decoder.lost, decoder.duplicates, decoder.frames) == (2, 1, 4)
+    decoder.feed(b"".join(encode([16, 17])))
+    decoder.feed(b"".join(encode([65534, 65535, 0, 1])))
+    assert decoder.restarts == 1  # 17 -> 65534 is a device restart, not 65516 lost frames
+    assert decoder.lost == 2  # Nothing lost across reads or the 16-bit wrap
+    assert decoder.frames == 10
+
+
+def test_sequence_is_tracked_per_node():
+    decoder = frames.FrameDecoder()
+    first, second = encode(range(5), node=1), encode(range(0, 10, 2), node=2)
+    decoded, _ = decoder.feed(b"".join(frame for pair in zip(first, second) for frame in pair))
+    assert len(decoded) == 10
+    assert decoder.lost == 4
+    assert [record["source"] for record in frames.frame_records(decoded[:2], 0.0, "radio")] == ["radio.1", "radio.2"]
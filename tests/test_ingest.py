@@ -0,0 +1,164 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+serial = pytest.importorskip("serial")
+
+import bench
+import columnar
+import frames
+import ingest_daemon
+import pipeline
+
+WAIT_SECONDS = 10
+
+
+class ListSink:
+    # Stands in for a StorageGroup
+    def __init__(self):
+        self.records = []
+
+    def append_many(self, records):
+        self.records.extend(records)
+
+    def sync(self):
+        pass
+
+
+def wait_for(condition, seconds=WAIT_SECONDS):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def json_messages(count, start=0):
+    _, values = bench.simulate_readings(count, rng=np.random.default_rng(start))
+    messages, _ = bench.payload_messages(values, corrupt=0)
+    return messages
+
+
+def run_pipeline(messages, sink, expected):
+    simulator = bench.PayloadSimulator(messages, rate=10000)
+    ser = serial.Serial(simulator.port, bench.BAUD, timeout=pipeline.READ_TIMEOUT)
+    ingest = pipeline.IngestPipeline(ser, sink, max_latency=0.05)
+    ingest.start()
+    simulator.start()
+    try:
+        wait_for(lambda: ingest.stats()["committed"] + ingest.stats()["parse_errors"] >= expected)
+    finally:
+        simulator.stop()
+        ingest.stop()
+        ser.close()
+        simulator.close()
+    return ingest.stats()
+
+
+def test_pipeline_stores_json_lines_and_frames_from_a_pty():
+    lines = json_messages(200)
+    framed = [frames.encode_frame({"temperature": 20.5 + seq, "humidity": 55.0, "air_quality": 12.0, "light_intensity": 900.0}, seq)
+              for seq in range(50)]
+    messages = lines[:100] + [b"{not json\n"] + framed + lines[100:]
+    sink = ListSink()
+    stats = run_pipeline(messages, sink, 251)
+    assert stats["committed"] == 250
+    assert stats["parse_errors"] == 1
+    assert stats["crc_errors"] == 0 and stats["lost_frames"] == 0
+    assert stats["dropped"] == 0
+    assert [record["temperature"] for record in sink.records if record.get("temperature", 0) >= 20.5 and record["humidity"] == 55.0] \
+        == [20.5 + seq for seq in range(50)]
+    assert sink.records[0]["temperature"] == json.loads(lines[0])["temperature"]
+
+
+def test_pipeline_fills_the_store_group(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # The store group uses paths relative to the working directory
+    group = pipeline.open_store_group(log=lambda message: None)
+    try:
+        stats = run_pipeline(json_messages(500), group, 500)
+        assert stats["committed"] == 500
+        segments, columns, rollups = group.backends[:3]
+        assert len(segments) == 500
+        assert columns.next_row == 500
+        assert rollups.rows == 500
+    finally:
+        group.close()
+    assert columnar.ColumnStore(columnar.COLUMN_DIR, readonly=True).next_row == 500
+
+
+def test_daemon_reads_several_serial_ports():
+    simulators = [bench.PayloadSimulator(json_messages(300, start), rate=10000) for start in range(2)]
+    sink = ListSink()
+    daemon = ingest_daemon.IngestDaemon(sink, max_latency=0.05)
+    for index, simulator in enumerate(simulators):
+        daemon.add_serial(f"payload-{index}", simulator.port)
+
+    async def run():
+        task = asyncio.create_task(daemon.run(stats_interval=0))
+        deadline = time.monotonic() + WAIT_SECONDS
+        # Opening a port flushes its input, so only start sending once both are open
+        while len(daemon.decoders) < len(simulators) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        for simulator in simulators:
+            simulator.start()
+        while daemon.committed < 600 and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(run())
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+            simulator.close()
+    assert daemon.committed == 600
+    sources = [record["source"] for record in sink.records]
+    assert sources.count("payload-0") == sources.count("payload-1") == 300
+
+
+class ReadingHandler(BaseHTTPRequestHandler):
+    # A sensor node's HTTP endpoint: one JSON reading per GET
+    def do_GET(self):
+        body = json.dumps({"temperature": 21.5, "humidity": 40.0, "air_quality": 12.0, "light_intensity": 300.0}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_http_readings_are_dropped_when_the_queue_is_full():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ReadingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    daemon = ingest_daemon.IngestDaemon(ListSink())
+    daemon.add_source("node")
+
+    async def run():
+        # No writer drains the queue, so it fills after two readings
+        daemon.queue = asyncio.Queue(2)
+        task = asyncio.create_task(daemon.poll_http("node", f"http://127.0.0.1:{server.server_port}/", 0.01, 0))
+        deadline = time.monotonic() + WAIT_SECONDS
+        while daemon.stats["node"].dropped < 3 and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+    stats = daemon.stats["node"]
+    assert stats.readings == 2
+    assert stats.dropped >= 3
+    assert stats.errors == 0
@@ -0,0 +1,145 @@
+import json
+import threading
+
+import pytest
+
+import chatbot
+import llm_worker
+import stub_llm_server
+import test as grok
+
+AVERAGES = {"temperature": 27.4, "humidity": 63.0, "air_quality": 41.2, "light_intensity": 1250.0}
+
+
+class FakeAnalytics:
+    # Answers every question as one for the LLM, like Analytics.answer does for free-form ones
+    def __init__(self, digest="Sensor digest over all stored data: 10 readings.", span="all stored data", averages=AVERAGES):
+        self.digest = digest
+        self.span = span
+        self.averages = averages
+
+    def answer(self, question):
+        return {"type": "llm", "span": self.span, "averages": dict(self.averages), "digest": self.digest}
+
+
+class SSEHandler(stub_llm_server.StubHandler):
+    # /v1/ask answered as server-sent events instead of NDJSON
+    def do_POST(self):
+        payload = self.read_json()
+        answer = stub_llm_server.stub_answer(payload.get("query", ""), 0)
+        events = [f"data: {json.dumps({'response': token})}\n\n" for token in stub_llm_server.split_tokens(answer)]
+        self.send_stream("text/event-stream", events + ["data: [DONE]\n\n"])
+
+
+def ask(request, cache):
+    chunks = []
+    llm_worker.answer_now(request, cache, chunks.append)
+    return "".join(chunks)
+
+
+def test_cache_entries_expire_after_ttl(monkeypatch):
+    cache = llm_worker.ResponseCache(path=None, ttl=10)
+    now = 1000.0
+    monkeypatch.setattr(llm_worker.time, "time", lambda: now)
+    cache.put("key", "answer")
+    now += 9
+    assert cache.get("key") == "answer"
+    now += 2
+    assert cache.get("key") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = llm_worker.ResponseCache(path=None, max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_cache_is_reloaded_without_expired_entries(tmp_path, monkeypatch):
+    path = str(tmp_path / "llm_cache.json")
+    now = 1000.0
+    monkeypatch.setattr(llm_worker.time, "time", lambda: now)
+    cache = llm_worker.ResponseCache(path=path, ttl=10)
+    cache.put("old", "1")
+    now += 5
+    cache.put("new", "2")
+    now += 7
+    reloaded = llm_worker.ResponseCache(path=path, ttl=10)
+    assert reloaded.get("old") is None
+    assert reloaded.get("new") == "2"
+
+
+def test_cache_key_rounds_averages():
+    close = {name: value + 0.05 for name, value in AVERAGES.items()}
+    assert llm_worker.cache_key("crops", "grok", AVERAGES) == llm_worker.cache_key("crops", "grok", close)
+    assert llm_worker.cache_key("crops", "grok", AVERAGES) != llm_worker.cache_key("light", "grok", AVERAGES)
+
+
+def test_repeated_question_is_answered_from_the_cache(stub_server, monkeypatch):
+    monkeypatch.setattr(chatbot, "GEMINI_API_URL", stub_server.url + "/v1/ask")
+    assistant = chatbot.GeminiAssistant(FakeAnalytics())
+    cache = llm_worker.ResponseCache(path=None)
+    first = ask(assistant.process_query("What do the sensors say?"), cache)
+    second = ask(assistant.process_query("what do the  sensors say?"), cache)
+    assert first.startswith("Stub answer")
+    assert second == first
+    assert stub_server.requests == 1
+    assert cache.hits == 1
+
+
+@pytest.mark.parametrize("make", [chatbot.GeminiAssistant, grok.GrokAssistant])
+def test_new_digest_is_not_answered_from_the_cache(make):
+    before = make(FakeAnalytics("Sensor digest over all stored data: 10 readings."))
+    after = make(FakeAnalytics("Sensor digest over all stored data: 12 readings. Anomalies: temp spike."))
+    question = "What do the sensors say?"
+    assert before.process_query(question).key == before.process_query(question).key
+    assert before.process_query(question).key != after.process_query(question).key
+
+
+def test_grok_fallback_names_the_window_and_handles_missing_averages():
+    empty = {"temperature": None, "humidity": None, "air_quality": None, "light_intensity": None}
+    assistant = grok.GrokAssistant(FakeAnalytics(span="on 2025-05-01", averages=empty))
+    assistant.llm_available = False
+    climate = assistant.process_query("describe the climate on 2025-05-01")
+    assert climate.startswith("Based on the sensor data (on 2025-05-01):")
+    assert "- Air Quality (PM2.5): N/A µg/m³" in climate
+    assert "N/A lux" in assistant.process_query("which crops grow here")
+    assert assistant.process_query("how is the air quality") == "No air quality readings (on 2025-05-01)."
+    assert assistant.process_query("is it bright enough") == "No light intensity readings (on 2025-05-01)."
+    # The Grok prompt gets the same guard
+    assistant.llm_available = True
+    assert isinstance(assistant.process_query("how is the air quality"), llm_worker.LLMRequest)
+
+
+def test_gemini_ndjson_stream_is_split_into_chunks(stub_server, monkeypatch):
+    monkeypatch.setattr(chatbot, "GEMINI_API_URL", stub_server.url + "/v1/ask")
+    chunks = list(chatbot.GeminiAssistant().stream_gemini({"query": "how warm is it", "stream": True}))
+    assert len(chunks) > 1
+    assert "".join(chunks).endswith("to: how warm is it")
+
+
+def test_gemini_sse_stream_is_split_into_chunks(monkeypatch):
+    server = stub_llm_server.make_server(port=0, token_delay=0)
+    server.RequestHandlerClass = SSEHandler
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setattr(chatbot, "GEMINI_API_URL", f"http://127.0.0.1:{server.server_port}/v1/ask")
+        chunks = list(chatbot.GeminiAssistant().stream_gemini({"query": "how warm is it", "stream": True}))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(chunks) > 1
+    assert "".join(chunks) == "Stub answer (0 prompt tokens) to: how warm is it"
+
+
+def test_grok_sse_stream_is_split_into_chunks(stub_server, monkeypatch):
+    pytest.importorskip("langchain_groq")
+    monkeypatch.setattr(grok, "GROK_API_BASE", stub_server.url)
+    chunks = list(grok.GrokAssistant().stream_grok("Sensor data {not a template field}", "how warm is it"))
+    assert len([chunk for chunk in chunks if chunk]) > 1
+    assert "".join(chunks).endswith("to: how warm is it")
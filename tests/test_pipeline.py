@@ -0,0 +1,139 @@
+import threading
+import time
+
+import pipeline
+
+LINE = b'{"temperature": 21.5, "humidity": 40.0}\n'
+WAIT_SECONDS = 5
+
+
+class ListSink:
+    # Stands in for a StorageGroup
+    def __init__(self):
+        self.records = []
+        self.batches = []
+
+    def append_many(self, records):
+        self.records.extend(records)
+        self.batches.append((time.monotonic(), len(records)))
+
+    def sync(self):
+        pass
+
+
+class FlakySerial:
+    # A port that fails on its second read, cannot be reopened once, then works
+    port = "COM6"
+
+    def __init__(self):
+        self.reads = 0
+        self.opens = 0
+        self.is_open = True
+        self.in_waiting = 0
+
+    def read(self, size):
+        self.reads += 1
+        if self.reads == 2:
+            raise OSError("device disconnected")
+        time.sleep(0.001)
+        return LINE if self.reads < 10 else b""
+
+    def open(self):
+        self.opens += 1
+        if self.opens == 1:
+            raise OSError("no such device")
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+
+def wait_for(condition, seconds=WAIT_SECONDS):
+    deadline = time.monotonic() + seconds
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_reader_reopens_the_port_after_a_read_error(monkeypatch):
+    monkeypatch.setattr(pipeline, "RECONNECT_DELAY", 0.01)
+    ser = FlakySerial()
+    ingest = pipeline.IngestPipeline(ser, ListSink(), max_latency=0.01)
+    ingest.start()
+    try:
+        assert wait_for(lambda: ingest.stats()["committed"] == 8)
+    finally:
+        ingest.stop()
+    stats = ingest.stats()
+    assert stats["read_errors"] == 2  # The read and the first reopen
+    assert stats["connected"] == 1
+    assert ser.opens == 2
+    assert ingest.reader.is_alive() is False
+    assert ingest.reader.last_error == "COM6: no such device"
+
+
+def test_full_buffer_drops_after_waiting():
+    buffer = pipeline.RingBuffer(3)
+    assert all(buffer.put(number) for number in range(3))
+    started = time.monotonic()
+    assert buffer.put(3, timeout=0.05) is False
+    assert time.monotonic() - started >= 0.05
+    assert (buffer.dropped, buffer.backpressure_waits, buffer.max_depth) == (1, 1, 3)
+
+    buffer.close()
+    assert buffer.put(4) is False
+    assert buffer.dropped == 2
+    # Closing still hands out what was queued, then []
+    assert buffer.get_batch(10, 10) == [0, 1, 2]
+    assert buffer.get_batch(10, 10) == []
+
+
+def test_full_buffer_waits_for_the_writer():
+    buffer = pipeline.RingBuffer(2)
+    buffer.put(0)
+    buffer.put(1)
+    taken = []
+    timer = threading.Timer(0.05, lambda: taken.append(buffer.get_batch(1, 0)))
+    timer.start()
+    assert buffer.put(2, timeout=WAIT_SECONDS) is True
+    timer.join()
+    assert taken == [[0]]
+    assert (buffer.dropped, buffer.backpressure_waits) == (0, 1)
+    assert buffer.get_batch(10, 0) == [1, 2]
+
+
+def test_batches_are_committed_when_full():
+    buffer = pipeline.RingBuffer(100)
+    sink = ListSink()
+    writer = pipeline.BatchWriter(buffer, sink, max_records=4, max_latency=WAIT_SECONDS * 2)
+    writer.start()
+    started = time.monotonic()
+    for number in range(8):
+        buffer.put((started, LINE))
+    assert wait_for(lambda: writer.batches == 2)
+    # Full batches do not wait for the latency deadline
+    assert [size for _, size in sink.batches] == [4, 4]
+    assert sink.batches[-1][0] - started < WAIT_SECONDS
+    buffer.close()
+    writer.join(WAIT_SECONDS)
+    assert writer.committed == 8
+
+
+def test_batches_are_committed_after_the_latency_deadline():
+    buffer = pipeline.RingBuffer(100)
+    sink = ListSink()
+    writer = pipeline.BatchWriter(buffer, sink, max_records=100, max_latency=0.1)
+    writer.start()
+    started = time.monotonic()
+    buffer.put((started, LINE))
+    buffer.put((started, b"not json\n"))
+    buffer.put((started, LINE))
+    assert wait_for(lambda: writer.batches == 1)
+    assert sink.batches[0][0] - started >= 0.1
+    assert writer.committed == 2
+    assert writer.parse_errors == 1
+    buffer.close()
+    writer.join(WAIT_SECONDS)
+    assert writer.batches == 1
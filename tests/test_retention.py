@@ -0,0 +1,122 @@
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import columnar
+import retention
+import rollup
+import storage
+
+ROWS = 20000
+BATCH = 50
+DAY = 86400
+POLICY = retention.Policy(7, None, None)
+
+
+def batch(first, count):
+    # Rows whose every column can be checked against the timestamp
+    ts = np.arange(first, first + count, dtype=np.int64)
+    columns = {columnar.TIMESTAMP_COLUMN: ts, columnar.SOURCE_COLUMN: np.zeros(count, columnar.SOURCE_DTYPE)}
+    for index, field in enumerate(columnar.storage.FIELDS):
+        columns[field] = (ts % 1000 + index).astype(columnar.VALUE_DTYPE)
+        columns[field + ".valid"] = np.ones(count, columnar.VALID_DTYPE)
+    return columns
+
+
+def check_rows(store, first_row):
+    assert store.first_row == first_row
+    ts = np.asarray(store.ts)
+    assert np.array_equal(ts, np.arange(first_row, store.next_row))
+    for index, field in enumerate(store.fields):
+        assert len(store.arrays[field]) == len(ts)
+        assert np.array_equal(store.values(field), (ts % 1000 + index).astype(columnar.VALUE_DTYPE))
+        assert store.valid(field).all()
+
+
+def test_compaction_while_rows_are_appended(tmp_path):
+    store = columnar.ColumnStore(str(tmp_path / "columns"))
+    store.append_columns(batch(0, ROWS))
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def write():
+        # The ingest writer: one batch at a time under the lock
+        while not stop.is_set():
+            with lock:
+                store.append_columns(batch(store.next_row, BATCH))
+
+    writer = threading.Thread(target=write)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads often, e.g. in the middle of refresh()
+    writer.start()
+    try:
+        store.compact(ROWS // 2, ROWS // 2, lock, chunk=100)
+    finally:
+        stop.set()
+        writer.join()
+        sys.setswitchinterval(interval)
+    assert store.next_row > ROWS
+    check_rows(store, ROWS // 2)
+    store.close()
+    check_rows(columnar.ColumnStore(str(tmp_path / "columns"), readonly=True), ROWS // 2)
+
+
+class Tiers:
+    # Segments (small, so they seal), columns and a saved rollup index under
+    # one writer lock, with a compactor, as pipeline.open_store_group sets up
+    def __init__(self, directory):
+        self.segments = storage.SegmentStorage(os.path.join(directory, "segments"), max_records=50)
+        self.columns = columnar.ColumnStore(os.path.join(directory, "columns"))
+        self.rollup_path = os.path.join(directory, "rollups.npz")
+        self.rollups = rollup.open_index(self.columns, self.rollup_path)
+        self.group = storage.StorageGroup(self.segments, self.columns, self.rollups)
+        self.compactor = retention.Compactor(self.columns, self.rollups, None, self.segments, self.group.lock,
+                                             POLICY, log=lambda message: None)
+
+    def add(self, count, days_ago):
+        start = time.time() - days_ago * DAY
+        self.group.append_many([{"ts": start + i * 60, "temperature": 20.0, "humidity": 50.0,
+                                 "air_quality": 10.0, "light_intensity": 500.0} for i in range(count)])
+
+
+def test_rows_the_saved_index_does_not_cover_are_kept(tmp_path):
+    tiers = Tiers(str(tmp_path))
+    tiers.add(1000, 10)
+    raw_cut = tiers.compactor.raw_cut
+
+    def ingest_then_cut(*args):
+        # Readings stored after the index was saved, before the raw cut
+        tiers.add(200, 9)
+        return raw_cut(*args)
+
+    tiers.compactor.raw_cut = ingest_then_cut
+    result = tiers.compactor.compact()
+    assert result["raw_rows"] == 1000
+    assert tiers.columns.first_row == 1000
+    assert rollup.RollupIndex.load(tiers.rollup_path).rows >= tiers.columns.first_row
+    tiers.group.close()
+
+
+def test_segments_are_kept_when_columns_are_not_compacted(tmp_path):
+    tiers = Tiers(str(tmp_path))
+    tiers.add(100, 10)
+    tiers.add(1000, 1)
+    result = tiers.compactor.compact()
+    assert result["raw_rows"] == 0  # Under MIN_DROP_FRACTION of the rows
+    assert result["segment_rows"] == 0
+    assert len(tiers.segments) == 1100
+    tiers.group.close()
+
+
+def test_segments_are_pruned_with_the_columns(tmp_path):
+    tiers = Tiers(str(tmp_path))
+    tiers.add(1000, 10)
+    tiers.add(100, 1)
+    result = tiers.compactor.compact()
+    assert result["raw_rows"] == 1000
+    assert result["segment_rows"] == 1000
+    assert len(tiers.columns) == 100
+    tiers.group.close()
@@ -0,0 +1,97 @@
+import numpy as np
+
+import columnar
+import rollup
+import timerange
+
+FIRST = 1700000000  # Epoch seconds, not on a day boundary
+ROWS = 5000
+
+
+def make_store(directory):
+    # Irregularly spaced readings over about three days; some humidity missing
+    rng = np.random.default_rng(1)
+    ts = FIRST + np.cumsum(rng.integers(1, 100, ROWS))
+    store = columnar.ColumnStore(str(directory / "columns"))
+    store.append_many([{"ts": int(second), "temperature": float(temperature),
+                        "humidity": None if index % 7 == 0 else 40.0 + index % 13}
+                       for index, (second, temperature) in enumerate(zip(ts, rng.normal(20, 5, ROWS)))])
+    return store
+
+
+def expected(store, field, start, end):
+    ts = np.asarray(store.ts)
+    chosen = (ts >= start) & (ts < end) & store.valid(field)
+    values = np.asarray(store.values(field))[chosen].astype(np.float64)
+    return {"count": len(values), "mean": values.mean(), "std": values.std(),
+            "min": values.min(), "max": values.max()}
+
+
+def test_window_stats_match_a_full_scan(tmp_path):
+    store = make_store(tmp_path)
+    rollups = rollup.open_index(store, None)
+    source = timerange.TimeIndex(store)
+    first, last = int(store.ts[0]), int(store.ts[-1]) + 1
+    windows = [
+        (first, last),
+        (first + 123457, last - 98765),  # Partial minutes, hours and days at both ends
+        (first + 86400000, first + 2 * 86400000),
+        (first + 60000 * 17 + 5, first + 60000 * 27 + 7),
+    ]
+    for field in ("temperature", "humidity"):
+        for start, end in windows:
+            stats = rollups.stats(field, start, end, source)
+            want = expected(store, field, start, end)
+            assert stats["count"] == want["count"]
+            for name in ("mean", "std", "min", "max"):
+                assert np.isclose(stats[name], want[name], rtol=1e-5), (field, start, end, name)
+    # Without a time index the edges are whole minute buckets
+    assert rollups.stats("temperature")["count"] == ROWS
+    assert rollups.stats("humidity")["count"] == sum(index % 7 != 0 for index in range(ROWS))
+    store.close()
+
+
+def test_buckets_are_utc_minutes_hours_and_days(tmp_path):
+    store = make_store(tmp_path)
+    rollups = rollup.open_index(store, None)
+    ts = np.asarray(store.ts)
+    for name, width in rollup.LEVELS:
+        keys, counts = np.unique(ts // width, return_counts=True)
+        level = rollups.levels[name]
+        assert np.array_equal(level.keys, keys)
+        assert np.array_equal(level.stats[:, 0, rollup.COUNT], counts)
+    store.close()
+
+
+def test_verify_finds_a_damaged_bucket_and_rebuild_repairs_it(tmp_path):
+    store = make_store(tmp_path)
+    rollups = rollup.open_index(store, str(tmp_path / "rollups.npz"))
+    assert rollups.verify(store) == []
+
+    minute = rollups.levels["minute"]
+    minute.stats[10, 1, rollup.SUM] += 1.0
+    rollups.levels["hour"].stats[0, 0, rollup.MAX] = 1000.0
+    problems = rollups.verify(store)
+    assert problems == [f"hour bucket {rollups.levels['hour'].keys[0]}: temperature differs",
+                        f"minute bucket {minute.keys[10]}: humidity differs"]
+
+    rollups.rebuild(store)
+    assert rollups.verify(store) == []
+    rollups.close()
+
+    # The repaired index is what gets loaded next time
+    assert rollup.open_index(store, str(tmp_path / "rollups.npz")).verify(store) == []
+    store.close()
+
+
+def test_saved_index_catches_up_on_rows_added_since(tmp_path):
+    store = make_store(tmp_path)
+    path = str(tmp_path / "rollups.npz")
+    rollup.open_index(store, path).close()
+    store.append_many([{"ts": FIRST + 10 ** 6, "temperature": 99.0, "humidity": 1.0}])
+
+    rollups = rollup.open_index(store, path)
+    assert rollups.rows == ROWS + 1
+    assert rollups.stats("temperature")["max"] == 99.0
+    assert rollups.verify(store) == []
+    store.close()
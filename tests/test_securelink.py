@@ -0,0 +1,91 @@
+import securelink
+
+KEY = bytes(range(32))
+READING = {"temperature": 24.5, "humidity": 61.0, "air_quality": 35.0, "light_intensity": 800.0}
+
+
+def encode(encoder, count):
+    return [encoder.encode(READING) for _ in range(count)]
+
+
+def feed(decoder, frames):
+    # (session, seq) of every frame accepted, one read per frame
+    accepted = []
+    for frame in frames:
+        decoded, _ = decoder.feed(frame)
+        accepted += list(zip(decoded["session"].tolist(), decoded["seq"].tolist()))
+    return accepted
+
+
+def test_old_session_replayed_mid_stream_is_dropped():
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1)
+    earlier = encode(securelink.SecureEncoder(KEY, node=1, session=6), 5)
+    before_host = encode(securelink.SecureEncoder(KEY, node=1, session=3), 2)
+    live = securelink.SecureEncoder(KEY, node=1, session=7)
+
+    assert len(feed(decoder, earlier[:3])) == 3
+    assert feed(decoder, encode(live, 10)) == [(7, seq) for seq in range(10)]
+    # A session seen before, and one from before the ground station started
+    assert feed(decoder, earlier[1:2] + before_host) == []
+    assert feed(decoder, encode(live, 10)) == [(7, seq) for seq in range(10, 20)]
+    assert decoder.counts["replayed"] == 3
+    assert decoder.counts["restarts"] == 1
+    assert decoder.lost == 0
+
+
+def test_old_session_replayed_within_one_read_is_dropped():
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1)
+    old = encode(securelink.SecureEncoder(KEY, node=1, session=1), 4)
+    live = encode(securelink.SecureEncoder(KEY, node=1, session=2), 8)
+    frames, _ = decoder.feed(b"".join(live[:4] + old[2:3] + live[4:]))
+    assert frames["seq"].tolist() == list(range(8))
+    assert set(frames["session"].tolist()) == {2}
+
+
+def test_higher_session_is_a_reboot():
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1)
+    first = securelink.SecureEncoder(KEY, node=1)
+    second = securelink.SecureEncoder(KEY, node=1)
+    assert second.session > first.session
+    assert len(feed(decoder, encode(first, 5) + encode(second, 5))) == 10
+    assert decoder.counts["restarts"] == 1
+    # The frames of the first boot are now replays
+    assert feed(decoder, encode(first, 1)) == []
+
+
+def test_frames_replayed_in_the_current_session_are_dropped():
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1)
+    frames = encode(securelink.SecureEncoder(KEY, node=1, session=9), 6)
+    assert len(feed(decoder, frames)) == 6
+    assert feed(decoder, frames[2:4]) == []
+    assert decoder.counts["replayed"] == 2
+
+
+def test_replay_state_survives_a_restart(tmp_path):
+    state_path = str(tmp_path / "replay_state.json")
+    earlier = encode(securelink.SecureEncoder(KEY, node=1, session=6), 3)
+    live = securelink.SecureEncoder(KEY, node=1, session=7)
+    sent = encode(live, 5)
+
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1, state_path=state_path)
+    assert len(feed(decoder, earlier + sent)) == 8
+    decoder.close()
+
+    # A new decoder, as after a restart of the ground station
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1, state_path=state_path)
+    assert feed(decoder, earlier + sent) == []
+    assert decoder.counts["replayed"] == 8
+    assert decoder.counts["restarts"] == 0
+    assert feed(decoder, encode(live, 2)) == [(7, 5), (7, 6)]
+    assert decoder.lost == 0
+
+
+def test_a_new_session_is_saved_before_close(tmp_path):
+    state_path = str(tmp_path / "replay_state.json")
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1, state_path=state_path)
+    old = encode(securelink.SecureEncoder(KEY, node=2, session=4), 2)
+    assert len(feed(decoder, old + encode(securelink.SecureEncoder(KEY, node=2, session=5), 1))) == 3
+
+    # Never closed, as after a crash
+    decoder = securelink.SecureFrameDecoder(KEY, workers=1, state_path=state_path)
+    assert feed(decoder, old) == []
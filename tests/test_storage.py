@@ -0,0 +1,68 @@
+import os
+
+import storage
+
+
+def reading(ts):
+    return {"ts": ts, "temperature": 20.0 + ts, "humidity": 50.0}
+
+
+def test_torn_tail_is_cut_off_on_reopen(tmp_path):
+    path = str(tmp_path / "store")
+    store = storage.SegmentStorage(path)
+    store.append_many([reading(ts) for ts in range(5)])
+    store.close()
+
+    # A crash in the middle of a write leaves half a line behind
+    active = os.path.join(path, store.manifest["active"])
+    good_size = os.path.getsize(active)
+    with open(active, "ab") as file:
+        file.write(storage.encode_record(reading(5))[:-7])
+
+    store = storage.SegmentStorage(path)
+    assert os.path.getsize(active) == good_size
+    assert len(store) == 5
+    store.append(reading(6))
+    store.close()
+    assert [record["ts"] for record in storage.SegmentStorage(path, readonly=True).records()] == [0, 1, 2, 3, 4, 6]
+
+
+def test_corrupt_line_ends_the_active_segment(tmp_path):
+    path = str(tmp_path / "store")
+    store = storage.SegmentStorage(path)
+    store.append_many([reading(ts) for ts in range(3)])
+    store.close()
+    with open(os.path.join(path, store.manifest["active"]), "ab") as file:
+        file.write(b'{"ts": 3, "temp\n' + storage.encode_record(reading(4)))
+
+    assert len(storage.SegmentStorage(path)) == 3
+
+
+def test_segments_roll_at_max_records(tmp_path):
+    path = str(tmp_path / "store")
+    store = storage.SegmentStorage(path, max_records=4)
+    store.append_many([reading(ts) for ts in range(10)])
+    store.close()
+
+    store = storage.SegmentStorage(path, max_records=4)
+    sealed = store.manifest["segments"]
+    assert [segment["name"] for segment in sealed] == [storage.segment_name(1), storage.segment_name(2)]
+    assert [(segment["records"], segment["first_ts"], segment["last_ts"]) for segment in sealed] == [(4, 0, 3), (4, 4, 7)]
+    assert store.manifest["active"] == storage.segment_name(3)
+    assert store.active_records == 2
+    assert len(store) == 10
+    assert [record["ts"] for record in store.records()] == list(range(10))
+    store.close()
+
+
+def test_prune_drops_only_sealed_segments_before_the_cut(tmp_path):
+    path = str(tmp_path / "store")
+    store = storage.SegmentStorage(path, max_records=4)
+    store.append_many([reading(ts) for ts in range(10)])
+
+    assert store.prune(5) == 4  # The second segment still holds ts 5 to 7
+    assert not os.path.exists(os.path.join(path, storage.segment_name(1)))
+    assert store.prune(100) == 4  # The active segment is never pruned
+    assert [record["ts"] for record in store.records()] == [8, 9]
+    store.close()
+    assert len(storage.SegmentStorage(path, readonly=True)) == 2
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import numpy as np
+
+import columnar
+import rollup
+import timerange
+
+NOW = datetime(2025, 3, 21, 12, 0)
+
+
+def span_seconds(query):
+    window = timerange.parse_range(query, NOW)
+    return (window.end - window.start) / 1000
+
+
+def test_a_date_or_time_covers_the_precision_given():
+    assert span_seconds("average temperature on 2025-03-20") == 86400
+    assert span_seconds("what happened at 2025-03-20 14:30") == 60
+    assert span_seconds("what happened at 2025-03-20 14:30:05") == 1
+    window = timerange.parse_range("at 2025-03-20 14:30", NOW)
+    assert window.start == timerange.to_ms(datetime(2025, 3, 20, 14, 30))
+
+
+def test_between_includes_the_end_it_names():
+    window = timerange.parse_range("between 2025-03-20 and 2025-03-21 10:15", NOW)
+    assert window.start == timerange.to_ms(datetime(2025, 3, 20))
+    assert window.end == timerange.to_ms(datetime(2025, 3, 21, 10, 16))
+
+
+def test_last_today_and_yesterday():
+    window = timerange.parse_range("Average humidity over the last 3 hours?", NOW)
+    assert (window.start, window.end) == (timerange.to_ms(datetime(2025, 3, 21, 9, 0)), timerange.to_ms(NOW))
+    assert window.label == "over the last 3 hours"
+    assert timerange.parse_range("max temperature in the past day", NOW).label == "over the last day"
+    assert span_seconds("previous 2 weeks") == 14 * 86400
+    assert timerange.parse_range("temperature today", NOW) == timerange.TimeRange(
+        timerange.to_ms(datetime(2025, 3, 21)), timerange.to_ms(datetime(2025, 3, 22)), "today", None)
+    window = timerange.parse_range("hourly light yesterday", NOW)
+    assert (window.start, window.end, window.period) == (
+        timerange.to_ms(datetime(2025, 3, 20)), timerange.to_ms(datetime(2025, 3, 21)), "hour")
+
+
+def test_no_window_is_all_data():
+    assert timerange.parse_range("what is the average temperature?", NOW) is None
+    assert timerange.parse_range("temperature per day", NOW) == timerange.TimeRange(None, None, "", "day")
+    assert timerange.parse_range("from 2025-03-01 to 2025-03-02", NOW).label == "between 2025-03-01 and 2025-03-02"
+
+
+def time_index(seconds):
+    return timerange.TimeIndex(columnar.ColumnStore.from_records(
+        [{"ts": second, "temperature": float(second), "humidity": 50.0} for second in seconds]))
+
+
+def test_range_rows_are_half_open():
+    index = time_index([10, 20, 20, 30, 40])
+    assert index.bounds() == (0, 5)
+    assert index.bounds(20000, 40000) == (1, 4)  # Both readings at the start, none at the end
+    assert index.bounds(20001, 30001) == (3, 4)
+    assert index.bounds(None, 10000) == (0, 0)
+    assert index.bounds(41000, None) == (5, 5)
+    assert index.bounds(30000, 20000) == (3, 3)  # An inverted window is empty
+    assert index.range_rows(15000, 35000) == slice(1, 4)
+    assert (index.first_ts(), index.last_ts()) == (10000, 40000)
+
+
+def test_rows_out_of_time_order_are_found():
+    index = time_index([10, 40, 20, 30, 5])
+    assert index.order is not None
+    rows = index.range_rows(10000, 35000)
+    assert sorted(np.asarray(index.store.ts)[rows].tolist()) == [10000, 20000, 30000]
+    assert index.count(None, 20000) == 2
+    assert (index.first_ts(), index.last_ts()) == (5000, 40000)
+
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[333], y[777] = 10.0, -10.0
+    picked = timerange.lttb(x, y, 50)
+    assert len(picked) == 50
+    assert picked[0] == 0 and picked[-1] == 999
+    assert (np.diff(picked) > 0).all()
+    assert 333 in picked and 777 in picked
+    assert timerange.lttb(x[:10], y[:10], 50).tolist() == list(range(10))
+    assert len(timerange.lttb(x, y, 2)) == 1000
+
+
+def hourly_engine(directory, first, hours):
+    # One reading at half past every hour from epoch second `first`
+    store = columnar.ColumnStore(str(directory / "columns"))
+    store.append_many([{"ts": first + hour * 3600 + 1800, "temperature": 20.0, "humidity": 50.0}
+                       for hour in range(hours)])
+    rollups = rollup.open_index(store, str(directory / "rollups.npz"))
+    rollups.save()
+    return timerange.QueryEngine(store, rollups)
+
+
+def test_days_follow_the_local_clock_across_daylight_saving(tmp_path, local_zone):
+    local_zone("Europe/Berlin")
+    first = int(datetime(2025, 3, 29).timestamp())
+    engine = hourly_engine(tmp_path, first, 71)  # Three local days, one of them 23 hours long
+    days = engine.per_period("temperature", timerange.TimeRange(None, None, "", "day"), "day")
+    assert [(moment.strftime("%Y-%m-%d"), stats["count"]) for moment, stats in days] == [
+        ("2025-03-29", 24), ("2025-03-30", 23), ("2025-03-31", 24)]
+    hours = engine.per_period("temperature", timerange.TimeRange(None, None, "", "hour"), "hour", limit=500)
+    assert "2025-03-30 02:00" not in [moment.strftime("%Y-%m-%d %H:%M") for moment, _ in hours]
+    assert all(stats["count"] == 1 for _, stats in hours)
+
+
+def test_buckets_survive_a_time_zone_change(tmp_path, local_zone):
+    local_zone("America/New_York")
+    first = int(datetime(2025, 6, 1).timestamp())
+    engine = hourly_engine(tmp_path, first, 48)
+    engine.store.close()
+    local_zone("Asia/Tokyo")
+    store = columnar.ColumnStore(str(tmp_path / "columns"), readonly=True)
+    engine = timerange.QueryEngine(store, rollup.open_index(store, str(tmp_path / "rollups.npz"), save=False))
+    days = engine.per_period("temperature", timerange.TimeRange(None, None, "", "day"), "day")
+    # New York midnight is 13:00 in Tokyo: 11 readings on the first Tokyo day, 13 on the last
+    assert [stats["count"] for _, stats in days] == [11, 24, 13]
@@ -0,0 +1,356 @@
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import anomaly
+import columnar
+import rollup
+
+# Half-open window start <= ts < end in epoch milliseconds (None = unbounded).
+# `period` is "hour" or "day" when the question asks for a per-period breakdown.
+TimeRange = namedtuple("TimeRange", ["start", "end", "label", "period"])
+
+UNIT_SECONDS = {
+    "s": 1, "sec": 1, "secs": 1, "second": 1, "seconds": 1,
+    "m": 60, "min": 60, "mins": 60, "minute": 60, "minutes": 60,
+    "h": 3600, "hr": 3600, "hrs": 3600, "hour": 3600, "hours": 3600,
+    "d": 86400, "day": 86400, "days": 86400,
+    "w": 604800, "week": 604800, "weeks": 604800,
+    "month": 2592000, "months": 2592000,
+}
+
+DATETIME_PATTERN = r"\d{4}-\d{2}-\d{2}(?:[ t]\d{1,2}:\d{2}(?::\d{2})?)?"
+LAST_PATTERN = re.compile(r"\b(?:last|past|previous)\s+(\d+)?\s*(" + "|".join(sorted(UNIT_SECONDS, key=len, reverse=True)) + r")\b")
+BETWEEN_PATTERN = re.compile(r"\b(?:between|from)\s+(" + DATETIME_PATTERN + r")\s+(?:and|to|until)\s+(" + DATETIME_PATTERN + r")")
+DATE_PATTERN = re.compile(DATETIME_PATTERN)
+DATETIME_FORMATS = (("%Y-%m-%d %H:%M:%S", timedelta(seconds=1)), ("%Y-%m-%d %H:%M", timedelta(minutes=1)),
+                    ("%Y-%m-%d", timedelta(days=1)))
+
+MAX_PERIODS = 48  # Longest per-day/per-hour breakdown returned to the chat
+MAX_EVENTS = 20  # Most recent anomaly events listed in a chat answer
+
+PERIOD_WORDS = {
+    "day": ("per day", "daily", "each day", "by day"),
+    "hour": ("per hour", "hourly", "each hour", "by hour"),
+}
+
+
+def to_ms(moment):
+    return int(round(moment.timestamp() * 1000))
+
+
+def parse_datetime(text, end=False):
+    # An end bound includes the whole day, minute or second it names
+    text = text.replace("t", " ")
+    for fmt, step in DATETIME_FORMATS:
+        try:
+            moment = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if end:
+            moment += step
+        return moment
+    raise ValueError(f"Unrecognised date: {text}")
+
+
+def parse_period(query):
+    for period, words in PERIOD_WORDS.items():
+        if any(word in query for word in words):
+            return period
+    return None
+
+
+def parse_range(query, now=None):
+    # Pick a time window out of a chat question; None means "all data"
+    query = query.lower()
+    now = now or datetime.now()
+    period = parse_period(query)
+
+    match = BETWEEN_PATTERN.search(query)
+    if match:
+        start = parse_datetime(match.group(1))
+        end = parse_datetime(match.group(2), end=True)
+        return TimeRange(to_ms(start), to_ms(end), f"between {match.group(1)} and {match.group(2)}", period)
+
+    match = LAST_PATTERN.search(query)
+    if match:
+        count = int(match.group(1) or 1)
+        unit = match.group(2)
+        seconds = count * UNIT_SECONDS[unit]
+        unit_word = unit if count == 1 or unit.endswith("s") else unit + "s"
+        label = f"over the last {count} {unit_word}" if match.group(1) else f"over the last {unit}"
+        return TimeRange(to_ms(now - timedelta(seconds=seconds)), to_ms(now), label, period)
+
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if "today" in query:
+        return TimeRange(to_ms(midnight), to_ms(midnight + timedelta(days=1)), "today", period)
+    if "yesterday" in query:
+        return TimeRange(to_ms(midnight - timedelta(days=1)), to_ms(midnight), "yesterday", period)
+
+    match = DATE_PATTERN.search(query)
+    if match:
+        start = parse_datetime(match.group(0))
+        end = parse_datetime(match.group(0), end=True)
+        return TimeRange(to_ms(start), to_ms(end), f"on {match.group(0)}", period)
+
+    if period:
+        return TimeRange(None, None, "", period)
+    return None
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: indices of `threshold` points that keep
+    # the visual shape of the series (peaks and dips survive, flat runs thin out)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # threshold - 2 buckets between the fixed first and last points; the
+    # averages of all buckets are computed up front in one pass
+    starts = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    sizes = np.diff(np.append(starts, n))
+    mean_x = np.add.reduceat(x, starts) / sizes
+    mean_y = np.add.reduceat(y, starts) / sizes
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        lo, hi = starts[i], starts[i + 1]
+        # Twice the area of the triangle (previous pick, candidate, next bucket average)
+        area = np.abs((x[prev] - mean_x[i + 1]) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (mean_y[i + 1] - y[prev]))
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+class TimeIndex:
+    # Sorted view of the column store timestamps. Ingest appends in time order,
+    # so normally the timestamp column itself is the index and a range lookup
+    # is two binary searches returning a contiguous slice. Out-of-order rows
+    # (e.g. a backfill) switch to an argsort permutation.
+
+    def __init__(self, store):
+        self.store = store
+        self.rows = 0
+        self.first_row = getattr(store, "first_row", 0)
+        self.order = None
+        self.sorted_ts = np.empty(0, dtype=np.int64)
+        self.refresh()
+
+    def refresh(self):
+        if getattr(self.store, "first_row", 0) != self.first_row:
+            # The store was compacted (retention.py): row positions shifted, start over
+            self.first_row = self.store.first_row
+            self.rows = 0
+            self.order = None
+            self.sorted_ts = np.empty(0, dtype=np.int64)
+        ts = self.store.ts
+        if len(ts) == self.rows:
+            return self.rows
+        new = ts[self.rows:]
+        in_order = self.order is None and bool(np.all(new[1:] >= new[:-1]))
+        if in_order and self.rows and len(new) and new[0] < ts[self.rows - 1]:
+            in_order = False
+
+        if in_order:
+            self.sorted_ts = ts
+        else:
+            self.order = np.argsort(ts, kind="stable")
+            self.sorted_ts = ts[self.order]
+        self.rows = len(ts)
+        return self.rows
+
+    def __len__(self):
+        return self.rows
+
+    def bounds(self, start=None, end=None):
+        lo = 0 if start is None else int(np.searchsorted(self.sorted_ts, start, side="left"))
+        hi = self.rows if end is None else int(np.searchsorted(self.sorted_ts, end, side="left"))
+        return lo, max(lo, hi)
+
+    def range_rows(self, start=None, end=None):
+        # Row selector for start <= ts < end: a slice, or row numbers if out of order
+        lo, hi = self.bounds(start, end)
+        if self.order is None:
+            return slice(lo, hi)
+        return self.order[lo:hi]
+
+    def count(self, start=None, end=None):
+        lo, hi = self.bounds(start, end)
+        return hi - lo
+
+    def first_ts(self):
+        return int(self.sorted_ts[0]) if self.rows else None
+
+    def last_ts(self):
+        return int(self.sorted_ts[-1]) if self.rows else None
+
+
+class QueryEngine:
+    # Range-aware stats and series for the chatbots. Stats come from the rollup
+    # index (edges scanned exactly through the time index); series only read
+    # the rows inside the window.
+
+    def __init__(self, store, rollups, anomalies=None):
+        self.store = store
+        self.rollups = rollups
+        self.index = TimeIndex(store)
+        # Anomaly events (anomaly.AnomalyLog) get their own time index
+        self.anomalies = anomalies
+        self.anomaly_index = TimeIndex(anomalies) if anomalies is not None else None
+
+    def refresh(self):
+        # Pick up rows appended to the store since the last call. Only the new
+        # rows are read; returns the earliest new timestamp, or None if nothing arrived
+        before = self.store.next_row
+        generation = self.store.generation
+        self.store.refresh()
+        if self.store.generation != generation and self.rollups.index_path:
+            # Compacted by the ingest side: take over its pruned rollup tiers
+            self.rollups = rollup.open_index(self.store, self.rollups.index_path, save=False)
+        self.rollups.catch_up(self.store)
+        if self.anomalies is not None:
+            self.anomalies.refresh()
+            self.anomaly_index.refresh()
+        self.index.refresh()
+        if self.store.next_row <= before:
+            return None
+        return int(self.store.ts[self.store.position(before):].min())
+
+    def first_ts(self):
+        # Oldest reading, or the start of the oldest rollup bucket once raw rows have been compacted
+        if self.store.raw_from is None:
+            return self.index.first_ts()
+        return self.rollups.first_ts()
+
+    def last_ts(self):
+        if self.index.rows:
+            return self.index.last_ts()
+        end = self.rollups.end_ts()
+        return end - 1 if end is not None else None
+
+    def count(self, window=None):
+        # Readings in the window, including ones only kept in the rollup tiers
+        start, end = window[:2] if window else (None, None)
+        raw_from = self.store.raw_from
+        if raw_from is None:
+            return self.index.count(start, end)
+        count = self.index.count(raw_from if start is None else max(start, raw_from), end)
+        if start is None or start < raw_from:
+            older = [self.rollups.stats(field, start, raw_from if end is None else min(end, raw_from))
+                     for field in self.store.fields]
+            count += max((stats["count"] for stats in older if stats), default=0)
+        return count
+
+    def stats(self, field, window=None):
+        if window is None or (window.start is None and window.end is None):
+            return self.rollups.stats(field)
+        return self.rollups.stats(field, window.start, window.end, source=self.index)
+
+    def mean(self, field, window=None):
+        stats = self.stats(field, window)
+        return stats["mean"] if stats else None
+
+    def per_period(self, field, window, period, limit=MAX_PERIODS):
+        # [(period start datetime, stats or None)] covering the window, at most
+        # the `limit` most recent periods
+        start = window.start if window and window.start is not None else self.first_ts()
+        last = self.last_ts()
+        if start is None or last is None:
+            return []
+        end = window.end if window and window.end is not None else last + 1
+        # Local days and hours, stepped on the wall clock so a day across a
+        # clock change is 23 or 25 hours long
+        step = timedelta(days=1) if period == "day" else timedelta(hours=1)
+        start = max(start, end - (limit + 1) * int(step.total_seconds() * 1000))
+        moment = datetime.fromtimestamp(start / 1000).replace(minute=0, second=0, microsecond=0)
+        if period == "day":
+            moment = moment.replace(hour=0)
+        results = []
+        while to_ms(moment) < end:
+            following = moment + step
+            bucket, bucket_end = max(to_ms(moment), start), min(to_ms(following), end)
+            if bucket < bucket_end:  # An hour skipped by a clock change is empty
+                results.append((moment, self.rollups.stats(field, bucket, bucket_end, source=self.index)))
+            moment = following
+        return results[-limit:]
+
+    def period_report(self, field, window, name, unit):
+        period = window.period
+        lines = [f"{name} per {period}{' ' + window.label if window.label else ''}:"]
+        fmt = "%Y-%m-%d" if period == "day" else "%Y-%m-%d %H:00"
+        for moment, stats in self.per_period(field, window, period):
+            if stats:
+                lines.append(f"- {moment.strftime(fmt)}: avg {stats['mean']:.1f}{unit}, min {stats['min']:.1f}{unit}, max {stats['max']:.1f}{unit} ({stats['count']} readings)")
+        if len(lines) == 1:
+            return f"No {name.lower()} data{' ' + window.label if window.label else ''}"
+        return "\n".join(lines)
+
+    def events(self, window=None, field=None):
+        # Anomaly events inside the window, oldest first
+        if self.anomalies is None:
+            return None
+        rows = self.anomaly_index.range_rows(*(window[:2] if window else (None, None)))
+        events = self.anomalies.events[rows]
+        if field is not None:
+            events = events[events["field"] == self.store.fields.index(field)]
+        return events
+
+    def anomaly_report(self, window=None, field=None, limit=MAX_EVENTS):
+        span = f" {window.label}" if window and window.label else ""
+        events = self.events(window, field)
+        if events is None:
+            return "Anomaly detection is not available for this data"
+        if len(events) == 0:
+            return f"No anomalies{span}"
+        lines = [f"{len(events)} anomal{'y' if len(events) == 1 else 'ies'}{span}" + (f", latest {limit}:" if len(events) > limit else ":")]
+        for event in events[-limit:]:
+            moment = datetime.fromtimestamp(int(event["ts"]) / 1000).strftime("%Y-%m-%d %H:%M:%S")
+            source = self.store.sources[event["source"]] if event["source"] < len(self.store.sources) else event["source"]
+            lines.append(f"- {moment}{'' if source == columnar.DEFAULT_SOURCE else f' [{source}]'}: {anomaly.describe(event, self.store.fields)}")
+        return "\n".join(lines)
+
+    def window_rows(self, window=None):
+        # Raw rows in the window; rows older than the store's raw_from are left
+        # to the rollup tiers even if some are still on disk
+        start, end = window[:2] if window else (None, None)
+        if self.store.raw_from is not None:
+            start = self.store.raw_from if start is None else max(start, self.store.raw_from)
+        return self.index.range_rows(start, end)
+
+    def times(self, window=None):
+        return columnar.to_local(self.store.ts[self.window_rows(window)])
+
+    def series(self, field, window=None):
+        rows = self.window_rows(window)
+        return np.where(self.store.valid(field)[rows], self.store.values(field)[rows], np.float32(np.nan))
+
+    def window_series(self, fields, window=None):
+        # (epoch ms times, {field: values}) for a graph of the window: raw rows,
+        # preceded by rollup bucket means for any part that has been compacted
+        rows = self.window_rows(window)
+        ts = np.asarray(self.store.ts[rows], dtype=np.int64)
+        values = {field: self.series(field, window).astype(np.float64) for field in fields}
+        raw_from = self.store.raw_from
+        start, end = window[:2] if window else (None, None)
+        if raw_from is not None and (start is None or start < raw_from):
+            times, means = self.rollups.points(fields, start, end, raw_from)
+            ts = np.concatenate([times, ts])
+            values = {field: np.concatenate([means[field], values[field]]) for field in fields}
+        return ts, values
+
+    def time_limits(self, window=None):
+        # Local datetime64 axis limits for a bounded window (None = fit the data)
+        if window is None or window.start is None or window.end is None:
+            return None
+        start, end = columnar.to_local([window.start, window.end])
+        return start, end
+
+    def span_label(self):
+        if self.first_ts() is None:
+            return "no data"
+        first = datetime.fromtimestamp(self.first_ts() / 1000).strftime("%Y-%m-%d")
+        last = datetime.fromtimestamp(self.last_ts() / 1000).strftime("%Y-%m-%d")
+        return first if first == last else f"{first} to {last}"